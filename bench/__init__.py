@@ -0,0 +1 @@
+# Load tests for bot.py.py against a local Telegram stand-in: `python3 -m bench --help`
@@ -0,0 +1,227 @@
+# python3 -m bench [--sizes 100,1000,10000] [--chats 20] [--out bench_results.json] [--compare old.json]
+#
+# For each ledger size a fresh bot module and DB are set up: every chat gets `size` entries for
+# today and `size` for yesterday, then the workloads run in order (text burst, /summary, cold and
+# warm summary builds, 完整账单 clicks, daily rollover, then update ingestion by long polling and by
+# webhook at --ingest-rate with a simulated --rtt to Telegram; latency there is end to end).
+# Telegram's send limits are lifted unless --real-limits is given, so the numbers measure the bot
+# rather than the rate limiter.
+#
+# --report-rows 100000 renders today's report (csv, txt, csv.gz) for one chat holding that many rows.
+#
+# --startup-rows 200000 builds a tx.db with that many rows today and per earlier day (archived),
+# then times fresh processes from start to the first handled update and its summary.
+#
+# --maint-rows 20000 fills every chat with that many rows yesterday and today, rolls yesterday into
+# the archive and /clears half the chats, then runs the text burst alone and again beside the DB
+# maintenance pass (budget --maint-budget); file, free pages and WAL are reported before and after.
+#
+# --shards 1,2,4 adds the sharding workload: the same text burst over all chats, split by
+# chat_id % N across N processes with one DB each (what SHARDS=N does), run at the same time.
+import os, sys, json, time, sqlite3, argparse, platform, tempfile, multiprocessing
+
+from .stand_in import FakeBot, ensure_telegram, setup_bot, teardown_bot
+from .workloads import Harness, shard_burst, build_startup_db, startup_probe, STARTUP_ADMIN
+
+def run_sharded(args, chats, workdir):
+    mp = multiprocessing.get_context("spawn")
+    out = []
+    for n in args.shards:
+        barrier = mp.Barrier(n)
+        results = mp.Queue()
+        procs = []
+        for i in range(n):
+            mine = [c for c in chats if c % n == i]
+            share = args.messages * len(mine) // len(chats)
+            db = os.path.join(workdir, f"shards{n}_{i}.db")
+            procs.append(mp.Process(target=shard_burst, args=(db, mine, share, args.workers, 100, barrier, results)))
+        for p in procs:
+            p.start()
+        parts = [results.get() for _ in procs]
+        for p in procs:
+            p.join()
+        wall = max(w["handler_wall_s"] for w in parts)
+        calls = sum(w["calls"] for w in parts)
+        out.append({"shards": n, "calls": calls, "wall_s": wall, "throughput_per_s": round(calls / wall, 1),
+                    "p50_ms": max(w["latency_ms"]["p50"] for w in parts),
+                    "p99_ms": max(w["latency_ms"]["p99"] for w in parts),
+                    "per_shard": parts})
+        print(f"  {n} shard(s): {calls} messages in {wall:.2f}s = {calls / wall:.0f}/s, "
+              f"worst p50 {out[-1]['p50_ms']}ms p99 {out[-1]['p99_ms']}ms")
+    return out
+
+def run_report(args, chats, workdir):
+    bot = setup_bot(os.path.join(workdir, "bench_report.db"), args.debounce, args.real_limits)
+    try:
+        h = Harness(bot, FakeBot(), chats, 1)
+        t0 = time.perf_counter()
+        h.prefill(args.report_rows, chats=chats[:1])
+        out = {"rows": args.report_rows, "prefill_s": round(time.perf_counter() - t0, 3), "workloads": {}}
+        for (fmt, gz) in (("csv", False), ("txt", False), ("csv", True)):
+            name = f"report_{fmt}" + ("_gz" if gz else "")
+            w = out["workloads"][name] = h.report(chats[0], fmt, gz, args.repeat)
+            print(f"  {name:12} {args.report_rows} rows: p50 {w['latency_ms']['p50']}ms p99 {w['latency_ms']['p99']}ms "
+                  f"db {w['db_s']}s")
+    finally:
+        teardown_bot(bot)
+    return out
+
+def run_startup(args, chats, workdir):
+    db = os.path.join(workdir, "bench_startup.db")
+    t0 = time.perf_counter()
+    build_startup_db(db, chats, args.startup_rows)
+    out = {"rows": args.startup_rows, "db_bytes": os.path.getsize(db), "build_s": round(time.perf_counter() - t0, 3),
+           "runs": []}
+    mp = multiprocessing.get_context("spawn")
+    for _ in range(args.repeat):
+        results = mp.Queue()
+        p = mp.Process(target=startup_probe, args=(db, chats[0], STARTUP_ADMIN, results))
+        p.start()
+        out["runs"].append(results.get())
+        p.join()
+    for k in ("import_s", "ready_s", "first_update_s", "first_summary_s"):
+        out[k] = sorted(r[k] for r in out["runs"])[len(out["runs"]) // 2]
+    print(f"  startup ({args.startup_rows} rows/day, {out['db_bytes'] >> 20} MiB): import {out['import_s']}s, "
+          f"ready {out['ready_s']}s, first update {out['first_update_s']}s, first summary {out['first_summary_s']}s")
+    return out
+
+def run_maintenance(args, chats, workdir):
+    bot = setup_bot(os.path.join(workdir, "bench_maint.db"), args.debounce, args.real_limits)
+    try:
+        h = Harness(bot, FakeBot(), chats, args.workers)
+        t0 = time.perf_counter()
+        h.prefill(args.maint_rows, days_back=1)
+        h.prefill(args.maint_rows)
+        h.rollover()
+        h.clear(chats[::2])
+        out = {"rows": args.maint_rows, "budget_s": args.maint_budget, "prefill_s": round(time.perf_counter() - t0, 3)}
+        out["idle"] = h.text_burst(args.messages)
+        out["during"] = h.maintenance(args.messages, args.maint_budget)
+        (i, d) = (out["idle"]["latency_ms"], out["during"]["latency_ms"])
+        print(f"  text burst alone: p50 {i['p50']}ms p99 {i['p99']}ms max {i['max']}ms; beside maintenance: "
+              f"p50 {d['p50']}ms p99 {d['p99']}ms max {d['max']}ms")
+        print(f"  maintenance {bot._maint_summary(out['during']['maintenance'])}")
+    finally:
+        teardown_bot(bot)
+    return out
+
+def run(args):
+    real_telegram = ensure_telegram()
+    chats = [-1001000000000 - i for i in range(args.chats)]  # supergroup ids
+    runs = []
+    with tempfile.TemporaryDirectory(prefix="bench_") as workdir:
+        for size in args.sizes:
+            bot = setup_bot(os.path.join(workdir, f"bench_{size}.db"), args.debounce, args.real_limits)
+            fake = FakeBot(args.api_latency / 1000.0)
+            h = Harness(bot, fake, chats, args.workers)
+            t0 = time.perf_counter()
+            h.prefill(size, days_back=1)
+            h.prefill(size)
+            prefill_s = time.perf_counter() - t0
+            workloads = {}
+            try:
+                workloads["text_handler"] = h.text_burst(args.messages)
+                workloads["summary_cmd"] = h.summary_cmd(args.repeat)
+                workloads["build_compact_message_cold"] = h.build_summary(args.repeat, cold=True)
+                workloads["build_compact_message_warm"] = h.build_summary(args.repeat, cold=False)
+                workloads["viewfull_callback"] = h.viewfull_clicks(args.repeat)
+                workloads["daily_reset"] = h.rollover()
+                for mode in ("polling", "webhook"):
+                    workloads[f"ingest_{mode}"] = h.ingest(mode, args.ingest_messages, args.ingest_rate, args.rtt / 1000.0)
+            finally:
+                teardown_bot(bot)
+            runs.append({"ledger_size": size, "prefill_s": round(prefill_s, 3), "workloads": workloads})
+            _print_run(runs[-1])
+        report = run_report(args, chats, workdir) if args.report_rows else None
+        startup = run_startup(args, chats, workdir) if args.startup_rows else None
+        maintenance = run_maintenance(args, chats, workdir) if args.maint_rows else None
+        sharded = run_sharded(args, chats, workdir) if args.shards else []
+    return {
+        "meta": {
+            "time": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "python": platform.python_version(), "sqlite": sqlite3.sqlite_version,
+            "platform": platform.platform(), "telegram": "python-telegram-bot" if real_telegram else "stand-in",
+            "chats": args.chats, "messages": args.messages, "repeat": args.repeat, "workers": args.workers,
+            "api_latency_ms": args.api_latency, "rtt_ms": args.rtt, "ingest_rate": args.ingest_rate,
+            "debounce_s": args.debounce, "real_limits": args.real_limits, "cpus": os.cpu_count(),
+        },
+        "runs": runs,
+        "report": report,
+        "startup": startup,
+        "maintenance": maintenance,
+        "sharded": sharded,
+    }
+
+def _print_run(run):
+    print(f"ledger size {run['ledger_size']} (prefill {run['prefill_s']}s)")
+    print(f"  {'workload':28} {'calls':>6} {'per s':>9} {'p50 ms':>8} {'p99 ms':>8} {'db s':>7}  outbound")
+    for (name, w) in run["workloads"].items():
+        out = ", ".join(f"{k}={v}" for (k, v) in sorted(w["outbound"].items()))
+        print(f"  {name:28} {w['calls']:>6} {w['throughput_per_s'] or 0:>9} {w['latency_ms']['p50']:>8} "
+              f"{w['latency_ms']['p99']:>8} {w['db_s']:>7}  {out}")
+
+def compare(old, new):
+    # p99 and throughput change per (ledger size, workload) present in both results;
+    # report workloads are matched by row count
+    def keyed(result):
+        out = {(r["ledger_size"], name): w for r in result["runs"] for (name, w) in r["workloads"].items()}
+        rep = result.get("report")
+        if rep:
+            out.update(((rep["rows"], name), w) for (name, w) in rep["workloads"].items())
+        return out
+
+    def delta(a, b):
+        return f"{(b - a) / a * 100:+.1f}%" if a else "n/a"
+
+    before = keyed(old)
+    print(f"compared with {old['meta'].get('time')}:")
+    for ((size, name), w) in keyed(new).items():
+        o = before.get((size, name))
+        if o is None:
+            continue
+        print(f"  {size:>7} {name:28} p99 {delta(o['latency_ms']['p99'], w['latency_ms']['p99']):>8}"
+              f"  throughput {delta(o['throughput_per_s'] or 0, w['throughput_per_s'] or 0):>8}")
+    (o, n) = (old.get("startup"), new.get("startup"))
+    if o and n and o["rows"] == n["rows"]:
+        for k in ("ready_s", "first_update_s", "first_summary_s"):
+            print(f"  startup {k:20} {o[k]}s -> {n[k]}s ({delta(o[k], n[k])})")
+    (o, n) = (old.get("maintenance"), new.get("maintenance"))
+    if o and n and o["rows"] == n["rows"]:
+        print(f"  maintenance text burst p99 {delta(o['during']['latency_ms']['p99'], n['during']['latency_ms']['p99'])}")
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(prog="python3 -m bench")
+    ap.add_argument("--sizes", type=lambda s: [int(x) for x in s.split(",")], default=[100, 1000, 10000],
+                    help="entries per chat per day to prefill, comma separated")
+    ap.add_argument("--chats", type=int, default=20)
+    ap.add_argument("--messages", type=int, default=2000, help="text messages in the burst workload")
+    ap.add_argument("--repeat", type=int, default=5, help="calls per chat for /summary, builds and clicks")
+    ap.add_argument("--workers", type=int, default=4, help="handler threads (the dispatcher's pool)")
+    ap.add_argument("--api-latency", type=float, default=0.0, help="ms slept per fake API call")
+    ap.add_argument("--ingest-messages", type=int, default=1000, help="updates in each ingestion workload")
+    ap.add_argument("--ingest-rate", type=float, default=200.0, help="updates per second Telegram has for the bot")
+    ap.add_argument("--rtt", type=float, default=60.0, help="ms round trip between the bot and Telegram")
+    ap.add_argument("--report-rows", type=int, default=100000, help="rows in the report rendering workload (0 = skip)")
+    ap.add_argument("--startup-rows", type=int, default=200000,
+                    help="rows per day in the start-up workload's tx.db (0 = skip)")
+    ap.add_argument("--maint-rows", type=int, default=20000,
+                    help="rows per chat per day in the maintenance workload (0 = skip)")
+    ap.add_argument("--maint-budget", type=float, default=30.0, help="MAINT_BUDGET_SECS for the maintenance workload")
+    ap.add_argument("--shards", type=lambda s: [int(x) for x in s.split(",")], default=[],
+                    help="shard counts for the sharding workload, comma separated (e.g. 1,2,4)")
+    ap.add_argument("--debounce", type=float, default=0.0, help="SUMMARY_DEBOUNCE_SECS for the run")
+    ap.add_argument("--real-limits", action="store_true", help="keep Telegram's send rate limits")
+    ap.add_argument("--out", default="bench_results.json")
+    ap.add_argument("--compare", help="earlier results JSON to compare against")
+    args = ap.parse_args(argv)
+
+    result = run(args)
+    with open(args.out, "w") as f:
+        json.dump(result, f, indent=2)
+    print(f"results written to {args.out}")
+    if args.compare:
+        with open(args.compare) as f:
+            compare(json.load(f), result)
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,257 @@
+# Local stand-ins for the Telegram side of bot.py.py: a Bot that records outbound calls,
+# Update / CallbackQuery / CallbackContext shapes the handlers read, and — only when
+# python-telegram-bot is not installed — a minimal `telegram` package so the bot module imports.
+import os, sys, time, types, threading, itertools, collections, sqlite3, importlib.util
+
+BOT_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "bot.py.py")
+
+# ====== telegram package stand-in ======
+def _install_telegram():
+    class _Obj:
+        def __init__(self, *args, **kwargs):
+            self.args = args; self.kwargs = kwargs
+
+    class TelegramError(Exception): pass
+    class Unauthorized(TelegramError): pass
+    class NetworkError(TelegramError): pass
+    class BadRequest(NetworkError): pass
+    class TimedOut(NetworkError): pass
+    class RetryAfter(TelegramError):
+        def __init__(self, retry_after):
+            super().__init__(f"Flood control exceeded. Retry in {retry_after} seconds")
+            self.retry_after = retry_after
+
+    # urllib3 errors the bot looks at as causes of NetworkError
+    class HTTPError(Exception): pass
+    class ConnectTimeoutError(HTTPError): pass
+    class NewConnectionError(ConnectTimeoutError): pass
+    class MaxRetryError(HTTPError):
+        def __init__(self, pool, url, reason=None):
+            super().__init__(f"Max retries exceeded with url: {url}")
+            self.reason = reason
+
+    class _Filter:
+        def __and__(self, other): return self
+        def __or__(self, other): return self
+        def __invert__(self): return self
+
+    tg = types.ModuleType("telegram")
+    err = types.ModuleType("telegram.error")
+    ext = types.ModuleType("telegram.ext")
+    utils = types.ModuleType("telegram.utils")
+    request = types.ModuleType("telegram.utils.request")
+    for name in ("Update", "Bot", "InlineKeyboardButton", "InlineKeyboardMarkup"):
+        setattr(tg, name, type(name, (_Obj,), {}))
+    tg.Update.de_json = classmethod(lambda cls, data, bot: data)
+    for cls in (TelegramError, Unauthorized, NetworkError, BadRequest, TimedOut, RetryAfter):
+        setattr(err, cls.__name__, cls)
+    for name in ("Updater", "Dispatcher", "CommandHandler", "MessageHandler", "CallbackQueryHandler", "CallbackContext"):
+        setattr(ext, name, type(name, (_Obj,), {}))
+    ext.Filters = types.SimpleNamespace(text=_Filter(), command=_Filter())
+    request.urllib3 = types.SimpleNamespace(exceptions=types.SimpleNamespace(
+        HTTPError=HTTPError, ConnectTimeoutError=ConnectTimeoutError, NewConnectionError=NewConnectionError,
+        MaxRetryError=MaxRetryError))
+    tg.error = err; tg.ext = ext; tg.utils = utils; utils.request = request
+    sys.modules.update({"telegram": tg, "telegram.error": err, "telegram.ext": ext,
+                        "telegram.utils": utils, "telegram.utils.request": request})
+
+def ensure_telegram():
+    # True when the real library is used; it is only located here, the bot imports it itself
+    if "telegram" in sys.modules or importlib.util.find_spec("telegram") is not None:
+        return True
+    _install_telegram()
+    return False
+
+# ====== DB timing ======
+# Every statement, fetch and commit the bot makes is timed through connection/cursor subclasses
+# handed to sqlite3.connect; totals are summed across threads (handlers, writer, report pool).
+class DbClock:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            self.seconds = 0.0; self.calls = 0
+
+    def add(self, dt):
+        with self.lock:
+            self.seconds += dt; self.calls += 1
+
+db_clock = DbClock()
+
+def _timed(fn):
+    def wrapper(self, *args, **kwargs):
+        t0 = time.perf_counter()
+        try:
+            return fn(self, *args, **kwargs)
+        finally:
+            db_clock.add(time.perf_counter() - t0)
+    return wrapper
+
+class _TimedCursor(sqlite3.Cursor):
+    execute = _timed(sqlite3.Cursor.execute)
+    executemany = _timed(sqlite3.Cursor.executemany)
+    fetchone = _timed(sqlite3.Cursor.fetchone)
+    fetchmany = _timed(sqlite3.Cursor.fetchmany)
+    fetchall = _timed(sqlite3.Cursor.fetchall)
+    __next__ = _timed(sqlite3.Cursor.__next__)
+
+    def __iter__(self):
+        return self
+
+class _TimedConnection(sqlite3.Connection):
+    def cursor(self, factory=_TimedCursor):
+        return super().cursor(factory)
+
+    def execute(self, sql, params=()):
+        return self.cursor().execute(sql, params)
+
+    def executemany(self, sql, seq):
+        return self.cursor().executemany(sql, seq)
+
+    commit = _timed(sqlite3.Connection.commit)
+    rollback = _timed(sqlite3.Connection.rollback)
+    __exit__ = _timed(sqlite3.Connection.__exit__)
+
+class _TimedSqlite(types.ModuleType):
+    def __getattr__(self, name):
+        return getattr(sqlite3, name)
+
+    def connect(self, *args, **kwargs):
+        kwargs.setdefault("factory", _TimedConnection)
+        return sqlite3.connect(*args, **kwargs)
+
+# ====== bot module ======
+def load_bot(db_path):
+    # imports bot.py.py as a fresh module pointed at db_path, with timed DB connections
+    ensure_telegram()
+    spec = importlib.util.spec_from_file_location("bot", BOT_PATH)
+    bot = importlib.util.module_from_spec(spec)
+    sys.modules["bot"] = bot
+    spec.loader.exec_module(bot)
+    bot.DB_PATH = db_path
+    bot.sqlite3 = _TimedSqlite("sqlite3")
+    return bot
+
+def boot_bot(bot):
+    # what main() does before taking updates
+    if hasattr(bot, "_boot"):
+        bot._boot()
+    else:
+        bot.init_db()
+
+def setup_bot(db_path, debounce=0.0, real_limits=False):
+    bot = load_bot(db_path)
+    bot.SUMMARY_DEBOUNCE_SECS = debounce
+    if not real_limits:
+        bot.SEND_GLOBAL_PER_SEC = bot.SEND_CHAT_PER_SEC = 1e9
+        bot.SEND_GROUP_PER_MIN = bot.SEND_CHAT_BURST = 1e9
+        bot._outbox = bot._Outbox()  # buckets are sized when the outbox is made
+    boot_bot(bot)
+    bot._ts_ready.wait()
+    return bot
+
+def teardown_bot(bot):
+    bot._outbox.stop()
+    bot._tx_writer.stop()
+    if bot._report_pool is not None:
+        bot._report_pool.shutdown(wait=True)
+    bot._db_close_all()
+
+# ====== Bot / Update / CallbackContext ======
+class FakeBot:
+    # records outbound API calls; `latency` seconds are slept per call to model the network
+    def __init__(self, latency=0.0):
+        self.latency = latency
+        self.lock = threading.Lock()
+        self.calls = collections.Counter()
+        self.bytes_sent = 0
+        self.ids = itertools.count(1)
+
+    def _call(self, method, nbytes=0):
+        if self.latency:
+            time.sleep(self.latency)
+        with self.lock:
+            self.calls[method] += 1
+            self.bytes_sent += nbytes
+
+    def reset(self):
+        with self.lock:
+            self.calls.clear(); self.bytes_sent = 0
+
+    def send_message(self, chat_id, text, **kwargs):
+        self._call("send_message", len(text.encode()))
+        return FakeMessage(self, chat_id, text, next(self.ids))
+
+    def edit_message_text(self, text, chat_id=None, message_id=None, **kwargs):
+        self._call("edit_message_text", len(text.encode()))
+
+    def edit_message_reply_markup(self, chat_id=None, message_id=None, **kwargs):
+        self._call("edit_message_reply_markup")
+
+    def send_document(self, chat_id, document, filename=None, **kwargs):
+        self._call("send_document", len(document.read()))
+        return FakeMessage(self, chat_id, None, next(self.ids))
+
+    def answer_callback_query(self, callback_query_id, **kwargs):
+        self._call("answer_callback_query")
+
+class FakeMessage:
+    def __init__(self, bot, chat_id, text, message_id, chat_type="group"):
+        self.bot = bot
+        self.chat = types.SimpleNamespace(id=chat_id, type=chat_type)
+        self.chat_id = chat_id
+        self.text = text
+        self.message_id = message_id
+
+    def reply_text(self, text, **kwargs):
+        return self.bot.send_message(self.chat_id, text, reply_to_message_id=self.message_id, **kwargs)
+
+    def reply_document(self, document, filename=None, **kwargs):
+        return self.bot.send_document(self.chat_id, document, filename=filename, **kwargs)
+
+    def edit_reply_markup(self, reply_markup=None, **kwargs):
+        return self.bot.edit_message_reply_markup(self.chat_id, self.message_id, reply_markup=reply_markup)
+
+class FakeCallbackQuery:
+    def __init__(self, bot, user, message, data):
+        self.bot = bot
+        self.id = str(next(bot.ids))
+        self.from_user = user
+        self.message = message
+        self.data = data
+
+    def answer(self, text=None, **kwargs):
+        return self.bot.answer_callback_query(self.id, text=text)
+
+def _user(user_id):
+    return types.SimpleNamespace(id=user_id, first_name=f"op{user_id}", username=None)
+
+def make_update(bot, chat_id, user_id, text):
+    msg = FakeMessage(bot, chat_id, text, next(bot.ids))
+    return types.SimpleNamespace(update_id=msg.message_id, message=msg, effective_message=msg, callback_query=None,
+                                 effective_chat=msg.chat, effective_user=_user(user_id))
+
+def update_json(update_id, chat_id, user_id, text):
+    # what Telegram would POST / return from getUpdates for a text message
+    return {"update_id": update_id, "message": {
+        "message_id": update_id, "date": int(time.time()), "text": text,
+        "chat": {"id": chat_id, "type": "supergroup" if chat_id < 0 else "private"},
+        "from": {"id": user_id, "is_bot": False, "first_name": f"op{user_id}"}}}
+
+def update_from_json(bot, data):
+    msg = data["message"]
+    upd = make_update(bot, msg["chat"]["id"], msg["from"]["id"], msg.get("text"))
+    upd.update_id = data["update_id"]; upd.message.message_id = msg["message_id"]
+    return upd
+
+def make_callback(bot, chat_id, user_id, data, message_id=None):
+    msg = FakeMessage(bot, chat_id, "summary", message_id or next(bot.ids))
+    query = FakeCallbackQuery(bot, _user(user_id), msg, data)
+    return types.SimpleNamespace(update_id=int(query.id), message=None, effective_message=msg, callback_query=query,
+                                 effective_chat=msg.chat, effective_user=query.from_user)
+
+def make_context(bot, args=None):
+    # job_queue=None: the summary debouncer falls back to threading.Timer
+    return types.SimpleNamespace(bot=bot, args=list(args or []), job_queue=None, bot_data={}, chat_data={}, user_data={})
@@ -0,0 +1,315 @@
+# Synthetic workloads. Each one drives real handlers of a loaded bot module with fake updates
+# and returns handler latency, throughput, DB time and the outbound calls it caused.
+import io, time, json, queue, random, sqlite3, datetime, threading, http.client, concurrent.futures
+
+from .stand_in import (db_clock, make_update, make_callback, make_context, update_json, update_from_json,
+                       FakeBot, setup_bot, teardown_bot, load_bot, boot_bot)
+
+def _pct(sorted_vals, p):
+    if not sorted_vals:
+        return 0.0
+    return sorted_vals[min(len(sorted_vals) - 1, int(p * len(sorted_vals)))]
+
+class Harness:
+    def __init__(self, bot, fake_bot, chats, workers, drain_timeout=120):
+        self.bot = bot
+        self.fake = fake_bot
+        self.chats = chats
+        self.workers = workers
+        self.drain_timeout = drain_timeout
+        self.user_id = next(iter(bot.ADMINS))
+        self.report_futs = []
+        queue_report = bot._queue_report
+
+        def tracked(*args, **kwargs):
+            fut = queue_report(*args, **kwargs)
+            self.report_futs.append(fut)
+            return fut
+        bot._queue_report = tracked  # handlers look the name up at call time
+
+    def prefill(self, rows_per_chat, days_back=0, chats=None):
+        # rows_per_chat entries per chat on the business day `days_back` days ago, through the writer
+        when = datetime.datetime.utcnow() - datetime.timedelta(days=days_back)
+        rate = 88.0
+        last = None
+        for chat_id in chats or self.chats:
+            for i in range(rows_per_chat):
+                if i % 4 == 3:
+                    usd = float(10 + i % 90)
+                    row = self.bot._tx_row(chat_id, "op", "payout", usd * rate, usd, when, rate, 0.0)
+                else:
+                    inr = float(500 + (i * 37) % 20000)
+                    row = self.bot._tx_row(chat_id, "op", "income", inr, inr / rate, when, rate, 0.0)
+                last = self.bot._tx_writer.submit(row)
+        if last is not None:
+            last.result()
+        self.bot._tx_writer.flush()
+
+    def drain(self):
+        # wait for queued reports, debounced summaries and the outbox to go idle
+        deadline = time.monotonic() + self.drain_timeout
+        for fut in self.report_futs:
+            send = fut.result(timeout=max(0.0, deadline - time.monotonic()))
+            if send is not None:
+                try:
+                    send.result(timeout=max(0.0, deadline - time.monotonic()))
+                except concurrent.futures.TimeoutError:
+                    raise
+                except Exception:
+                    pass  # counted by the outbox as failed
+        self.report_futs = []
+        while time.monotonic() < deadline:
+            s = self.bot._outbox.stats()
+            if not self.bot._summaries.pending and not sum(s["depth"].values()) and not s["in_flight"]:
+                return
+            time.sleep(0.002)
+        raise TimeoutError("outbox did not drain")
+
+    def measure(self, calls):
+        # calls: [(fn, args)] run on `workers` threads like the dispatcher's pool
+        self.fake.reset(); db_clock.reset()
+        sent0 = self.bot._outbox.stats()
+        lat = []
+
+        def one(item):
+            fn, args = item
+            t0 = time.perf_counter()
+            fn(*args)
+            return time.perf_counter() - t0
+
+        t0 = time.perf_counter()
+        if self.workers <= 1:
+            lat = [one(c) for c in calls]
+        else:
+            with concurrent.futures.ThreadPoolExecutor(self.workers) as pool:
+                lat = list(pool.map(one, calls))
+        handled = time.perf_counter() - t0
+        self.drain()
+        total = time.perf_counter() - t0
+        lat.sort()
+        stats = self.bot._outbox.stats()
+        return {
+            "calls": len(calls),
+            "handler_wall_s": round(handled, 4),
+            "total_wall_s": round(total, 4),
+            "throughput_per_s": round(len(calls) / handled, 1) if handled else None,
+            "latency_ms": {"p50": round(_pct(lat, 0.50) * 1e3, 3), "p99": round(_pct(lat, 0.99) * 1e3, 3),
+                           "max": round(lat[-1] * 1e3, 3) if lat else 0.0},
+            "db_s": round(db_clock.seconds, 4),
+            "db_calls": db_clock.calls,
+            "outbound": dict(self.fake.calls),
+            "outbound_bytes": self.fake.bytes_sent,
+            "send_failed": stats["failed"] - sent0["failed"],
+        }
+
+    # ---- workloads ----
+    def text_burst(self, messages, expr_share=0.1, payout_share=0.2, seed=1):
+        rnd = random.Random(seed)
+        calls = []
+        for i in range(messages):
+            chat_id = self.chats[i % len(self.chats)]
+            x = rnd.random()
+            if x < expr_share:
+                text = f"+{rnd.randint(100, 9999)}*1.07"
+            elif x < expr_share + payout_share:
+                text = f"T{rnd.randint(1, 500)}"
+            else:
+                text = f"+{rnd.randint(100, 50000)}"
+            calls.append((self.bot.text_handler, (make_update(self.fake, chat_id, self.user_id, text), make_context(self.fake))))
+        return self.measure(calls)
+
+    def summary_cmd(self, per_chat):
+        calls = [(self.bot.summary_cmd, (make_update(self.fake, chat_id, self.user_id, "/summary"), make_context(self.fake)))
+                 for _ in range(per_chat) for chat_id in self.chats]
+        return self.measure(calls)
+
+    def build_summary(self, per_chat, cold):
+        # cold: the summary cache and day ledgers are dropped first, so every call reloads from the DB
+        def build(chat_id):
+            if cold:
+                self.bot._summary_cache.pop(chat_id, None)
+                self.bot._ledgers.pop(chat_id, None)
+            self.bot.build_compact_message(chat_id)
+        return self.measure([(build, (chat_id,)) for _ in range(per_chat) for chat_id in self.chats])
+
+    def viewfull_clicks(self, per_chat):
+        calls = [(self.bot.viewfull_callback, (make_callback(self.fake, chat_id, self.user_id, "VIEWFULL"), make_context(self.fake)))
+                 for _ in range(per_chat) for chat_id in self.chats]
+        return self.measure(calls)
+
+    def rollover(self):
+        return self.measure([(self.bot.daily_reset, (make_context(self.fake),))])
+
+    def report(self, chat_id, fmt, gz, repeat):
+        # the 完整账单 file for one chat rendered from the DB each time (no report cache)
+        def render():
+            self.bot._render_report(chat_id, fmt, gz, io.BytesIO())
+        return self.measure([(render, ()) for _ in range(repeat)])
+
+    def clear(self, chats):
+        return self.measure([(self.bot.clear_cmd, (make_update(self.fake, chat_id, self.user_id, "/clear"), make_context(self.fake)))
+                             for chat_id in chats])
+
+    def maintenance(self, messages, budget):
+        # a text burst while the maintenance pass runs beside it; the pass's stats go with the result
+        done = {}
+        t = threading.Thread(target=lambda: done.update(self.bot._maintain(budget)))
+        t.start()
+        out = self.text_burst(messages)
+        t.join()
+        out["maintenance"] = done
+        return out
+
+    def ingest(self, mode, messages, rate, rtt, connections=40):
+        # end-to-end latency (update created at Telegram -> handler done) for long polling vs webhook.
+        # Polling: getUpdates pays a round trip per batch and the v13 dispatcher runs updates one by
+        # one. Webhook: `connections` senders POST to the bot's real embedded server (each send pays
+        # half a round trip to reach us), and the bot's per-chat workers take it from there.
+        pending = queue.Queue()
+        created = {}
+        lock = threading.Lock()
+        lat = []
+        last_seen = {}
+        out_of_order = [0]
+        all_done = threading.Event()
+        handler = self.bot._handler(self.bot.text_handler)
+
+        def process(data):
+            handler(update_from_json(self.fake, data), make_context(self.fake))
+            chat_id = data["message"]["chat"]["id"]
+            with lock:
+                lat.append(time.perf_counter() - created[data["update_id"]])
+                if last_seen.get(chat_id, -1) > data["update_id"]:
+                    out_of_order[0] += 1
+                last_seen[chat_id] = data["update_id"]
+                if len(lat) == messages:
+                    all_done.set()
+
+        def poller():
+            while not all_done.is_set():
+                time.sleep(rtt / 2)  # getUpdates reaches Telegram, then long-polls
+                try:
+                    batch = [pending.get(timeout=0.5)]
+                except queue.Empty:
+                    continue
+                while len(batch) < 100:
+                    try:
+                        batch.append(pending.get_nowait())
+                    except queue.Empty:
+                        break
+                time.sleep(rtt / 2)
+                for data in batch:
+                    process(data)
+
+        def sender(port, path):
+            con = http.client.HTTPConnection("127.0.0.1", port)
+            while True:
+                data = pending.get()
+                if data is None:
+                    return
+                time.sleep(rtt / 2)
+                body = json.dumps(data)
+                while True:
+                    con.request("POST", path, body, {"Content-Type": "application/json"})
+                    resp = con.getresponse(); resp.read()
+                    if resp.status != 503:
+                        break
+                    time.sleep(1)  # Telegram backs off on errors
+                time.sleep(rtt / 2)  # the ack travels back before this connection is reused
+
+        self.fake.reset(); db_clock.reset()
+        ingest = None
+        if mode == "polling":
+            threads = [threading.Thread(target=poller, daemon=True)]
+        else:
+            ingest = self.bot._WebhookIngest(process, path="/bench")
+            port = ingest.start("127.0.0.1", 0)
+            threads = [threading.Thread(target=sender, args=(port, "/bench"), daemon=True) for _ in range(connections)]
+        for t in threads:
+            t.start()
+        t0 = time.perf_counter()
+        for i in range(messages):
+            delay = t0 + i / rate - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            data = update_json(i + 1, self.chats[i % len(self.chats)], self.user_id, f"+{100 + i}")
+            created[i + 1] = time.perf_counter()
+            pending.put(data)
+        if not all_done.wait(self.drain_timeout):
+            raise TimeoutError(f"{mode}: {len(lat)} of {messages} updates handled")
+        wall = time.perf_counter() - t0
+        if ingest is not None:
+            for _ in threads:
+                pending.put(None)
+            ingest.stop()
+        self.drain()
+        lat.sort()
+        return {
+            "calls": messages,
+            "handler_wall_s": round(wall, 4),
+            "total_wall_s": round(time.perf_counter() - t0, 4),
+            "throughput_per_s": round(messages / wall, 1),
+            "latency_ms": {"p50": round(_pct(lat, 0.50) * 1e3, 3), "p99": round(_pct(lat, 0.99) * 1e3, 3),
+                           "max": round(lat[-1] * 1e3, 3)},
+            "db_s": round(db_clock.seconds, 4),
+            "db_calls": db_clock.calls,
+            "outbound": dict(self.fake.calls),
+            "outbound_bytes": self.fake.bytes_sent,
+            "out_of_order": out_of_order[0],
+            "offered_rate_per_s": rate,
+            "rtt_ms": rtt * 1e3,
+        }
+
+def shard_burst(db_path, chats, messages, workers, prefill, barrier, results):
+    # body of one shard process in the sharding workload: its own bot module, DB and writer
+    bot = setup_bot(db_path)
+    try:
+        h = Harness(bot, FakeBot(), chats, workers)
+        h.prefill(prefill)
+        barrier.wait()  # all shards start the burst together
+        results.put(h.text_burst(messages))
+    finally:
+        teardown_bot(bot)
+
+STARTUP_ADMIN = 777  # stored admin (not built in) who sends the probe's update
+
+def build_startup_db(db_path, chats, rows, archived_days=5):
+    # a large tx.db: `rows` entries today and as many per day for `archived_days` earlier days
+    # (rolled into the archive), spread over `chats`, and settings rows for rows // 10 chats
+    bot = setup_bot(db_path)
+    try:
+        con = sqlite3.connect(db_path)
+        now = datetime.datetime.utcnow()
+        with con:
+            for day in range(archived_days, -1, -1):
+                when = now - datetime.timedelta(days=day)
+                con.executemany(bot._TX_INSERT, (bot._tx_row(chats[i % len(chats)], f"op{i % 7}", "income",
+                                                             float(100 + i % 5000), (100 + i % 5000) / 88.0, when, 88.0, 0.0)
+                                                 for i in range(rows)))
+            con.executemany("INSERT OR REPLACE INTO settings (chat_id, exchange_rate, fee_rate) VALUES (?, 88.0, 0.0)",
+                            [(c,) for c in chats] + [(-2000000000000 - i,) for i in range(rows // 10)])
+            con.execute("INSERT OR IGNORE INTO admins (user_id) VALUES (?)", (STARTUP_ADMIN,))
+        con.close()
+        bot._rollover(bot._to_ts(bot._ist_bounds_for_today()[0]))
+        bot.rebuild_rollups()
+    finally:
+        teardown_bot(bot)
+
+def startup_probe(db_path, chat_id, user_id, results):
+    # body of a fresh process: time from here (interpreter and bench already up) to the bot
+    # module imported, to ready for updates, to the first update handled and its summary sent
+    t0 = time.perf_counter()
+    bot = load_bot(db_path)
+    bot.SUMMARY_DEBOUNCE_SECS = 0.0
+    t_import = time.perf_counter()
+    boot_bot(bot)
+    t_ready = time.perf_counter()
+    fake = FakeBot()
+    bot.text_handler(make_update(fake, chat_id, user_id, "+500"), make_context(fake))
+    t_handled = time.perf_counter()
+    while not fake.calls["send_message"]:
+        time.sleep(0.0005)
+    t_summary = time.perf_counter()
+    results.put({"import_s": round(t_import - t0, 4), "ready_s": round(t_ready - t0, 4),
+                 "first_update_s": round(t_handled - t0, 4), "first_summary_s": round(t_summary - t0, 4)})
+    teardown_bot(bot)
@@ -6,42 +6,319 @@ Set TOKEN in environment before running.
 Usage:
   export TOKEN="123456:ABC..."   (Linux/macOS)
   python3 bot.py
+
+Webhook mode (instead of long polling):
+  WEBHOOK_URL=https://bot.example.com python3 bot.py
+  WEBHOOK_URL=local WEBHOOK_SECRET=dev python3 bot.py     # no setWebhook; then replay updates:
+  curl -H 'Content-Type: application/json' -d @update.json http://127.0.0.1:8443/dev
+
+Backfill ledgers from exported logs or spreadsheets (CSV or JSONL, see "bulk import"):
+  python3 bot.py import export.csv --chat -1001234567890 --rate 88
+
+DB maintenance (vacuum, WAL checkpoint, ANALYZE) runs daily at MAINT_TIME; to run it now:
+  python3 bot.py maintain
 """
+from __future__ import annotations
 
 import os
 import sys
+import functools
+import bisect
+import itertools
 import re
 import io
+import csv
+import gzip
+import tempfile
 import sqlite3
+import time
+import threading
+import queue
+import collections
+import contextlib
+import concurrent.futures
 import datetime
+import decimal
 import logging
-import pytz
+import math
+import http.server
+import json
+import hashlib
+import signal
+import zoneinfo
 import ast
 import operator as op
 
-from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
-from telegram.ext import Updater, CommandHandler, MessageHandler, Filters, CallbackContext, CallbackQueryHandler
+def _import_telegram():
+    # python-telegram-bot costs ~0.3s to import, so the entry points load it (see _boot)
+    # instead of the module; annotations are strings, only runtime uses need the names
+    global Update, InlineKeyboardButton, InlineKeyboardMarkup, BadRequest, NetworkError, RetryAfter, Unauthorized
+    global Updater, CommandHandler, MessageHandler, Filters, CallbackContext, CallbackQueryHandler, urllib3
+    from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
+    from telegram.error import BadRequest, NetworkError, RetryAfter, Unauthorized
+    from telegram.utils.request import urllib3  # vendored or upstream, whichever the library uses
+    from telegram.ext import Updater, CommandHandler, MessageHandler, Filters, CallbackContext, CallbackQueryHandler
 
 # ====== CONFIG ======
 TOKEN = os.environ.get("")
 DB_PATH = "tx.db"
 LAST_N = 5
 
+# sqlite tuning — per-connection PRAGMAs, applied once when a thread opens its connection
+DB_SYNCHRONOUS = "NORMAL"          # WAL + NORMAL: no fsync per commit, never corrupts
+DB_WRITER_SYNCHRONOUS = "FULL"     # tx writer: each group commit is fsynced before its entries are acknowledged
+DB_CACHE_KB = 16384                # page cache per connection
+DB_MMAP_BYTES = 128 * 1024 * 1024  # memory-mapped reads
+DB_STMT_CACHE = 128                # prepared statements kept per connection
+TS_BACKFILL_BATCH = 5000           # rows per commit when filling transactions.ts for old rows
+TS_BACKFILL_PAUSE = 0.05           # seconds between backfill batches, lets live writes in
+IMPORT_BATCH = 50000               # rows per executemany when staging a bulk import
+IMPORT_PROGRESS_SECS = 2.0         # bulk import progress line interval
+IMPORT_MERGE_BATCH = 20000         # rows per write transaction when merging an import
+IMPORT_MERGE_PAUSE = 0.02          # seconds between those transactions, lets the bot's writer in
+IMPORT_CHECK_SECS = 1.0            # a running bot looks for imported rows at most this often
+DB_WRITE_BATCH = 500               # max transactions per group commit
+DB_WRITE_MAX_DELAY = 0.005         # seconds the writer waits for more rows before committing
+
+# daily maintenance, off-peak: freed pages back to the OS, WAL trimmed, planner stats refreshed
+MAINT_TIME = datetime.time(hour=21, minute=0)  # 02:30 IST, as naive UTC (see _schedule_jobs)
+MAINT_BUDGET_SECS = 30.0           # no new step is started after this long
+MAINT_VACUUM_PAGES = 256           # pages given back per incremental_vacuum step (one short write lock)
+MAINT_PAUSE = 0.05                 # seconds between steps, lets the tx writer in
+MAINT_BUSY_MS = 200                # lock wait per step; a step that gets no lock is retried next round
+MAINT_ANALYSIS_LIMIT = 1000        # rows ANALYZE samples per index
+
+# asyncio mode: BOT_ASYNC=1 runs handlers as coroutines, concurrent across chats, ordered per chat
+BOT_ASYNC = os.environ.get("BOT_ASYNC", "") == "1"
+DB_EXECUTOR_WORKERS = 4            # bounded pool for DB work in asyncio mode
+IO_EXECUTOR_WORKERS = 16           # pool for blocking Telegram API calls in asyncio mode
+
+# a burst of entries in one chat gets one summary, sent this many seconds after the first entry
+SUMMARY_DEBOUNCE_SECS = 1.0        # 0 = one summary per entry
+SUMMARY_EDIT_IN_PLACE = False      # True = edit the chat's last summary instead of posting a new one
+
+# rates, fees and admins are served from memory; changes made by other processes are picked up
+SETTINGS_CHECK_SECS = 1.0          # at most this often (0 = on every read)
+
+# outbound sends — Telegram allows ~30 msg/s per bot, ~1 msg/s per chat and 20 msg/min per group
+SEND_GLOBAL_PER_SEC = 30
+SEND_CHAT_PER_SEC = 1.0
+SEND_GROUP_PER_MIN = 20
+SEND_CHAT_BURST = 3                # sends a quiet chat may make back to back
+SEND_WORKERS = 8                   # concurrent API calls
+SEND_RETRIES = 3                   # calls that never reached Telegram retried with backoff; RetryAfter always waits and retries
+
+# full report (完整账单 button, /viewfull [csv] [gz])
+REPORT_FORMAT = "txt"              # txt | csv
+REPORT_GZIP = False
+REPORT_CHUNK_ROWS = 2000           # rows fetched from the cursor per step
+REPORT_SPOOL_BYTES = 1 << 20       # bigger reports spill from memory to a temp file
+REPORT_CACHE_SIZE = 64             # rendered reports kept for repeated clicks on an unchanged day
+REPORT_WORKERS = 2                 # threads rendering reports, off the handler threads
+
+SUMMARY_CACHE_SIZE = 5000          # chats whose rendered summary (and day ledger) stay in memory
+WARM_CHATS = 200                   # day ledgers loaded in the background at start-up, most active first
+WARM_RETRY_MAX = 60.0              # a failed start-up settings load is retried after 1s, doubling up to this
+ARITH_CACHE_SIZE = 1024            # evaluated "+100*1.07" style expressions kept
+
+# Prometheus text on http://METRICS_BIND:METRICS_PORT/metrics (0 = off)
+METRICS_PORT = int(os.environ.get("METRICS_PORT") or 0)
+METRICS_BIND = os.environ.get("METRICS_BIND", "127.0.0.1")
+PROFILE_INTERVAL_MS = 10           # /profile on: stack sample period
+PROFILE_TOP = 15                   # functions listed by /profile off
+
+# webhook mode: set WEBHOOK_URL (public https base) to receive updates by POST instead of long polling
+WEBHOOK_URL = os.environ.get("WEBHOOK_URL", "")
+WEBHOOK_LISTEN = os.environ.get("WEBHOOK_LISTEN", "0.0.0.0")
+WEBHOOK_PORT = int(os.environ.get("WEBHOOK_PORT") or 8443)
+WEBHOOK_SECRET = os.environ.get("WEBHOOK_SECRET", "")  # URL path; default is derived from TOKEN
+WEBHOOK_WORKERS = 8                # update workers; a chat always lands on the same one
+WEBHOOK_QUEUE = 10000              # updates buffered in total before POSTs get 503 (Telegram redelivers)
+WEBHOOK_MAX_CONNECTIONS = 40       # parallel POSTs Telegram may open
+WEBHOOK_MAX_BODY = 1 << 20
+
+# sharded mode: SHARDS > 1 runs a front process plus one process and DB file per shard (chat_id % SHARDS).
+# `python3 bot.py split-shards` splits an existing DB_PATH into the shard files first.
+SHARDS = int(os.environ.get("SHARDS") or 1)
+SHARD_DB_PATTERN = os.environ.get("SHARD_DB_PATTERN", "tx.shard{}.db")
+SHARD_QUEUE = 10000                # updates buffered per shard before the front waits
+SHARD_RESTART_MAX = 60.0           # a shard that exits is restarted after 1s, doubling up to this
+SHARD_ID = None                    # set inside a shard process
+
 # built-in admins — बदलना हो तो यहाँ कर लो
 ADMINS = {6603524612, 7773526534, 8157411319}
-authorized_users = set(ADMINS)
-
-# per-chat caches
-exchange_rates = {}
-fee_rates = {}
 
 # timezone
-IST = pytz.timezone("Asia/Kolkata")
+IST = zoneinfo.ZoneInfo("Asia/Kolkata")
 
 # logging
 logging.basicConfig(format="%(asctime)s - %(name)s - %(levelname)s - %(message)s", level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# ====== metrics ======
+# Counters and histograms kept in process and rendered in Prometheus text format. Gauges
+# (queue depths, cache sizes) are read by collectors at scrape time rather than tracked.
+_LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+_ROW_BUCKETS = (0, 10, 100, 1000, 10000, 100000)
+
+class _Metrics:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.meta = {}        # name -> (type, help, buckets)
+        self.values = {}      # (name, labels) -> number, or per-bucket counts + [sum] for histograms
+        self.collectors = []  # fns returning [(name, {labels}, value)]
+
+    def define(self, name, type_, help_, buckets=None):
+        self.meta[name] = (type_, help_, buckets)
+
+    def inc(self, name, n=1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + n
+
+    def observe(self, name, value, **labels):
+        buckets = self.meta[name][2]
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            h = self.values.get(key)
+            if h is None:
+                h = self.values[key] = [0] * (len(buckets) + 2)
+            h[bisect.bisect_left(buckets, value)] += 1
+            h[-1] += value
+
+    def timed(self, name, errors=None, **labels):
+        return _Timer(self, name, errors, labels)
+
+    def render(self):
+        series = collections.defaultdict(list)
+        for fn in self.collectors:
+            try:
+                for (name, labels, value) in fn():
+                    series[name].append((tuple(sorted(labels.items())), value))
+            except Exception as e:
+                logger.warning("metrics collector %s failed: %s", fn.__name__, e)
+        with self.lock:
+            for ((name, labels), v) in self.values.items():
+                series[name].append((labels, list(v) if isinstance(v, list) else v))
+        out = []
+        for name in sorted(series):
+            type_, help_, buckets = self.meta.get(name, ("untyped", "", None))
+            out.append(f"# HELP {name} {help_}")
+            out.append(f"# TYPE {name} {type_}")
+            for (labels, v) in sorted(series[name], key=lambda x: str(x[0])):
+                if type_ != "histogram":
+                    out.append(f"{name}{_fmt_labels(labels)} {v}")
+                    continue
+                acc = 0
+                for (le, n) in zip(buckets + ("+Inf",), v):
+                    acc += n
+                    out.append(f"{name}_bucket{_fmt_labels(labels + (('le', le),))} {acc}")
+                out.append(f"{name}_sum{_fmt_labels(labels)} {v[-1]}")
+                out.append(f"{name}_count{_fmt_labels(labels)} {acc}")
+        return "\n".join(out) + "\n"
+
+class _Timer:
+    __slots__ = ("metrics", "name", "errors", "labels", "t0")
+
+    def __init__(self, metrics, name, errors, labels):
+        self.metrics = metrics; self.name = name; self.errors = errors; self.labels = labels
+
+    def __enter__(self):
+        self.t0 = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.metrics.observe(self.name, time.perf_counter() - self.t0, **self.labels)
+        if exc_type is not None and self.errors:
+            self.metrics.inc(self.errors, **self.labels)
+        return False
+
+def _fmt_labels(labels):
+    if not labels:
+        return ""
+    esc = lambda v: str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+    return "{" + ",".join(f'{k}="{esc(v)}"' for (k, v) in labels) + "}"
+
+_metrics = _Metrics()
+for (_name, _type, _help, _buckets) in (
+        ("bot_handler_seconds", "histogram", "Handler run time", _LATENCY_BUCKETS),
+        ("bot_handler_errors_total", "counter", "Handlers that raised", None),
+        ("bot_chat_wait_seconds", "histogram", "asyncio mode: wait for the chat's previous update", _LATENCY_BUCKETS),
+        ("bot_db_seconds", "histogram", "DB helper run time", _LATENCY_BUCKETS),
+        ("bot_db_errors_total", "counter", "DB helpers that raised", None),
+        ("bot_db_lock_wait_seconds", "histogram", "Time to get the SQLite write lock (BEGIN IMMEDIATE)", _LATENCY_BUCKETS),
+        ("bot_send_seconds", "histogram", "Telegram API call time", _LATENCY_BUCKETS),
+        ("bot_send_queue_seconds", "histogram", "Time a send waited in the outbox", _LATENCY_BUCKETS),
+        ("bot_send_errors_total", "counter", "Failed Telegram API calls", None),
+        ("bot_send_retries_total", "counter", "Telegram API calls retried", None),
+        ("bot_summary_rows_scanned", "histogram", "Rows read from the DB per summary build", _ROW_BUCKETS),
+        ("bot_summary_cache_total", "counter", "Summary cache lookups", None),
+        ("bot_settings_reloads_total", "counter", "Settings and admins reloaded from the DB", None)):
+    _metrics.define(_name, _type, _help, _buckets)
+
+def _db_timed(fn):
+    # DB helper timing, labelled with the helper's name
+    name = fn.__name__
+    @functools.wraps(fn)
+    def timed(*args, **kwargs):
+        with _metrics.timed("bot_db_seconds", "bot_db_errors_total", op=name):
+            return fn(*args, **kwargs)
+    return timed
+
+def _begin_immediate(con, where):
+    t0 = time.perf_counter()
+    con.execute("BEGIN IMMEDIATE")
+    _metrics.observe("bot_db_lock_wait_seconds", time.perf_counter() - t0, where=where)
+
+# ---- sampling profiler (/profile) ----
+# A daemon thread snapshots every thread's stack each interval; samples are kept as collapsed
+# stacks ("outer;inner;leaf" -> count), the input format of flamegraph tools.
+class _Sampler:
+    def __init__(self):
+        self.thread = None
+        self.stop_evt = threading.Event()
+        self.stacks = collections.Counter()
+        self.samples = 0
+        self.started = None
+
+    @property
+    def running(self):
+        return self.thread is not None
+
+    def start(self, interval):
+        if self.thread is not None:
+            return False
+        self.stacks = collections.Counter(); self.samples = 0
+        self.started = time.monotonic()
+        self.stop_evt.clear()
+        self.thread = threading.Thread(target=self._run, args=(interval,), name="profiler", daemon=True)
+        self.thread.start()
+        return True
+
+    def stop(self):
+        # -> (collapsed stacks Counter, samples, seconds) of the finished run
+        if self.thread is None:
+            return None
+        self.stop_evt.set(); self.thread.join()
+        self.thread = None
+        return self.stacks, self.samples, time.monotonic() - self.started
+
+    def _run(self, interval):
+        me = threading.get_ident()
+        while not self.stop_evt.wait(interval):
+            for (tid, frame) in sys._current_frames().items():
+                if tid == me:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+                    frame = frame.f_back
+                self.stacks[";".join(reversed(stack))] += 1
+            self.samples += 1
+
+_sampler = _Sampler()
+
 # ====== safe arithmetic evaluator ======
 _ALLOWED_OPS = {
     ast.Add: op.add,
@@ -79,14 +356,358 @@ def safe_eval_arith(expr: str) -> float:
     parsed = ast.parse(expr, mode='eval')
     return float(_eval(parsed.body))
 
-# ====== DB helpers ======
+# ====== DB connections ======
+# One long-lived connection per thread (dispatcher workers, job queue). sqlite3 objects
+# must stay on the thread that made them, so a thread-local slot is our pool; the
+# statement cache on each connection reuses prepared statements for our fixed SQL.
+_db_local = threading.local()
+_db_all = []
+_db_all_lock = threading.Lock()
+
+def _db_open(check_same_thread=True):
+    con = sqlite3.connect(DB_PATH, timeout=10, detect_types=sqlite3.PARSE_DECLTYPES,
+                          cached_statements=DB_STMT_CACHE, check_same_thread=check_same_thread)
+    con.execute(f"PRAGMA synchronous={DB_SYNCHRONOUS}")
+    con.execute(f"PRAGMA cache_size=-{int(DB_CACHE_KB)}")
+    con.execute(f"PRAGMA mmap_size={int(DB_MMAP_BYTES)}")
+    return con
+
 def _db_connect():
-    con = sqlite3.connect(DB_PATH, timeout=10, detect_types=sqlite3.PARSE_DECLTYPES)
-    con.execute("PRAGMA journal_mode=WAL;")
+    con = getattr(_db_local, "con", None)
+    if con is None:
+        con = _db_open()
+        _db_local.con = con
+        with _db_all_lock:
+            _db_all.append(con)
     return con
 
+def _db_close_all():
+    with _db_all_lock:
+        cons = list(_db_all); _db_all.clear()
+    for con in cons:
+        try:
+            con.close()
+        except:
+            pass
+    _db_local.__dict__.clear()
+    _settings.close()
+    _imports.close()
+
+# ====== schema migrations ======
+# PRAGMA user_version holds the last step applied. Each step runs once, in its own
+# transaction together with the version bump; append new steps, never edit old ones.
+_EPOCH = datetime.datetime(1970, 1, 1)
+
+def _to_ts(dt):
+    # epoch microseconds (UTC); naive datetimes are UTC like time_iso
+    if dt.tzinfo is not None:
+        dt = dt.astimezone(datetime.timezone.utc).replace(tzinfo=None)
+    return (dt - _EPOCH) // datetime.timedelta(microseconds=1)
+
+# The business day starts 08:30 IST = 03:00 UTC, so a row's day is the UTC date of ts - 3h.
+_BUSINESS_DAY_SQL = "date(ts / 1000000 - 10800, 'unixepoch')"
+_DAY_SHIFT_US = 3 * 3600 * 1000000
+
+def _business_day(ts):
+    # same result as _BUSINESS_DAY_SQL, as a datetime.date
+    return (_EPOCH + datetime.timedelta(microseconds=(ts // 1000000) * 1000000 - _DAY_SHIFT_US)).date()
+
+def _m1_tx_ts(con):
+    cols = {r[1] for r in con.execute("PRAGMA table_info(transactions)")}
+    if "ts" not in cols:
+        con.execute("ALTER TABLE transactions ADD COLUMN ts INTEGER")
+    con.execute("CREATE INDEX IF NOT EXISTS idx_tx_chat_ts ON transactions(chat_id, ts)")
+
+def _m2_archive(con):
+    # closed business days move here at the daily rollover; business_day is the partition key
+    con.execute("""CREATE TABLE IF NOT EXISTS transactions_archive (
+        id INTEGER PRIMARY KEY,
+        chat_id INTEGER,
+        user TEXT,
+        type TEXT,
+        amount_inr REAL,
+        amount_usd REAL,
+        time_iso TEXT,
+        ts INTEGER,
+        business_day TEXT
+    )""")
+    con.execute("CREATE INDEX IF NOT EXISTS idx_archive_day_chat ON transactions_archive(business_day, chat_id)")
+    con.execute("CREATE INDEX IF NOT EXISTS idx_archive_chat_ts ON transactions_archive(chat_id, ts)")
+    con.execute("""CREATE TABLE IF NOT EXISTS daily_rollup (
+        business_day TEXT,
+        chat_id INTEGER,
+        inc_count INTEGER,
+        inc_inr REAL,
+        inc_usd REAL,
+        pay_count INTEGER,
+        pay_inr REAL,
+        pay_usd REAL,
+        PRIMARY KEY (business_day, chat_id)
+    )""")
+
+def _m3_user_rollup(con):
+    # per chat, business day, operator and type; kept current by the writer, see _rollup_rebuild
+    con.execute("""CREATE TABLE IF NOT EXISTS user_rollup (
+        chat_id INTEGER,
+        business_day TEXT,
+        user TEXT,
+        type TEXT,
+        count INTEGER,
+        inr REAL,
+        usd REAL,
+        PRIMARY KEY (chat_id, business_day, user, type)
+    ) WITHOUT ROWID""")
+    con.execute(f"""INSERT INTO user_rollup (chat_id, business_day, user, type, count, inr, usd)
+                     SELECT chat_id, {_BUSINESS_DAY_SQL}, user, type, COUNT(*), TOTAL(amount_inr), TOTAL(amount_usd)
+                     FROM (SELECT chat_id, user, type, amount_inr, amount_usd, ts FROM transactions
+                           UNION ALL
+                           SELECT chat_id, user, type, amount_inr, amount_usd, ts FROM transactions_archive)
+                     WHERE ts IS NOT NULL
+                     GROUP BY 1, 2, 3, 4""")
+
+def _m4_minor_units(con):
+    # money as integer paisa / cents, with the rate and fee in force on each row. amount_inr /
+    # amount_usd stay as a REAL mirror (minor / 100) for older readers. The rollup tables are
+    # derived data and are rebuilt in minor units.
+    con.create_function("to_minor", 1, lambda x: None if x is None else _to_minor(x), deterministic=True)
+    for table in ("transactions", "transactions_archive"):
+        cols = {r[1] for r in con.execute(f"PRAGMA table_info({table})")}
+        for (col, decl) in (("inr_minor", "INTEGER"), ("usd_minor", "INTEGER"), ("rate", "REAL"), ("fee", "REAL")):
+            if col not in cols:
+                con.execute(f"ALTER TABLE {table} ADD COLUMN {col} {decl}")
+        # old rows: the rate is implied by inr/usd (both entry types convert with it); fee unknown.
+        # Rounded by _to_minor like new rows: ROUND(amount * 100) makes 1.005 100, not 101
+        con.execute(f"""UPDATE {table} SET
+                            inr_minor = to_minor(amount_inr),
+                            usd_minor = to_minor(amount_usd),
+                            rate = CASE WHEN amount_usd != 0 THEN ROUND(amount_inr / amount_usd, 6) END
+                        WHERE inr_minor IS NULL""")
+    con.execute("DROP TABLE IF EXISTS user_rollup")
+    con.execute("""CREATE TABLE user_rollup (
+        chat_id INTEGER,
+        business_day TEXT,
+        user TEXT,
+        type TEXT,
+        count INTEGER,
+        inr_minor INTEGER,
+        usd_minor INTEGER,
+        PRIMARY KEY (chat_id, business_day, user, type)
+    ) WITHOUT ROWID""")
+    _rollup_rebuild(con)  # the current helper matches the schema created here
+    con.execute("DROP TABLE IF EXISTS daily_rollup")
+    con.execute("""CREATE TABLE daily_rollup (
+        business_day TEXT,
+        chat_id INTEGER,
+        inc_count INTEGER,
+        inc_inr_minor INTEGER,
+        inc_usd_minor INTEGER,
+        pay_count INTEGER,
+        pay_inr_minor INTEGER,
+        pay_usd_minor INTEGER,
+        PRIMARY KEY (business_day, chat_id)
+    )""")
+    con.execute("""INSERT INTO daily_rollup
+                     SELECT business_day, chat_id,
+                            SUM(type='income'), TOTAL(CASE WHEN type='income' THEN inr_minor END),
+                            TOTAL(CASE WHEN type='income' THEN usd_minor END),
+                            SUM(type='payout'), TOTAL(CASE WHEN type='payout' THEN inr_minor END),
+                            TOTAL(CASE WHEN type='payout' THEN usd_minor END)
+                     FROM transactions_archive GROUP BY 1, 2""")
+
+def _m5_settings_version(con):
+    # PRAGMA data_version moves on every commit by another connection, our own tx writer
+    # included; this counter only moves when settings or admins change, whoever changes them
+    con.execute("CREATE TABLE IF NOT EXISTS settings (chat_id INTEGER PRIMARY KEY, exchange_rate REAL, fee_rate REAL)")
+    con.execute("CREATE TABLE IF NOT EXISTS admins (user_id INTEGER PRIMARY KEY)")
+    con.execute("""CREATE TABLE IF NOT EXISTS settings_version (
+        id INTEGER PRIMARY KEY CHECK (id = 1),
+        n INTEGER NOT NULL
+    )""")
+    con.execute("INSERT OR IGNORE INTO settings_version (id, n) VALUES (1, 0)")
+    for table in ("settings", "admins"):
+        for event in ("INSERT", "UPDATE", "DELETE"):
+            con.execute(f"""CREATE TRIGGER IF NOT EXISTS {table}_{event.lower()}_version AFTER {event} ON {table}
+                            BEGIN UPDATE settings_version SET n = n + 1 WHERE id = 1; END""")
+
+def _m6_dedup_key(con):
+    # chat entries store their message (see _message_key) and imports their own key, so neither
+    # adds a row twice
+    for (table, idx) in (("transactions", "idx_tx_dedup"), ("transactions_archive", "idx_archive_dedup")):
+        cols = {r[1] for r in con.execute(f"PRAGMA table_info({table})")}
+        if "dedup_key" not in cols:
+            con.execute(f"ALTER TABLE {table} ADD COLUMN dedup_key TEXT")
+        con.execute(f"CREATE UNIQUE INDEX IF NOT EXISTS {idx} ON {table}(dedup_key) WHERE dedup_key IS NOT NULL")
+
+def _m7_auto_vacuum(con):
+    # deleted rows' pages can then be handed back a few at a time (see _maintain). An existing
+    # file only changes mode when rebuilt by a full VACUUM, which holds the write lock for as
+    # long as it takes: never at startup, the maintenance pass does it once, off-peak.
+    con.execute("PRAGMA auto_vacuum=INCREMENTAL")
+
+def _m8_tx_imports(con):
+    # `bot.py import` stamps the chats it adds today's rows to, so running bots drop their caches
+    con.execute("""CREATE TABLE IF NOT EXISTS tx_imports (
+        chat_id INTEGER PRIMARY KEY,
+        seq INTEGER NOT NULL
+    )""")
+
+def _m9_chat_version(con):
+    # per chat: n goes up on every change to its live or archived rows and changed_us says when
+    # (epoch microseconds, never going back); web.py's ETag / Last-Modified. Updates and deletes
+    # (ts backfill, /clear, rollover) are counted by triggers. Inserts are counted by the code
+    # making them (tx writer, bulk import, see _CHAT_VERSION_BUMP), once per batch and chat: a
+    # trigger per inserted row costs the writer about a quarter more. A rollover's archive
+    # inserts come with the deletes from the live table.
+    con.execute("""CREATE TABLE IF NOT EXISTS chat_version (
+        chat_id INTEGER PRIMARY KEY,
+        n INTEGER NOT NULL,
+        changed_us INTEGER NOT NULL
+    )""")
+    now_us = "CAST((julianday('now') - 2440587.5) * 86400000000 AS INTEGER)"
+    for table in ("transactions", "transactions_archive"):
+        for (event, row) in (("UPDATE", "NEW"), ("DELETE", "OLD")):
+            con.execute(f"""CREATE TRIGGER IF NOT EXISTS {table}_{event.lower()}_chat_version AFTER {event} ON {table}
+                            BEGIN
+                                INSERT INTO chat_version (chat_id, n, changed_us) VALUES ({row}.chat_id, 1, {now_us})
+                                ON CONFLICT(chat_id) DO UPDATE SET n = n + 1, changed_us = MAX(changed_us, excluded.changed_us);
+                            END""")
+
+_MIGRATIONS = [
+    (1, _m1_tx_ts),
+    (2, _m2_archive),
+    (3, _m3_user_rollup),
+    (4, _m4_minor_units),
+    (5, _m5_settings_version),
+    (6, _m6_dedup_key),
+    (7, _m7_auto_vacuum),
+    (8, _m8_tx_imports),
+    (9, _m9_chat_version),
+]
+
+def _migrate(con):
+    ver = con.execute("PRAGMA user_version").fetchone()[0]
+    for v, step in _MIGRATIONS:
+        if v <= ver:
+            continue
+        con.execute("BEGIN IMMEDIATE")
+        try:
+            step(con)
+            con.execute(f"PRAGMA user_version={int(v)}")
+            con.commit()
+        except:
+            con.rollback()
+            raise
+        logger.info("DB migrated to schema version %s (%s)", v, step.__name__)
+
+# Rows written before migration 1 have ts NULL. They are filled in small id-ordered batches
+# on a background thread; until that finishes, range queries keep using time_iso.
+_ts_ready = threading.Event()
+
+def _ts_backfill():
+    con = _db_connect()
+    last_id = 0; filled = 0
+    try:
+        while True:
+            rows = con.execute("SELECT id, time_iso FROM transactions WHERE id > ? AND ts IS NULL ORDER BY id LIMIT ?",
+                               (last_id, TS_BACKFILL_BATCH)).fetchall()
+            if not rows:
+                break
+            upd = []
+            for (rid, tiso) in rows:
+                try:
+                    upd.append((_to_ts(datetime.datetime.fromisoformat(tiso)), rid))
+                except:
+                    upd.append((0, rid))  # unparseable time: keep it out of every day range
+            with con:
+                con.executemany("UPDATE transactions SET ts=? WHERE id=?", upd)
+            last_id = rows[-1][0]; filled += len(rows)
+            time.sleep(TS_BACKFILL_PAUSE)
+    except Exception as e:
+        logger.exception("ts backfill stopped: %s", e)
+        return
+    if filled:
+        # rows without ts were invisible to the rollups built by migration 3
+        try:
+            rebuild_rollups()
+        except Exception as e:
+            logger.exception("rollup rebuild after ts backfill failed: %s", e)
+    _ts_ready.set()
+    if filled:
+        logger.info("ts backfill done (%s rows)", filled)
+
+# ====== rollups ======
+# user_rollup answers history questions (/stats, web /api/stats) without touching raw rows.
+# The writer upserts into it in the same transaction as each insert batch; /clear recomputes the
+# days it touched; rebuild_rollups() (or `python3 bot.py rebuild-rollups`) recomputes everything.
+_ROLLUP_UPSERT = """INSERT INTO user_rollup (chat_id, business_day, user, type, count, inr_minor, usd_minor)
+                     VALUES (?,?,?,?,1,?,?)
+                     ON CONFLICT(chat_id, business_day, user, type) DO UPDATE SET
+                         count = count + 1, inr_minor = inr_minor + excluded.inr_minor,
+                         usd_minor = usd_minor + excluded.usd_minor"""
+
+def _rollup_row(row):
+    (chat_id, user, type_, inr, usd, time_iso, ts, inr_minor, usd_minor) = row[:9]
+    return (chat_id, _business_day(ts).isoformat(), user, type_, inr_minor, usd_minor)
+
+def _rollup_rebuild(con, chat_id=None, days=None):
+    # recompute from live + archived rows; everything, or only `days` of `chat_id`. Caller commits.
+    where = ""; args = ()
+    if chat_id is not None:
+        marks = ",".join("?" * len(days))
+        where = f" WHERE chat_id=? AND {_BUSINESS_DAY_SQL} IN ({marks})"
+        args = (chat_id,) + tuple(days)
+        con.execute(f"DELETE FROM user_rollup WHERE chat_id=? AND business_day IN ({marks})", args)
+    else:
+        con.execute("DELETE FROM user_rollup")
+    con.execute(f"""INSERT INTO user_rollup (chat_id, business_day, user, type, count, inr_minor, usd_minor)
+                     SELECT chat_id, {_BUSINESS_DAY_SQL}, user, type, COUNT(*), SUM(inr_minor), SUM(usd_minor)
+                     FROM (SELECT chat_id, user, type, inr_minor, usd_minor, ts FROM transactions
+                           UNION ALL
+                           SELECT chat_id, user, type, inr_minor, usd_minor, ts FROM transactions_archive)
+                     {where or " WHERE true"} AND ts IS NOT NULL
+                     GROUP BY 1, 2, 3, 4""", args)
+
+@_db_timed
+def rebuild_rollups():
+    con = _db_connect()
+    _begin_immediate(con, "rebuild_rollups")
+    try:
+        _rollup_rebuild(con)
+        con.commit()
+    except:
+        con.rollback()
+        raise
+    n = con.execute("SELECT COUNT(*) FROM user_rollup").fetchone()[0]
+    logger.info("Rollups rebuilt: %s rows", n)
+    return n
+
+@_db_timed
+def get_user_stats(chat_id, day_from, day_to):
+    # [(user, type, count, inr_minor, usd_minor)] summed over business days day_from..day_to inclusive
+    return _db_connect().execute("""SELECT user, type, SUM(count), SUM(inr_minor), SUM(usd_minor) FROM user_rollup
+                                     WHERE chat_id=? AND business_day BETWEEN ? AND ?
+                                     GROUP BY user, type ORDER BY user, type""",
+                                  (chat_id, day_from.isoformat(), day_to.isoformat())).fetchall()
+
+# (name, sql, args) for the range lookups that must be served by idx_tx_chat_ts
+_INDEXED_QUERIES = [
+    ("day range", "SELECT id FROM transactions WHERE chat_id=? AND ts BETWEEN ? AND ? ORDER BY id", (0, 0, 0)),
+    ("chat delete", "DELETE FROM transactions WHERE chat_id=?", (0,)),
+]
+
+def _check_query_plans(con):
+    for (name, sql, args) in _INDEXED_QUERIES:
+        plan = " ".join(r[-1] for r in con.execute("EXPLAIN QUERY PLAN " + sql, args))
+        if "idx_tx_chat_ts" not in plan:
+            logger.warning("query plan for %s does not use idx_tx_chat_ts: %s", name, plan)
+
+# ====== DB helpers ======
 def init_db():
     con = _db_connect()
+    # a new file takes auto_vacuum only before WAL is on and the first table exists (see _m7_auto_vacuum)
+    con.execute("PRAGMA auto_vacuum=INCREMENTAL")
+    # journal mode is stored in the file, so setting it once here covers every connection
+    con.execute("PRAGMA journal_mode=WAL;")
     cur = con.cursor()
     cur.execute("""CREATE TABLE IF NOT EXISTS transactions (
         id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -97,6 +718,7 @@ def init_db():
         amount_usd REAL,
         time_iso TEXT
     )""")
+    _migrate(con)
     cur.execute("""CREATE TABLE IF NOT EXISTS settings (
         chat_id INTEGER PRIMARY KEY,
         exchange_rate REAL,
@@ -107,129 +729,689 @@ def init_db():
     )""")
     for a in ADMINS:
         cur.execute("INSERT OR IGNORE INTO admins (user_id) VALUES (?)", (int(a),))
-    cur.execute("SELECT user_id FROM admins")
-    for r in cur.fetchall():
-        try:
-            authorized_users.add(int(r[0]))
-        except:
-            pass
-    cur.execute("SELECT chat_id, exchange_rate, fee_rate FROM settings")
-    for (cid, er, fr) in cur.fetchall():
-        try:
-            if er is not None:
-                exchange_rates[int(cid)] = float(er)
-            if fr is not None:
-                fee_rates[int(cid)] = float(fr)
-        except:
-            pass
     con.commit()
-    con.close()
+    threading.Thread(target=_ts_backfill, name="ts-backfill", daemon=True).start()
     logger.info("DB initialized at %s", DB_PATH)
 
-def persist_setting(chat_id, exchange_rate=None, fee_rate=None):
-    con = _db_connect(); cur = con.cursor()
-    cur.execute("SELECT 1 FROM settings WHERE chat_id=?", (chat_id,))
-    exists = cur.fetchone()
-    if exists:
-        if exchange_rate is not None:
-            cur.execute("UPDATE settings SET exchange_rate=? WHERE chat_id=?", (exchange_rate, chat_id))
-        if fee_rate is not None:
-            cur.execute("UPDATE settings SET fee_rate=? WHERE chat_id=?", (fee_rate, chat_id))
-    else:
-        cur.execute("INSERT INTO.settings(chat_id, exchange_rate, fee_rate) VALUES (?,?,?)".replace('.', ''),
-                    (chat_id, exchange_rate if exchange_rate is not None else 106.0, fee_rate if fee_rate is not None else 0.0))
-        # note: above replace('.') is a tiny safety to avoid accidental dot in SQL string in some editors
-    # fallback correct implementation if previous line odd:
-    try:
-        con.commit()
-    except:
-        # normal insert/update handled earlier - ensure commit
-        con.commit()
-    con.close()
-
-def persist_admin(user_id):
-    con = _db_connect(); cur = con.cursor()
-    cur.execute("INSERT OR IGNORE INTO admins (user_id) VALUES (?)", (int(user_id),))
-    con.commit(); con.close()
-
-def remove_admin_persist(user_id):
-    con = _db_connect(); cur = con.cursor()
-    cur.execute("DELETE FROM admins WHERE user_id=?", (int(user_id),))
-    con.commit(); con.close()
-
-def add_tx_db(chat_id, user, type_, amount_inr, amount_usd):
-    con = _db_connect(); cur = con.cursor()
-    cur.execute(
-        "INSERT INTO transactions (chat_id,user,type,amount_inr,amount_usd,time_iso) VALUES (?,?,?,?,?,?)",
-        (chat_id, user, type_, float(amount_inr), float(amount_usd), datetime.datetime.utcnow().isoformat())
-    )
-    con.commit(); con.close()
+# ====== settings & admins cache ======
+# Every chat's rate and fee and the admin list are read into memory in one pass and served
+# from there. The snapshot holds every settings row, so a chat missing from it is known to
+# have none and gets the defaults without a query. Before a read the cache looks (at most
+# every SETTINGS_CHECK_SECS) at PRAGMA data_version on its own connection, which moves only
+# when another connection commits; if it moved, the trigger-kept settings_version counter
+# says whether settings or admins were among the changes, and only then is it all reloaded.
+# Writes are one UPSERT each on the same connection and update the snapshot in place.
+# Until the first full load (done by the start-up warm-up, off the update path) a chat or
+# user is looked up on its own when first asked for and remembered, found or not.
+_SETTINGS_UPSERT = """INSERT INTO settings (chat_id, exchange_rate, fee_rate)
+                      VALUES (?1, COALESCE(?2, 106.0), COALESCE(?3, 0.0))
+                      ON CONFLICT(chat_id) DO UPDATE SET
+                          exchange_rate = COALESCE(?2, exchange_rate),
+                          fee_rate = COALESCE(?3, fee_rate)"""
+
+class _SettingsCache:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.con = None
+        self.rates = {}                # chat_id -> exchange rate, only chats with a row
+        self.fees = {}
+        self.admins = frozenset(int(a) for a in ADMINS)
+        self.loaded = False
+        self.writes = 0
+        self.known = set()             # before the full load: chats already looked up
+        self.not_admins = set()        # before the full load: users looked up and not found
+        self.data_version = None
+        self.counter = None
+        self.checked = 0.0
+
+    def _connect(self):
+        if self.con is None:
+            self.con = _db_open(check_same_thread=False)  # only ever used under self.lock
+        return self.con
+
+    def _versions(self, con):
+        dv = con.execute("PRAGMA data_version").fetchone()[0]
+        row = con.execute("SELECT n FROM settings_version WHERE id = 1").fetchone()
+        return (dv, row[0] if row else None)
+
+    @_db_timed
+    def load(self):
+        # the full read runs on the caller's connection without the lock, so on-demand lookups
+        # are not held up by it; if a write slipped in meanwhile it is read again under the lock
+        writes = self.writes
+        snap = self._read(_db_connect())
+        with self.lock:
+            if self.writes != writes:
+                snap = self._read(self._connect())
+            elif snap[3] is not None:
+                snap = snap[:3] + (None, snap[4])  # data_version is per connection: not ours
+            self._apply(*snap)
+
+    def _load(self, con):
+        self._apply(*self._read(con))
+
+    def _read(self, con):
+        own = not con.in_transaction
+        if own:
+            con.execute("BEGIN")  # rows and counter from one snapshot
+        try:
+            rates = dict(con.execute("""SELECT CAST(chat_id AS INTEGER), CAST(exchange_rate AS REAL)
+                                        FROM settings WHERE exchange_rate IS NOT NULL"""))
+            fees = dict(con.execute("""SELECT CAST(chat_id AS INTEGER), CAST(fee_rate AS REAL)
+                                       FROM settings WHERE fee_rate IS NOT NULL"""))
+            admins = {int(a) for a in ADMINS}
+            admins.update(r[0] for r in con.execute("SELECT CAST(user_id AS INTEGER) FROM admins"))
+            (data_version, counter) = self._versions(con)
+        finally:
+            if own:
+                con.commit()
+        return (rates, fees, admins, data_version, counter)
+
+    def _apply(self, rates, fees, admins, data_version, counter):
+        # summaries show the rate and fee, so chats whose values changed underneath us get re-rendered
+        if self.loaded:
+            served = set(rates) | set(self.rates) | set(fees) | set(self.fees)
+        else:
+            served = self.known
+        changed = {c for c in served if rates.get(c) != self.rates.get(c) or fees.get(c) != self.fees.get(c)}
+        (self.data_version, self.counter) = (data_version, counter)
+        self.rates, self.fees, self.admins = rates, fees, frozenset(admins)
+        self.loaded = True
+        self.known = set(); self.not_admins = set()
+        self.checked = time.monotonic()
+        _metrics.inc("bot_settings_reloads_total")
+        for chat_id in changed:
+            _bump_version(chat_id)
+
+    def _lookup_chat(self, chat_id):
+        with self.lock:
+            if self.loaded or chat_id in self.known:
+                return
+            row = self._connect().execute("SELECT exchange_rate, fee_rate FROM settings WHERE chat_id=?",
+                                          (chat_id,)).fetchone()
+            if row is not None and row[0] is not None:
+                self.rates[chat_id] = float(row[0])
+            if row is not None and row[1] is not None:
+                self.fees[chat_id] = float(row[1])
+            self.known.add(chat_id)
+
+    def _lookup_admin(self, user_id):
+        with self.lock:
+            if self.loaded or user_id in self.admins or user_id in self.not_admins:
+                return
+            if self._connect().execute("SELECT 1 FROM admins WHERE user_id=?", (user_id,)).fetchone():
+                self.admins = self.admins | {user_id}
+            else:
+                self.not_admins.add(user_id)
+
+    def _fresh(self):
+        if not self.loaded or time.monotonic() - self.checked < SETTINGS_CHECK_SECS:
+            return
+        with self.lock:
+            if time.monotonic() - self.checked < SETTINGS_CHECK_SECS:
+                return
+            try:
+                con = self._connect()
+                dv = con.execute("PRAGMA data_version").fetchone()[0]
+                if dv != self.data_version:
+                    (self.data_version, counter) = self._versions(con)
+                    if counter != self.counter:
+                        self._load(con)
+                self.checked = time.monotonic()
+            except:
+                logger.exception("settings check failed; serving the cached values")
+                self.checked = time.monotonic()
+
+    def rate(self, chat_id):
+        self._fresh()
+        if not self.loaded and chat_id not in self.known:
+            self._lookup_chat(chat_id)
+        return self.rates.get(chat_id, 106.0)
+
+    def fee(self, chat_id):
+        self._fresh()
+        if not self.loaded and chat_id not in self.known:
+            self._lookup_chat(chat_id)
+        return self.fees.get(chat_id, 0.0)
+
+    def is_admin(self, user_id):
+        self._fresh()
+        user_id = int(user_id)
+        if not self.loaded and user_id not in self.admins:
+            self._lookup_admin(user_id)
+        return user_id in self.admins
+
+    def _write(self, sql, args):
+        # one statement in its own transaction; if nobody else touched settings since our
+        # last look the counter moved by exactly one and the snapshot needs no reload
+        con = self._connect()
+        self.writes += 1
+        with con:
+            con.execute(sql, args)
+            counter = self._versions(con)[1]
+        if self.counter is not None and counter == self.counter + 1:
+            self.counter = counter
+        else:
+            self.counter = None  # someone else wrote too: reload on the next read
+            self.checked = 0.0
+
+    @_db_timed
+    def set(self, chat_id, exchange_rate=None, fee_rate=None):
+        if not self.loaded:
+            self._lookup_chat(chat_id)  # the value not being set must be the stored one
+        with self.lock:
+            self._write(_SETTINGS_UPSERT, (chat_id, exchange_rate, fee_rate))
+            # copy and swap: readers never take the lock
+            rates, fees = dict(self.rates), dict(self.fees)
+            rates[chat_id] = float(exchange_rate) if exchange_rate is not None else rates.get(chat_id, 106.0)
+            fees[chat_id] = float(fee_rate) if fee_rate is not None else fees.get(chat_id, 0.0)
+            self.rates, self.fees = rates, fees
+        _bump_version(chat_id)
+
+    @_db_timed
+    def set_admin(self, user_id, present):
+        with self.lock:
+            if present:
+                self._write("INSERT OR IGNORE INTO admins (user_id) VALUES (?)", (int(user_id),))
+                self.admins = self.admins | {int(user_id)}
+            else:
+                self._write("DELETE FROM admins WHERE user_id=?", (int(user_id),))
+                self.admins = self.admins - {int(user_id)}
+                if not self.loaded:
+                    self.not_admins.add(int(user_id))
+
+    def close(self):
+        with self.lock:
+            if self.con is not None:
+                try:
+                    self.con.close()
+                except:
+                    pass
+                self.con = None
+            self.counter = self.data_version = None
+            self.checked = 0.0
+
+_settings = _SettingsCache()
+
+# ====== transaction writer (group commit) ======
+# Handlers hand rows to one writer thread instead of each committing on its own. The
+# writer takes whatever is queued (waiting at most DB_WRITE_MAX_DELAY for more, up to
+# DB_WRITE_BATCH rows), inserts it with one executemany in one transaction, feeds the
+# day ledgers in id order and then resolves each row's future with its id. Its connection
+# runs DB_WRITER_SYNCHRONOUS, so a resolved future means the row survives a power cut; the
+# fsync is paid once per batch.
+_TX_INSERT = """INSERT INTO transactions (chat_id,user,type,amount_inr,amount_usd,time_iso,ts,inr_minor,usd_minor,rate,fee,dedup_key)
+                VALUES (?,?,?,?,?,?,?,?,?,?,?,?)"""
+# inserts are counted here rather than by a trigger per row (see _m9_chat_version)
+_CHAT_VERSION_BUMP = """INSERT INTO chat_version (chat_id, n, changed_us) VALUES (?, 1, ?)
+                         ON CONFLICT(chat_id) DO UPDATE SET n = n + 1, changed_us = MAX(changed_us, excluded.changed_us)"""
+
+def _chat_version_rows(chat_ids):
+    now_us = time.time_ns() // 1000
+    return [(c, now_us) for c in set(chat_ids)]
+
+class _TxWriter:
+    def __init__(self):
+        self.q = queue.Queue()
+        self.thread = None
+        self.lock = threading.Lock()
+        self.commits = 0
+        self.rows = 0
+
+    def _ensure_started(self):
+        if self.thread is None or not self.thread.is_alive():
+            with self.lock:
+                if self.thread is None or not self.thread.is_alive():
+                    self.thread = threading.Thread(target=self._run, name="tx-writer", daemon=True)
+                    self.thread.start()
+
+    def submit(self, row):
+        fut = concurrent.futures.Future()
+        self._ensure_started()
+        self.q.put((row, fut))
+        return fut
+
+    def flush(self, timeout=None):
+        # resolves once everything queued before this call is committed
+        fut = concurrent.futures.Future()
+        self._ensure_started()
+        self.q.put((None, fut))
+        fut.result(timeout)
+
+    def stop(self, timeout=10):
+        if self.thread is not None and self.thread.is_alive():
+            self.q.put(None)
+            self.thread.join(timeout)
+
+    def _run(self):
+        while True:
+            item = self.q.get()
+            if item is None:
+                return
+            batch = [item]
+            deadline = time.monotonic() + DB_WRITE_MAX_DELAY
+            while len(batch) < DB_WRITE_BATCH:
+                try:
+                    nxt = self.q.get_nowait()
+                except queue.Empty:
+                    left = deadline - time.monotonic()
+                    if left <= 0:
+                        break
+                    try:
+                        nxt = self.q.get(timeout=left)
+                    except queue.Empty:
+                        break
+                if nxt is None:
+                    self.q.put(None)  # stop after this batch
+                    break
+                batch.append(nxt)
+            try:
+                self._commit(batch)
+            except Exception as e:
+                logger.exception("tx writer batch failed: %s", e)
+                for (_, fut) in batch:
+                    if not fut.done():
+                        fut.set_exception(e)
+
+    def _commit(self, batch):
+        items = [(row, fut) for (row, fut) in batch if row is not None]
+        ids = []
+        if items:
+            con = _db_connect()
+            con.execute(f"PRAGMA synchronous={DB_WRITER_SYNCHRONOUS}")  # the writer thread's own connection
+            try:
+                with _metrics.timed("bot_db_seconds", "bot_db_errors_total", op="tx_commit"), con:
+                    _begin_immediate(con, "tx_writer")
+                    con.executemany(_TX_INSERT, [row for (row, _) in items])
+                    last = con.execute("SELECT last_insert_rowid()").fetchone()[0]
+                    con.executemany(_ROLLUP_UPSERT, [_rollup_row(row) for (row, _) in items])
+                    con.executemany(_CHAT_VERSION_BUMP, _chat_version_rows(row[0] for (row, _) in items))
+                # one writer inside one transaction: the batch got consecutive ids
+                ids = list(range(last - len(items) + 1, last + 1))
+            except sqlite3.Error as e:
+                # a bad row must not sink the rest of the batch
+                logger.warning("group insert failed (%s), retrying %s rows one by one", e, len(items))
+                for (row, fut) in items:
+                    try:
+                        with con:
+                            rid = con.execute(_TX_INSERT, row).lastrowid
+                            con.execute(_ROLLUP_UPSERT, _rollup_row(row))
+                            con.executemany(_CHAT_VERSION_BUMP, _chat_version_rows([row[0]]))
+                        ids.append(rid)
+                    except sqlite3.IntegrityError as e2:
+                        # its message is in already: an update delivered twice, or imported from an export
+                        known = row[11] and con.execute("SELECT id FROM transactions WHERE dedup_key=?", (row[11],)).fetchone()
+                        ids.append(None)
+                        if known:
+                            logger.info("chat %s message already recorded as row %s", row[0], known[0])
+                            fut.set_result(known[0])
+                        else:
+                            fut.set_exception(e2)
+                    except Exception as e2:
+                        ids.append(None); fut.set_exception(e2)
+            self.commits += 1; self.rows += len(items)
+            for ((row, fut), rid) in zip(items, ids):
+                if rid is None:
+                    continue
+                (chat_id, user, type_, inr, usd, time_iso, ts, inr_minor, usd_minor) = row[:9]
+                with _ledger_lock(chat_id):
+                    led = _ledgers.get(chat_id)
+                    if led is not None:
+                        led.add(rid, ts, time_iso, inr_minor, usd_minor, user, type_)
+                    _bump_version(chat_id)
+        for ((row, fut), rid) in zip(items, ids):
+            if rid is not None:
+                fut.set_result(rid)
+        for (row, fut) in batch:
+            if row is None:
+                fut.set_result(None)
+
+_tx_writer = _TxWriter()
+
+_ONE = decimal.Decimal(1)
+
+def _to_minor(x):
+    # paisa / cents, half away from zero on the amount read to 15 significant digits, so binary
+    # noise doesn't decide: 1.005 -> 101, 0.40499999999999997 (0.81 / 2) -> 41
+    return int(decimal.Decimal(f"{float(x):.15g}").scaleb(2).quantize(_ONE, decimal.ROUND_HALF_UP))
+
+def _tx_row(chat_id, user, type_, amount_inr, amount_usd, now, rate=None, fee=None, dedup_key=None):
+    # the tuple _TX_INSERT takes; amount_inr/amount_usd are stored as the rounded minor units / 100
+    inr_minor = _to_minor(amount_inr); usd_minor = _to_minor(amount_usd)
+    return (chat_id, user, type_, inr_minor / 100, usd_minor / 100, now.isoformat(), _to_ts(now),
+            inr_minor, usd_minor, rate, fee, dedup_key)
+
+def _message_key(chat_id, message_id):
+    # dedup_key of the entry a chat message made, live or imported from the chat's export
+    return f"m:{int(chat_id)}:{int(message_id)}"
+
+def add_tx_db_async(chat_id, user, type_, amount_inr, amount_usd, rate=None, fee=None, message_id=None):
+    # returns a Future resolving to the row id once the row is committed and in the ledger; a
+    # message recorded before resolves to its existing row and is not added again
+    key = _message_key(chat_id, message_id) if message_id is not None else None
+    return _tx_writer.submit(_tx_row(chat_id, user, type_, amount_inr, amount_usd, datetime.datetime.utcnow(), rate, fee, key))
+
+def add_tx_db(chat_id, user, type_, amount_inr, amount_usd, rate=None, fee=None, message_id=None):
+    return add_tx_db_async(chat_id, user, type_, amount_inr, amount_usd, rate, fee, message_id).result()
+
+@_db_timed
+def _range_query(cols, chat_id, from_dt_utc, to_dt_utc, extra="", tail="ORDER BY id ASC", args=()):
+    # `extra` adds conditions (with `args` for their ? marks, then any in `tail`)
+    if _ts_ready.is_set():
+        return _db_connect().execute(f"""SELECT {cols} FROM transactions
+                       WHERE chat_id=? AND ts BETWEEN ? AND ? {extra}
+                       {tail}""",
+                    (chat_id, _to_ts(from_dt_utc), _to_ts(to_dt_utc)) + tuple(args))
+    return _db_connect().execute(f"""SELECT {cols} FROM transactions
+                   WHERE chat_id=? AND time_iso BETWEEN ? AND ? {extra}
+                   {tail}""",
+                (chat_id, from_dt_utc.isoformat(), to_dt_utc.isoformat()) + tuple(args))
 
 def get_transactions_between(chat_id, from_dt_utc, to_dt_utc):
-    con = _db_connect(); cur = con.cursor()
-    cur.execute("""SELECT time_iso, amount_inr, amount_usd, user, type
-                   FROM transactions
-                   WHERE chat_id=? AND time_iso BETWEEN ? AND ?
-                   ORDER BY id ASC""",
-                (chat_id, from_dt_utc.isoformat(), to_dt_utc.isoformat()))
-    rows = cur.fetchall(); con.close()
-    return rows
+    return _range_query("time_iso, amount_inr, amount_usd, user, type", chat_id, from_dt_utc, to_dt_utc).fetchall()
 
 # ====== helpers ======
 def is_authorized(user_id):
-    return int(user_id) in authorized_users
+    return _settings.is_admin(user_id)
 
 def get_exchange_rate(chat_id):
-    if chat_id in exchange_rates:
-        return float(exchange_rates[chat_id])
-    try:
-        con = _db_connect(); cur = con.cursor()
-        cur.execute("SELECT exchange_rate FROM settings WHERE chat_id=?", (chat_id,))
-        row = cur.fetchone(); con.close()
-        if row and row[0] is not None:
-            exchange_rates[chat_id] = float(row[0]); return float(row[0])
-    except:
-        pass
-    return 106.0
+    return _settings.rate(chat_id)
 
 def set_exchange_rate(chat_id, rate):
-    exchange_rates[chat_id] = float(rate); persist_setting(chat_id, exchange_rate=float(rate))
+    _settings.set(chat_id, exchange_rate=float(rate))
 
 def get_fee_rate(chat_id):
-    if chat_id in fee_rates:
-        return float(fee_rates[chat_id])
-    try:
-        con = _db_connect(); cur = con.cursor()
-        cur.execute("SELECT fee_rate FROM settings WHERE chat_id=?", (chat_id,))
-        row = cur.fetchone(); con.close()
-        if row and row[0] is not None:
-            fee_rates[chat_id] = float(row[0]); return float(row[0])
-    except:
-        pass
-    return 0.0
+    return _settings.fee(chat_id)
 
 def set_fee_rate(chat_id, fee):
-    fee_rates[chat_id] = float(fee); persist_setting(chat_id, fee_rate=float(fee))
+    _settings.set(chat_id, fee_rate=float(fee))
+
+_shard_up = None  # in a shard process: queue to the front, which relays admin changes to the other shards
+
+def _apply_admin(op_, user_id):
+    try:
+        _settings.set_admin(user_id, op_ == "add")
+    except:
+        if op_ == "add":
+            raise
 
 def add_admin(user_id):
-    authorized_users.add(int(user_id)); persist_admin(user_id)
+    _apply_admin("add", user_id)
+    if _shard_up is not None:
+        _shard_up.put(("admin", "add", int(user_id), SHARD_ID))
 
 def remove_admin(user_id):
+    _apply_admin("remove", user_id)
+    if _shard_up is not None:
+        _shard_up.put(("admin", "remove", int(user_id), SHARD_ID))
+
+# ====== time (IST) ======
+# The day window only changes at IST midnight, so it is computed once per IST date and
+# reused until then. Stored times are naive UTC ISO strings; IST has no DST, so showing one
+# is a fixed +05:30 shift. Seconds never change under a whole-minute shift, so the shifted
+# "YYYY-MM-DD HH:MM" is memoized per UTC minute and rows only pay a dict lookup and a slice.
+_IST_OFFSET = datetime.timedelta(hours=5, minutes=30)
+_day_window = None                 # (from_utc, to_utc, from_ts, to_ts, valid until epoch secs)
+_ist_minutes = {}                  # "YYYY-MM-DDTHH:MM" UTC -> "YYYY-MM-DD HH:MM" IST
+
+def _day_window_now():
+    w = _day_window
+    if w is None or time.time() >= w[4]:
+        w = _compute_day_window(datetime.datetime.now(datetime.timezone.utc))
+    return w
+
+def _compute_day_window(now_utc):
+    global _day_window
+    today_ist = (now_utc + _IST_OFFSET).date()
+    ist_from = datetime.datetime.combine(today_ist, datetime.time(hour=8, minute=30), tzinfo=IST)
+    from_utc = ist_from.astimezone(datetime.timezone.utc)
+    to_utc = from_utc + datetime.timedelta(days=1)
+    midnight = datetime.datetime.combine(today_ist + datetime.timedelta(days=1), datetime.time(), tzinfo=IST)
+    _day_window = w = (from_utc, to_utc, _to_ts(from_utc), _to_ts(to_utc), midnight.timestamp())
+    return w
+
+def _ist_bounds_for_today():
+    w = _day_window_now()
+    return w[0], w[1]
+
+def _ist_minute(key):
+    s = _ist_minutes.get(key)
+    if s is None:
+        s = (datetime.datetime.fromisoformat(key) + _IST_OFFSET).strftime("%Y-%m-%d %H:%M")
+        if len(_ist_minutes) >= 8192:
+            _ist_minutes.clear()
+        _ist_minutes[key] = s
+    return s
+
+def _ist_text(tiso):
+    # "YYYY-MM-DD HH:MM:SS" IST, or None if tiso is not a stored timestamp
     try:
-        authorized_users.discard(int(user_id))
-        remove_admin_persist(user_id)
+        if len(tiso) >= 19 and tiso[16] == ":" and tiso[17:19].isdigit():
+            return _ist_minute(tiso[:16]) + tiso[16:19]
+        dt = datetime.datetime.fromisoformat(tiso).replace(tzinfo=None) + _IST_OFFSET
+        return dt.strftime("%Y-%m-%d %H:%M:%S")
     except:
-        pass
+        return None
 
-# ====== day bounds ======
-def _ist_bounds_for_today():
-    now_ist = datetime.datetime.now(IST)
-    today_ist = now_ist.date()
-    ist_from = IST.localize(datetime.datetime.combine(today_ist, datetime.time(hour=8, minute=30)))
-    ist_to = ist_from + datetime.timedelta(days=1)
-    from_utc = ist_from.astimezone(pytz.utc)
-    to_utc = ist_to.astimezone(pytz.utc)
-    return from_utc, to_utc
+def _ist_stamp(tiso):
+    return _ist_text(tiso) or tiso
+
+def _ist_clock(tiso):
+    s = _ist_text(tiso)
+    return s[11:] if s else tiso
+
+def _ist_stamps(tisos):
+    # batch form of _ist_stamp for report chunks
+    minute = _ist_minute
+    out = []
+    append = out.append
+    for tiso in tisos:
+        try:
+            if len(tiso) >= 19 and tiso[16] == ":" and tiso[17:19].isdigit():
+                append(minute(tiso[:16]) + tiso[16:19])
+                continue
+        except:
+            pass
+        append(_ist_stamp(tiso))
+    return out
+
+# ====== per-chat day ledger ======
+# Running counts/sums and the last LAST_N rows of each type for the current business day,
+# kept per chat and fed by the transaction writer, so a summary costs the same on row 5 or row 5000.
+# A ledger is (re)loaded from the DB when first read or when the business day moves: counts and
+# sums come from the day's user_rollup rows (written in the same transactions as the rows
+# themselves), plus the last LAST_N rows of each type, all in one read snapshot. Until the ts
+# backfill is done the counts and sums are one GROUP BY over the day's rows instead. Sums are
+# in minor units.
+class _DayLedger:
+    __slots__ = ("bounds", "last_id", "inc_count", "inc_inr", "inc_usd",
+                 "pay_count", "pay_inr", "pay_usd", "incomes", "payouts")
+
+    def __init__(self, bounds, keep):
+        self.bounds = bounds  # (from_ts, to_ts), inclusive like the SQL BETWEEN
+        self.last_id = 0
+        self.inc_count = 0; self.inc_inr = 0; self.inc_usd = 0
+        self.pay_count = 0; self.pay_inr = 0; self.pay_usd = 0
+        self.incomes = collections.deque(maxlen=keep)
+        self.payouts = collections.deque(maxlen=keep)
+
+    def add(self, row_id, ts, time_iso, inr, usd, user, type_):
+        if row_id <= self.last_id or not (self.bounds[0] <= ts <= self.bounds[1]):
+            return
+        self.last_id = row_id
+        row = (time_iso, inr / 100, usd / 100, user, type_)
+        if type_ == "income":
+            self.inc_count += 1; self.inc_inr += inr; self.inc_usd += usd
+            self.incomes.append(row)
+        elif type_ == "payout":
+            self.pay_count += 1; self.pay_inr += inr; self.pay_usd += usd
+            self.payouts.append(row)
+
+_ledgers = {}
+_ledger_locks = {}
+_ledgers_guard = threading.Lock()
+
+@contextlib.contextmanager
+def _ledger_lock(chat_id):
+    # _ledger_forget removes a chat's lock while holding it, so a waiter that then gets it
+    # finds it gone from the dict and takes the chat's current lock instead
+    while True:
+        lock = _ledger_locks.get(chat_id)
+        if lock is None:
+            with _ledgers_guard:
+                lock = _ledger_locks.setdefault(chat_id, threading.Lock())
+        with lock:
+            if _ledger_locks.get(chat_id) is lock:
+                yield
+                return
+
+@_db_timed
+def _ledger_load(chat_id, led, from_dt, to_dt, keep):
+    # fills a new ledger; returns the rows read
+    con = _db_connect()
+    by_rollup = _ts_ready.is_set()
+    scanned = 0
+    own = not con.in_transaction
+    if own:
+        con.execute("BEGIN")  # the sums and last_id must come from the same snapshot
+    try:
+        if by_rollup:
+            totals = con.execute("""SELECT type, SUM(count), SUM(inr_minor), SUM(usd_minor), 0, COUNT(*) FROM user_rollup
+                                    WHERE chat_id=? AND business_day=? GROUP BY type""",
+                                 (chat_id, _business_day(led.bounds[0]).isoformat()))
+            # any row committed later has a higher id, whatever chat or day it is for
+            led.last_id = con.execute("SELECT MAX(id) FROM transactions").fetchone()[0] or 0
+        else:
+            totals = _range_query("type, COUNT(*), SUM(inr_minor), SUM(usd_minor), MAX(id), COUNT(*)",
+                                  chat_id, from_dt, to_dt, tail="GROUP BY type")
+        for (type_, cnt, inr, usd, last, read) in totals:
+            led.last_id = max(led.last_id, last)
+            scanned += read
+            if type_ == "income":
+                led.inc_count, led.inc_inr, led.inc_usd = cnt, inr or 0, usd or 0
+            elif type_ == "payout":
+                led.pay_count, led.pay_inr, led.pay_usd = cnt, inr or 0, usd or 0
+        # newest first straight off idx_tx_chat_ts once every row has its ts
+        tail = "ORDER BY ts DESC, id DESC LIMIT ?" if by_rollup else "ORDER BY id DESC LIMIT ?"
+        for (type_, count, dq) in (("income", led.inc_count, led.incomes), ("payout", led.pay_count, led.payouts)):
+            if not count:
+                continue
+            recent = _range_query("time_iso, inr_minor, usd_minor, user, type", chat_id, from_dt, to_dt,
+                                  extra="AND type=?", tail=tail, args=(type_, keep)).fetchall()
+            scanned += len(recent)
+            for r in reversed(recent):
+                dq.append((r[0], r[1] / 100, r[2] / 100, r[3], r[4]))
+    finally:
+        if own:
+            con.commit()
+    return scanned
+
+def _ledger_snapshot(chat_id):
+    _imports.check()
+    (from_dt, to_dt, from_ts, to_ts, _) = _day_window_now()
+    bounds = (from_ts, to_ts)
+    with _ledger_lock(chat_id):
+        led = _ledgers.get(chat_id)
+        scanned = 0
+        if led is None or led.bounds != bounds:
+            keep = LAST_N if LAST_N > 0 else 5
+            led = _DayLedger(bounds, keep)
+            scanned = _ledger_load(chat_id, led, from_dt, to_dt, keep)
+            _ledgers[chat_id] = led
+        _metrics.observe("bot_summary_rows_scanned", scanned)
+        return (led.inc_count, led.inc_inr, led.inc_usd, led.pay_count, led.pay_inr, led.pay_usd,
+                list(led.incomes), list(led.payouts))
+
+def _ledger_drop(chat_id):
+    # the chat's rows changed outside the writer (clear, rollover)
+    with _ledger_lock(chat_id):
+        _ledgers.pop(chat_id, None)
+    _bump_version(chat_id)
+
+def _ledger_forget(chat_id):
+    # the summary LRU let the chat go: its ledger, lock and version entry go with it
+    with _ledger_lock(chat_id):
+        _ledgers.pop(chat_id, None)
+        with _ledgers_guard:
+            del _ledger_locks[chat_id]
+    _forget_version(chat_id)
+
+# ---- rows added by another process ----
+# `bot.py import` writes straight to the DB from its own process, past the writer and these
+# caches. Each import transaction that adds rows to the current business day stamps those
+# chats in tx_imports with a new, higher seq. At most every IMPORT_CHECK_SECS a ledger or
+# version read looks at PRAGMA data_version on a connection of its own (it moves only when
+# another connection commits) and, if it moved, drops the chats stamped since the last look.
+class _ImportWatch:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.con = None
+        self.data_version = None
+        self.seq = 0
+        self.checked = 0.0
+
+    def check(self):
+        if time.monotonic() - self.checked < IMPORT_CHECK_SECS:
+            return
+        with self.lock:
+            now = time.monotonic()
+            if now - self.checked < IMPORT_CHECK_SECS:
+                return
+            self.checked = now
+            try:
+                if self.con is None:
+                    self.con = _db_open(check_same_thread=False)
+                dv = self.con.execute("PRAGMA data_version").fetchone()[0]
+                if dv == self.data_version:
+                    return
+                self.data_version = dv
+                stamped = self.con.execute("SELECT chat_id, seq FROM tx_imports WHERE seq > ?", (self.seq,)).fetchall()
+            except sqlite3.Error as e:
+                logger.warning("import check failed: %s", e)
+                return
+            self.seq = max([self.seq] + [seq for (_, seq) in stamped])
+        for (chat_id, _) in stamped:
+            _ledger_drop(chat_id)
+
+    def close(self):
+        with self.lock:
+            if self.con is not None:
+                try:
+                    self.con.close()
+                except:
+                    pass
+                self.con = None
+            self.data_version = None
+
+_imports = _ImportWatch()
+
+# ---- ledger versions ----
+# Every change to what a chat's summary shows (new row, /clear, rate or fee change, rollover)
+# gives the chat a new version from one global counter, so versions only ever go up.
+# A forgotten chat's entry is folded into _version_floor, which chats without an entry read:
+# still never lower than what the chat had, so nothing rendered from older rows matches again.
+_ledger_versions = {}
+_version_seq = itertools.count(1)
+_version_floor = 0
+_versions_lock = threading.Lock()
+
+def _bump_version(chat_id):
+    with _versions_lock:
+        _ledger_versions[chat_id] = next(_version_seq)
+
+def _forget_version(chat_id):
+    global _version_floor
+    with _versions_lock:
+        # floor first: a reader that misses the entry must already see the raised floor
+        _version_floor = max(_version_floor, _ledger_versions.get(chat_id, 0))
+        _ledger_versions.pop(chat_id, None)
+
+def _summary_version(chat_id):
+    # cache key for anything rendered from the chat's current business day
+    _imports.check()
+    from_dt, _ = _ist_bounds_for_today()
+    version = _ledger_versions.get(chat_id)
+    return (_version_floor if version is None else version, from_dt)
 
 # ====== formatting helpers (no thousands commas anywhere) ======
 def fmt_inr_plain(x):
@@ -242,29 +1424,41 @@ def fmt_usd(x):
     return f"{float(x):.2f}U"
 
 # ====== build clean (normal text) message ======
+# Rendered summaries are cached per chat with the version they were built from; a chat is only
+# re-rendered after its version moves. LRU-bounded: evicting a chat also drops its day ledger,
+# ledger lock and version entry.
+_summary_cache = collections.OrderedDict()  # chat_id -> (version, text)
+_summary_cache_lock = threading.Lock()
+
 def build_compact_message(chat_id):
+    version = _summary_version(chat_id)  # read before rendering: a concurrent write re-renders next time
+    with _summary_cache_lock:
+        hit = _summary_cache.get(chat_id)
+        if hit is not None and hit[0] == version:
+            _summary_cache.move_to_end(chat_id)
+            _metrics.inc("bot_summary_cache_total", result="hit")
+            return hit[1]
+    _metrics.inc("bot_summary_cache_total", result="miss")
+    text = _render_compact_message(chat_id)
+    evicted = []
+    with _summary_cache_lock:
+        _summary_cache[chat_id] = (version, text)
+        _summary_cache.move_to_end(chat_id)
+        while len(_summary_cache) > SUMMARY_CACHE_SIZE:
+            evicted.append(_summary_cache.popitem(last=False)[0])
+    for cid in evicted:
+        _ledger_forget(cid)
+    return text
+
+def _render_compact_message(chat_id):
     rate = get_exchange_rate(chat_id)
     fee = get_fee_rate(chat_id)
 
-    from_dt, to_dt = _ist_bounds_for_today()
-    rows = get_transactions_between(chat_id, from_dt, to_dt)
-    incomes_all = [r for r in rows if r[4] == "income"]
-    payouts_all = [r for r in rows if r[4] == "payout"]
-
-    inc_count = len(incomes_all)
-    pay_count = len(payouts_all)
-
-    show_n = LAST_N if LAST_N > 0 else 5
-    incomes_show = incomes_all[-show_n:] if incomes_all else []
-    payouts_show = payouts_all[-show_n:] if payouts_all else []
+    (inc_count, total_income_inr, total_income_usd,
+     pay_count, total_payout_inr, total_payout_usd,
+     incomes_show, payouts_show) = _ledger_snapshot(chat_id)
 
-    def fmt_time(tiso):
-        try:
-            dt = datetime.datetime.fromisoformat(tiso)
-            dt = dt.replace(tzinfo=pytz.utc).astimezone(IST)
-            return dt.strftime("%H:%M:%S")
-        except:
-            return tiso
+    fmt_time = _ist_clock
 
     income_lines = []
     for r in incomes_show:
@@ -286,12 +1480,10 @@ def build_compact_message(chat_id):
     if not payout_lines:
         payout_lines = ["None"]
 
-    total_income_inr = sum(float(r[1]) for r in incomes_all)
-    total_income_usd = sum(float(r[2]) for r in incomes_all)
-    total_payout_inr = sum(float(r[1]) for r in payouts_all)
-    total_payout_usd = sum(float(r[2]) for r in payouts_all)
-    not_yet_inr = total_income_inr - total_payout_inr
-    not_yet_usd = total_income_usd - total_payout_usd
+    not_yet_inr = (total_income_inr - total_payout_inr) / 100
+    not_yet_usd = (total_income_usd - total_payout_usd) / 100
+    total_income_inr /= 100; total_income_usd /= 100
+    total_payout_inr /= 100; total_payout_usd /= 100
 
     parts = []
     parts.append(f"Today's Income ({inc_count})")
@@ -310,50 +1502,427 @@ def build_compact_message(chat_id):
     parts.append("")
     return "\n".join(parts)
 
+# ====== outbound send scheduler ======
+# Every Telegram API call that sends something goes through _outbox.submit(lane, chat_id, fn, ...)
+# and gets a Future back. Jobs wait in one list ordered by (lane, arrival): interactive replies
+# before report documents before broadcasts. A job only starts when its chat's token bucket and
+# the global one have a token, and each chat has at most one call in flight so its messages keep
+# their order. RetryAfter parks the chat for the time Telegram asks and requeues the job in place.
+# Other network errors are only retried when the call never left (see _unsent): after a read
+# timeout or a reset Telegram may already have the message, and a resend would post it twice.
+SEND_INTERACTIVE, SEND_DOCUMENT, SEND_BROADCAST = 0, 1, 2
+_LANE_NAMES = ("interactive", "document", "broadcast")
+
+class _Bucket:
+    __slots__ = ("rate", "cap", "tokens", "stamp")
+
+    def __init__(self, rate, cap):
+        self.rate = float(rate); self.cap = float(cap)
+        self.tokens = float(cap); self.stamp = time.monotonic()
+
+    def wait(self, now):
+        # seconds until a token is available (0 = now)
+        self.tokens = min(self.cap, self.tokens + (now - self.stamp) * self.rate)
+        self.stamp = now
+        return 0.0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+
+    def full(self, now):
+        return self.tokens + (now - self.stamp) * self.rate >= self.cap
+
+class _SendJob:
+    __slots__ = ("lane", "seq", "chat_id", "fn", "args", "kwargs", "fut", "queued", "not_before", "attempts")
+
+    def __init__(self, lane, seq, chat_id, fn, args, kwargs):
+        self.lane = lane; self.seq = seq; self.chat_id = chat_id
+        self.fn = fn; self.args = args; self.kwargs = kwargs
+        self.fut = concurrent.futures.Future()
+        self.queued = time.monotonic(); self.not_before = 0.0; self.attempts = 0
+
+    def __lt__(self, other):
+        return (self.lane, self.seq) < (other.lane, other.seq)
+
+def _unsent(e):
+    # connecting failed or timed out; urllib3's own connect retries wrap it in MaxRetryError
+    cause = e.__cause__
+    if isinstance(cause, urllib3.exceptions.MaxRetryError):
+        cause = cause.reason
+    return isinstance(cause, (urllib3.exceptions.ConnectTimeoutError, urllib3.exceptions.NewConnectionError))
+
+class _Outbox:
+    def __init__(self):
+        self.cond = threading.Condition()
+        self.jobs = []        # sorted by (lane, seq)
+        self.seq = itertools.count()
+        self.glob = _Bucket(SEND_GLOBAL_PER_SEC, SEND_GLOBAL_PER_SEC)
+        self.chats = {}       # chat_id -> _Bucket
+        self.busy = set()     # chats with a call in flight
+        self.held = {}        # chat_id -> monotonic time RetryAfter holds the chat until
+        self.pool = None
+        self.thread = None
+        self.stopping = False
+        self.sent = 0; self.failed = 0; self.retried = 0
+        self.latency = collections.deque(maxlen=2000)  # seconds from submit to done, recent sends
+
+    def submit(self, lane, chat_id, fn, *args, **kwargs):
+        job = _SendJob(lane, next(self.seq), chat_id, fn, args, kwargs)
+        with self.cond:
+            if self.thread is None:
+                self.pool = concurrent.futures.ThreadPoolExecutor(SEND_WORKERS, thread_name_prefix="send")
+                self.thread = threading.Thread(target=self._run, name="outbox", daemon=True)
+                self.thread.start()
+            bisect.insort(self.jobs, job)
+            self.cond.notify()
+        return job.fut
+
+    def _bucket(self, chat_id):
+        b = self.chats.get(chat_id)
+        if b is None:
+            rate = SEND_GROUP_PER_MIN / 60.0 if chat_id < 0 else SEND_CHAT_PER_SEC
+            b = self.chats[chat_id] = _Bucket(rate, SEND_CHAT_BURST)
+            if len(self.chats) > 10000:
+                # forget chats whose buckets have refilled; they start full again anyway
+                now = time.monotonic()
+                for cid in [c for (c, x) in self.chats.items() if c not in self.busy and x.full(now)]:
+                    del self.chats[cid]
+                self.chats[chat_id] = b
+        return b
+
+    def _pick(self, now):
+        # -> (index of the job to start, None) or (None, seconds to wait / None = until notified)
+        wait = None; seen = set()
+        gwait = self.glob.wait(now)
+        for i, job in enumerate(self.jobs):
+            cid = job.chat_id
+            if cid in seen:
+                continue
+            seen.add(cid)  # only a chat's first queued job may go
+            if cid in self.busy:
+                continue
+            w = max(job.not_before - now, self.held.get(cid, 0.0) - now, self._bucket(cid).wait(now), gwait)
+            if w <= 0:
+                return i, None
+            wait = w if wait is None else min(wait, w)
+        return None, wait
+
+    def _run(self):
+        while True:
+            with self.cond:
+                while True:
+                    if self.stopping and not self.jobs and not self.busy:
+                        return
+                    now = time.monotonic()
+                    i, wait = self._pick(now)
+                    if i is not None:
+                        break
+                    self.cond.wait(wait)
+                job = self.jobs.pop(i)
+                self.glob.tokens -= 1; self.chats[job.chat_id].tokens -= 1
+                self.held.pop(job.chat_id, None)
+                self.busy.add(job.chat_id)
+            self.pool.submit(self._call, job)
+
+    def _call(self, job):
+        requeue = False
+        method = _send_method(job.fn); lane = _LANE_NAMES[job.lane]
+        if job.attempts == 0:
+            _metrics.observe("bot_send_queue_seconds", time.monotonic() - job.queued, lane=lane)
+        t0 = time.perf_counter()
+        try:
+            res = job.fn(*job.args, **job.kwargs)
+        except RetryAfter as e:
+            logger.info("flood control in chat %s, retrying in %ss", job.chat_id, e.retry_after)
+            with self.cond:
+                self.held[job.chat_id] = time.monotonic() + float(e.retry_after)
+            requeue = True
+            _metrics.inc("bot_send_retries_total", method=method, reason="flood")
+        except (BadRequest, Unauthorized) as e:
+            self._fail(job, e)
+        except NetworkError as e:
+            if job.attempts < SEND_RETRIES and _unsent(e):
+                job.not_before = time.monotonic() + 0.5 * (2 ** job.attempts)
+                requeue = True
+                _metrics.inc("bot_send_retries_total", method=method, reason="network")
+            else:
+                self._fail(job, e)
+        except Exception as e:
+            self._fail(job, e)
+        else:
+            self.sent += 1
+            self.latency.append(time.monotonic() - job.queued)
+            job.fut.set_result(res)
+        _metrics.observe("bot_send_seconds", time.perf_counter() - t0, method=method, lane=lane)
+        with self.cond:
+            self.busy.discard(job.chat_id)
+            if requeue:
+                job.attempts += 1; self.retried += 1
+                bisect.insort(self.jobs, job)
+            self.cond.notify()
+
+    def _fail(self, job, e):
+        self.failed += 1
+        _metrics.inc("bot_send_errors_total", method=_send_method(job.fn), error=type(e).__name__)
+        logger.warning("Send to %s failed (%s): %s", job.chat_id, getattr(job.fn, "__name__", job.fn), e)
+        job.fut.set_exception(e)
+
+    def stats(self):
+        with self.cond:
+            depth = [0, 0, 0]
+            for job in self.jobs:
+                depth[job.lane] += 1
+            lat = sorted(self.latency)
+        def pct(p):
+            return lat[min(len(lat) - 1, int(p * len(lat)))] if lat else 0.0
+        return {"depth": dict(zip(_LANE_NAMES, depth)), "in_flight": len(self.busy),
+                "sent": self.sent, "failed": self.failed, "retried": self.retried,
+                "latency_p50": pct(0.50), "latency_p99": pct(0.99)}
+
+    def stop(self, timeout=10):
+        # let queued sends go out, then stop
+        if self.thread is None:
+            return
+        with self.cond:
+            self.stopping = True; self.cond.notify()
+        self.thread.join(timeout)
+        self.pool.shutdown(wait=False)
+
+def _send_method(fn):
+    # metric label for a queued call: the bound method or helper it ends up in
+    while isinstance(fn, functools.partial):
+        fn = fn.func
+    return getattr(fn, "__name__", "call").lstrip("_")
+
+_outbox = _Outbox()
+
+def _reply(update, text, **kwargs):
+    return _outbox.submit(SEND_INTERACTIVE, update.effective_chat.id, update.message.reply_text, text, **kwargs)
+
 # ====== helper: send summary + inline button (Chinese-style label) ======
+def _summary_keyboard():
+    # Chinese-style button label like screenshot: "🌐 完整账单"
+    return InlineKeyboardMarkup([[InlineKeyboardButton("🌐 完整账单", callback_data="VIEWFULL")]])
+
 def send_summary_with_button(update: Update, context: CallbackContext, chat_id: int):
     text = build_compact_message(chat_id)
-    # Chinese-style button label like screenshot: "🌐 完整账单"
-    kb = InlineKeyboardMarkup([[InlineKeyboardButton("🌐 完整账单", callback_data="VIEWFULL")]])
-    update.message.reply_text(text, reply_markup=kb)
+    _summaries.cancel(chat_id)  # this summary already covers anything pending
+    fut = _reply(update, text, reply_markup=_summary_keyboard())
+    fut.add_done_callback(lambda f: f.exception() or _summaries.remember(chat_id, f.result()))
+
+# ---- coalesced summaries after entries ----
+# The first entry of a burst opens a SUMMARY_DEBOUNCE_SECS window on the job queue; entries
+# arriving inside it only move the reply target. When the window closes one summary is queued on
+# the outbox, posted as a reply to the latest entry — or, with SUMMARY_EDIT_IN_PLACE, written over
+# the chat's previous summary message. A chat has at most one summary queued: while it waits for
+# the group's send budget, later windows only move its reply target, and the text is rendered when
+# it is sent, so it is never behind the DB.
+class _SummaryDebouncer:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.pending = {}   # chat_id -> [token, bot, reply_to_message_id]
+        self.queued = {}    # chat_id -> ([reply_to_message_id], future) of the summary on the outbox
+        self.last_msg = {}  # chat_id -> message_id of the chat's latest summary
+        self.tokens = 0
+
+    def schedule(self, context, chat_id, reply_to):
+        if SUMMARY_DEBOUNCE_SECS <= 0:
+            return self.send(context.bot, chat_id, reply_to)
+        with self.lock:
+            p = self.pending.get(chat_id)
+            if p is not None:
+                p[2] = reply_to
+                return
+            self.tokens += 1; token = self.tokens
+            self.pending[chat_id] = [token, context.bot, reply_to]
+        jq = getattr(context, "job_queue", None)
+        if jq is not None:
+            jq.run_once(lambda ctx: self._fire(chat_id, token), SUMMARY_DEBOUNCE_SECS)
+        else:
+            t = threading.Timer(SUMMARY_DEBOUNCE_SECS, self._fire, (chat_id, token))
+            t.daemon = True; t.start()
+
+    def cancel(self, chat_id):
+        with self.lock:
+            self.pending.pop(chat_id, None)
+
+    def remember(self, chat_id, msg):
+        mid = getattr(msg, "message_id", None)
+        if mid is not None:
+            self.last_msg[chat_id] = mid
+
+    def _fire(self, chat_id, token):
+        with self.lock:
+            p = self.pending.get(chat_id)
+            if p is None or p[0] != token:
+                return
+            del self.pending[chat_id]
+        try:
+            self.send(p[1], chat_id, p[2])
+        except Exception as e:
+            logger.warning("Couldn't queue summary for %s: %s", chat_id, e)
+
+    def send(self, bot, chat_id, reply_to=None):
+        with self.lock:
+            q = self.queued.get(chat_id)
+            if q is not None:
+                q[0][0] = reply_to
+                return q[1]
+            target = [reply_to]
+            fut = _outbox.submit(SEND_INTERACTIVE, chat_id, self._deliver, bot, chat_id, target)
+            self.queued[chat_id] = (target, fut)
+            return fut
+
+    def _deliver(self, bot, chat_id, target):
+        with self.lock:
+            q = self.queued.get(chat_id)
+            if q is not None and q[0] is target:
+                del self.queued[chat_id]  # entries from here on queue the next summary
+            reply_to = target[0]
+        text = build_compact_message(chat_id)
+        mid = self.last_msg.get(chat_id)
+        if SUMMARY_EDIT_IN_PLACE and mid is not None:
+            try:
+                bot.edit_message_text(text, chat_id=chat_id, message_id=mid, reply_markup=_summary_keyboard())
+                return None
+            except BadRequest as e:
+                if "not modified" in str(e).lower():
+                    return None
+                logger.info("summary edit failed in %s (%s), posting a new one", chat_id, e)
+        msg = bot.send_message(chat_id, text, reply_markup=_summary_keyboard(), reply_to_message_id=reply_to)
+        self.remember(chat_id, msg)
+        return msg
+
+_summaries = _SummaryDebouncer()
 
 # ====== commands ======
 def start(update: Update, context: CallbackContext):
-    update.message.reply_text("✅ Bot ready. Use +<expr> for income (e.g. +100*1.07), T<usd> for payout (e.g. T34.59). /summary /setrate /setfee /addadmin /deladmin")
+    _reply(update, "✅ Bot ready. Use +<expr> for income (e.g. +100*1.07), T<usd> for payout (e.g. T34.59). /summary /setrate /setfee /addadmin /deladmin")
 
 def summary_cmd(update: Update, context: CallbackContext):
     if not is_authorized(update.effective_user.id):
-        return update.message.reply_text("❌ You are not authorized.")
+        return _reply(update, "❌ You are not authorized.")
     chat_id = update.effective_chat.id
     send_summary_with_button(update, context, chat_id)
 
+# ---- full report: rendered once per ledger version, streamed from the cursor ----
+class _Report:
+    __slots__ = ("version", "file", "filename", "lock", "pins", "evicted")
+
+    def __init__(self, version, file, filename):
+        self.version = version; self.file = file; self.filename = filename
+        self.lock = threading.Lock()
+        self.pins = 0; self.evicted = False
+
+_reports = collections.OrderedDict()  # (chat_id, fmt, gz) -> _Report, LRU order
+_reports_lock = threading.Lock()
+_report_pool = None
+
+@_db_timed
+def _render_report(chat_id, fmt, gz, out):
+    from_dt, to_dt = _ist_bounds_for_today()
+    cur = _range_query("time_iso, amount_inr, amount_usd, user, type", chat_id, from_dt, to_dt)
+    sink = gzip.GzipFile(fileobj=out, mode="wb", mtime=0) if gz else out
+    n = 0
+    if fmt == "csv":
+        buf = io.StringIO(); w = csv.writer(buf)
+        w.writerow(["time_ist", "type", "amount_inr", "amount_usd", "user"])
+    while True:
+        rows = cur.fetchmany(REPORT_CHUNK_ROWS)
+        if not rows:
+            break
+        times = _ist_stamps([r[0] for r in rows])
+        if fmt == "csv":
+            w.writerows([t, r[4], fmt_inr_plain(r[1]), f"{float(r[2]):.2f}", r[3]] for (t, r) in zip(times, rows))
+            chunk = buf.getvalue(); buf.seek(0); buf.truncate()
+        else:
+            chunk = "\n".join(f"{t} | {r[4]} | INR {fmt_inr_plain(r[1])} | USD {fmt_usd(r[2])} | {r[3]}"
+                              for (t, r) in zip(times, rows))
+            if n:
+                chunk = "\n" + chunk
+        sink.write(chunk.encode("utf-8"))
+        n += len(rows)
+    if fmt == "csv":
+        sink.write(buf.getvalue().encode("utf-8"))
+    elif not n:
+        sink.write("No transactions for today.".encode("utf-8"))
+    if gz:
+        sink.close()  # writes the gzip trailer; `out` stays open
+
+def _build_report(chat_id, fmt=None, gz=None):
+    # pinned _Report for today's rows, reused while the chat's version holds; release with _report_release
+    fmt = fmt or REPORT_FORMAT
+    gz = REPORT_GZIP if gz is None else bool(gz)
+    key = (chat_id, fmt, gz)
+    version = _summary_version(chat_id)
+    with _reports_lock:
+        rep = _reports.get(key)
+        if rep is not None and rep.version == version:
+            _reports.move_to_end(key)
+            rep.pins += 1
+            return rep
+    out = tempfile.SpooledTemporaryFile(max_size=REPORT_SPOOL_BYTES)
+    try:
+        _render_report(chat_id, fmt, gz, out)
+    except:
+        out.close()
+        raise
+    filename = f"report_{chat_id}_{datetime.date.today().isoformat()}.{fmt}" + (".gz" if gz else "")
+    rep = _Report(version, out, filename)
+    rep.pins = 1
+    dropped = []
+    with _reports_lock:
+        old = _reports.pop(key, None)
+        if old is not None:
+            dropped.append(old)
+        _reports[key] = rep
+        while len(_reports) > REPORT_CACHE_SIZE:
+            dropped.append(_reports.popitem(last=False)[1])
+        for d in dropped:
+            d.evicted = True
+        dropped = [d for d in dropped if d.pins == 0]
+    for d in dropped:
+        d.file.close()
+    return rep
+
+def _report_release(rep):
+    with _reports_lock:
+        rep.pins -= 1
+        done = rep.evicted and rep.pins == 0
+    if done:
+        rep.file.close()
+
+def _send_file(send, rep):
+    with rep.lock:
+        rep.file.seek(0)  # cached or retried uploads start from the top again
+        return send(document=rep.file, filename=rep.filename)
+
+def _report_job(bot, chat_id, user_id, fmt, gz):
+    # on the report pool: render (or reuse) the file, then queue the upload
+    try:
+        rep = _build_report(chat_id, fmt, gz)
+    except Exception as e:
+        logger.exception("Failed to build report for chat %s: %s", chat_id, e)
+        return None
+    fut = _outbox.submit(SEND_DOCUMENT, chat_id, _deliver_report, bot, chat_id, user_id, rep)
+    fut.add_done_callback(lambda f: _report_release(rep))
+    return fut
+
+def _queue_report(bot, chat_id, user_id, fmt=None, gz=None):
+    global _report_pool
+    if _report_pool is None:
+        with _reports_lock:
+            if _report_pool is None:
+                _report_pool = concurrent.futures.ThreadPoolExecutor(REPORT_WORKERS, thread_name_prefix="report")
+    return _report_pool.submit(_report_job, bot, chat_id, user_id, fmt, gz)
+
 def viewfull_cmd(update: Update, context: CallbackContext):
     if not is_authorized(update.effective_user.id):
-        return update.message.reply_text("❌ You are not authorized.")
-    chat_id = update.effective_chat.id
-    from_dt, to_dt = _ist_bounds_for_today()
-    rows = get_transactions_between(chat_id, from_dt, to_dt)
-    lines = []
-    for r in rows:
-        try:
-            dt = datetime.datetime.fromisoformat(r[0]).replace(tzinfo=pytz.utc).astimezone(IST)
-            timestr = dt.strftime("%Y-%m-%d %H:%M:%S")
-        except:
-            timestr = r[0]
-        lines.append(f"{timestr} | {r[4]} | INR {fmt_inr_plain(r[1])} | USD {fmt_usd(r[2])} | {r[3]}")
-    full_text = "\n".join(lines) or "No transactions for today."
-    bio = io.BytesIO(); bio.write(full_text.encode("utf-8")); bio.seek(0)
-    filename = f"report_{chat_id}_{datetime.date.today().isoformat()}.txt"
-    update.message.reply_document(document=bio, filename=filename)
-    bio.close()
+        return _reply(update, "❌ You are not authorized.")
+    args = [a.lower() for a in (context.args or [])]
+    fmt = "csv" if "csv" in args else ("txt" if "txt" in args else None)
+    gz = True if ("gz" in args or "gzip" in args) else None
+    _queue_report(context.bot, update.effective_chat.id, update.effective_user.id, fmt, gz)
 
 # ---- callback for the button (send file & edit message) ----
-def viewfull_callback(update: Update, context: CallbackContext):
-    query = update.callback_query
-    user = query.from_user
-    chat = query.message.chat
-    chat_id = chat.id
-
+def _answer_query(query):
     # acknowledge quickly (keeps the button from showing 'loading' forever)
     try:
         query.answer(text="Sending report...")
@@ -363,162 +1932,454 @@ def viewfull_callback(update: Update, context: CallbackContext):
         except:
             pass
 
-    # authorization check
-    if not is_authorized(user.id):
-        # remove button but keep the summary text visible
-        try:
-            query.message.edit_reply_markup(reply_markup=None)
-        except:
-            pass
-        try:
-            query.message.reply_text("You are not authorized to download this report.")
-        except:
-            pass
-        return
-
-    # Build the full report text (same as /viewfull)
-    from_dt, to_dt = _ist_bounds_for_today()
-    rows = get_transactions_between(chat_id, from_dt, to_dt)
-    lines = []
-    for r in rows:
-        try:
-            dt = datetime.datetime.fromisoformat(r[0]).replace(tzinfo=pytz.utc).astimezone(IST)
-            timestr = dt.strftime("%Y-%m-%d %H:%M:%S")
-        except:
-            timestr = r[0]
-        lines.append(f"{timestr} | {r[4]} | INR {fmt_inr_plain(r[1])} | USD {fmt_usd(r[2])} | {r[3]}")
-    full_text = "\n".join(lines) or "No transactions for today."
+def _drop_button(query):
+    # remove the inline button only; keep the summary text intact
+    fut = _outbox.submit(SEND_INTERACTIVE, query.message.chat.id, query.message.edit_reply_markup, reply_markup=None)
+    fut.add_done_callback(lambda f: f.exception())  # failure is logged by the outbox, nothing else to do
+    return fut
 
-    bio = io.BytesIO()
-    bio.write(full_text.encode("utf-8"))
-    bio.seek(0)
-    filename = f"report_{chat_id}_{datetime.date.today().isoformat()}.txt"
+def _deny_report(query):
+    _drop_button(query)
+    return _outbox.submit(SEND_INTERACTIVE, query.message.chat.id, query.message.reply_text,
+                          "You are not authorized to download this report.")
 
-    sent = False
+def _deliver_report(bot, chat_id, user_id, rep):
+    # flood waits go back to the outbox; any other failure falls back to a private message
     try:
         # try to send into the same chat first
-        context.bot.send_document(chat_id=chat_id, document=bio, filename=filename)
-        sent = True
+        _send_file(functools.partial(bot.send_document, chat_id=chat_id), rep)
+        return True
+    except RetryAfter:
+        raise
     except Exception as e:
         logger.warning("Failed to send report to chat %s: %s", chat_id, e)
-        try:
-            bio.seek(0)
-            context.bot.send_document(chat_id=user.id, document=bio, filename=filename)
-            sent = True
-        except Exception as e2:
-            logger.exception("Failed to send report to user %s: %s", user.id, e2)
+    try:
+        _send_file(functools.partial(bot.send_document, chat_id=user_id), rep)
+        return True
+    except RetryAfter:
+        raise
+    except Exception as e2:
+        logger.exception("Failed to send report to user %s: %s", user_id, e2)
+    return False
 
-    bio.close()
+def viewfull_callback(update: Update, context: CallbackContext):
+    query = update.callback_query
+    user = query.from_user
+    chat_id = query.message.chat.id
 
-    # remove the inline button only; keep the summary text intact
-    try:
-        query.message.edit_reply_markup(reply_markup=None)
-    except Exception:
-        pass
+    _answer_query(query)
+    if not is_authorized(user.id):
+        return _deny_report(query)
+
+    _queue_report(context.bot, chat_id, user.id)
+    _drop_button(query)
 
     # optionally notify the clicking admin (small ephemeral toast already done by query.answer)
-    # if you prefer a visible confirmation in chat, uncomment next lines:
-    # if sent:
-    #     try:
-    #         context.bot.send_message(chat_id=chat_id, text="Report has been sent ✅")
-    #     except:
-    #         pass
+    # if you prefer a visible confirmation in chat, send "Report has been sent ✅" once the upload future is True
 
 
 # ====== admin & helper commands ======
 def whoami_cmd(update: Update, context: CallbackContext):
     uid = update.effective_user.id; cid = update.effective_chat.id; uname = update.effective_user.first_name
-    update.message.reply_text(f"Your user_id: {uid}\nchat_id: {cid}\nname: {uname}")
+    shard = f"\nshard: {SHARD_ID} of {SHARDS} ({DB_PATH})" if SHARD_ID is not None else ""
+    admin = "yes" if is_authorized(uid) else "no"
+    _reply(update, f"Your user_id: {uid}\nchat_id: {cid}\nname: {uname}\nadmin: {admin}{shard}")
 
 def clear_cmd(update: Update, context: CallbackContext):
     if not is_authorized(update.effective_user.id):
-        return update.message.reply_text("❌ You are not authorized.")
+        return _reply(update, "❌ You are not authorized.")
     chat_id = update.effective_chat.id
-    con = _db_connect(); cur = con.cursor()
-    cur.execute("DELETE FROM transactions WHERE chat_id=?", (chat_id,))
-    con.commit(); con.close()
-    return update.message.reply_text("✅ All transactions cleared for this chat.")
+    _tx_writer.flush()  # rows queued before /clear must not land after it
+    con = _db_connect()
+    with con:
+        days = [r[0] for r in con.execute(f"SELECT DISTINCT {_BUSINESS_DAY_SQL} FROM transactions WHERE chat_id=? AND ts IS NOT NULL", (chat_id,))]
+        con.execute("DELETE FROM transactions WHERE chat_id=?", (chat_id,))
+        if days:
+            _rollup_rebuild(con, chat_id, days)
+    _ledger_drop(chat_id)
+    return _reply(update, "✅ All transactions cleared for this chat.")
 
 def dbpeek_cmd(update: Update, context: CallbackContext):
     if not is_authorized(update.effective_user.id):
-        return update.message.reply_text("❌ You are not authorized.")
+        return _reply(update, "❌ You are not authorized.")
     chat_id = update.effective_chat.id
-    con = _db_connect(); cur = con.cursor()
-    cur.execute("SELECT time_iso, amount_inr, amount_usd, user, type FROM transactions WHERE chat_id=? ORDER BY id DESC LIMIT 50", (chat_id,))
-    rows = cur.fetchall(); con.close()
+    rows = _db_connect().execute("SELECT time_iso, amount_inr, amount_usd, user, type FROM transactions WHERE chat_id=? ORDER BY id DESC LIMIT 50", (chat_id,)).fetchall()
     if not rows:
-        return update.message.reply_text("No transactions found for this chat_id.")
+        return _reply(update, "No transactions found for this chat_id.")
     text = "Last transactions for this chat:\n"
     for r in rows:
         text += f"{r[0]} | {r[4]} | INR={fmt_inr_plain(r[1])} | USD={fmt_usd(r[2])} | {r[3]}\n"
-    update.message.reply_text(text)
+    _reply(update, text)
 
 def setrate_cmd(update: Update, context: CallbackContext):
     if not is_authorized(update.effective_user.id):
-        return update.message.reply_text("❌ Not authorized.")
+        return _reply(update, "❌ Not authorized.")
     chat_id = update.effective_chat.id
     if not context.args:
-        return update.message.reply_text(f"Current rate: {get_exchange_rate(chat_id)}")
+        return _reply(update, f"Current rate: {get_exchange_rate(chat_id)}")
     try:
         rate = float(context.args[0]); set_exchange_rate(chat_id, rate)
-        update.message.reply_text(f"✅ Exchange rate set to {rate}")
+        _reply(update, f"✅ Exchange rate set to {rate}")
     except:
-        update.message.reply_text("⚠️ Invalid rate. Use: /setrate 106.5")
+        _reply(update, "⚠️ Invalid rate. Use: /setrate 106.5")
 
 def getrate_cmd(update: Update, context: CallbackContext):
     chat_id = update.effective_chat.id
-    update.message.reply_text(f"Exchange rate: {get_exchange_rate(chat_id)}")
+    _reply(update, f"Exchange rate: {get_exchange_rate(chat_id)}")
 
 def setfee_cmd(update: Update, context: CallbackContext):
     if not is_authorized(update.effective_user.id):
-        return update.message.reply_text("❌ Not authorized.")
+        return _reply(update, "❌ Not authorized.")
     chat_id = update.effective_chat.id
     if not context.args:
-        return update.message.reply_text(f"Current fee: {get_fee_rate(chat_id)}%")
+        return _reply(update, f"Current fee: {get_fee_rate(chat_id)}%")
     try:
         fee = float(context.args[0]); set_fee_rate(chat_id, fee)
-        update.message.reply_text(f"✅ Fee set to {fee}%")
+        _reply(update, f"✅ Fee set to {fee}%")
     except:
-        update.message.reply_text("⚠️ Invalid fee. Use: /setfee 1.5")
+        _reply(update, "⚠️ Invalid fee. Use: /setfee 1.5")
 
 def addadmin_cmd(update: Update, context: CallbackContext):
     if not is_authorized(update.effective_user.id):
-        return update.message.reply_text("❌ Not authorized.")
+        return _reply(update, "❌ Not authorized.")
     try:
         uid = int(context.args[0]); add_admin(uid)
-        update.message.reply_text(f"✅ Added admin {uid}")
+        _reply(update, f"✅ Added admin {uid}")
     except:
-        update.message.reply_text("⚠️ Usage: /addadmin <user_id>")
+        _reply(update, "⚠️ Usage: /addadmin <user_id>")
 
 def deladmin_cmd(update: Update, context: CallbackContext):
     if not is_authorized(update.effective_user.id):
-        return update.message.reply_text("❌ Not authorized.")
+        return _reply(update, "❌ Not authorized.")
     try:
         uid = int(context.args[0])
         if uid in ADMINS:
-            return update.message.reply_text("❌ Cannot remove built-in admin.")
-        remove_admin(uid); update.message.reply_text(f"✅ Removed admin {uid}")
+            return _reply(update, "❌ Cannot remove built-in admin.")
+        remove_admin(uid); _reply(update, f"✅ Removed admin {uid}")
     except:
-        update.message.reply_text("⚠️ Usage: /deladmin <user_id>")
+        _reply(update, "⚠️ Usage: /deladmin <user_id>")
+
+def _stats_range(arg):
+    # "today" | "7d" / "30d" / any Nd | "month" -> (first day, last day), business days
+    today = _business_day(_to_ts(datetime.datetime.utcnow()))
+    arg = (arg or "today").lower()
+    if arg == "today":
+        return today, today
+    if arg == "month":
+        return today.replace(day=1), today
+    m = re.fullmatch(r'(\d{1,3})d', arg)
+    if m and int(m.group(1)) > 0:
+        return today - datetime.timedelta(days=int(m.group(1)) - 1), today
+    return None
+
+def stats_cmd(update: Update, context: CallbackContext):
+    if not is_authorized(update.effective_user.id):
+        return _reply(update, "❌ Not authorized.")
+    rng = _stats_range(context.args[0] if context.args else None)
+    if rng is None:
+        return _reply(update, "⚠️ Usage: /stats today | 7d | 30d | month")
+    _tx_writer.flush()
+    rows = get_user_stats(update.effective_chat.id, rng[0], rng[1])
+    tot = {"income": [0, 0, 0], "payout": [0, 0, 0]}
+    users = collections.OrderedDict()
+    for (user, type_, cnt, inr, usd) in rows:
+        if type_ in tot:
+            t = tot[type_]; t[0] += cnt; t[1] += inr; t[2] += usd
+        users.setdefault(user, []).append(
+            f"+{fmt_inr_plain(inr / 100)} ({cnt})" if type_ == "income" else f"T {fmt_usd(usd / 100)} ({cnt})")
+    lines = [f"Stats {rng[0].isoformat()} → {rng[1].isoformat()}"]
+    for (type_, label) in (("income", "Income"), ("payout", "Issued")):
+        t = tot[type_]
+        lines.append(f"{label} ({t[0]}) : {fmt_inr_plain(t[1] / 100)} | {fmt_usd(t[2] / 100)}")
+    if users:
+        lines.append("")
+        for (user, parts) in users.items():
+            lines.append(f"{user}: " + " / ".join(parts))
+    _reply(update, "\n".join(lines))
+
+def sendstats_cmd(update: Update, context: CallbackContext):
+    if not is_authorized(update.effective_user.id):
+        return _reply(update, "❌ Not authorized.")
+    st = _outbox.stats()
+    depth = " ".join(f"{k}={v}" for (k, v) in st["depth"].items())
+    _reply(update, f"Queue: {depth} in_flight={st['in_flight']}\n"
+                   f"Sent: {st['sent']} failed: {st['failed']} retried: {st['retried']}\n"
+                   f"Latency p50: {st['latency_p50']*1000:.0f}ms p99: {st['latency_p99']*1000:.0f}ms")
+
+def profile_cmd(update: Update, context: CallbackContext):
+    # /profile on [ms] | off — off replies with the hottest functions and the collapsed stacks file
+    if not is_authorized(update.effective_user.id):
+        return _reply(update, "❌ Not authorized.")
+    arg = (context.args[0].lower() if context.args else "")
+    if arg == "on":
+        try:
+            ms = float(context.args[1]) if len(context.args) > 1 else PROFILE_INTERVAL_MS
+        except ValueError:
+            return _reply(update, "⚠️ Usage: /profile on [interval_ms]")
+        if not _sampler.start(max(ms, 1.0) / 1000.0):
+            return _reply(update, "Profiler already running.")
+        return _reply(update, f"✅ Profiler on, sampling every {max(ms, 1.0):g}ms. /profile off to stop.")
+    if arg == "off":
+        run = _sampler.stop()
+        if run is None:
+            return _reply(update, "Profiler is not running.")
+        stacks, samples, secs = run
+        # leaf frames that are just waiting (idle pools, queues, the poller) say nothing about cost
+        busy = collections.Counter()
+        for (stack, n) in stacks.items():
+            leaf = stack.rsplit(";", 1)[-1]
+            if not any(f"({m}:" in leaf for m in ("threading.py", "queue.py", "selectors.py", "socket.py", "ssl.py")):
+                busy[leaf] += n
+        total = sum(busy.values()) or 1
+        lines = [f"Profile: {samples} samples in {secs:.1f}s"]
+        for (leaf, n) in busy.most_common(PROFILE_TOP):
+            lines.append(f"{n * 100 / total:5.1f}%  {leaf}")
+        _reply(update, "\n".join(lines))
+        data = "".join(f"{stack} {n}\n" for (stack, n) in stacks.items()).encode()
+        return _outbox.submit(SEND_DOCUMENT, update.effective_chat.id, update.message.reply_document,
+                              document=io.BytesIO(data), filename="profile_collapsed.txt")
+    state = "on" if _sampler.running else "off"
+    return _reply(update, f"Profiler is {state}. Usage: /profile on [interval_ms] | off")
 
 # ====== daily reset ======
+@_db_timed
+def _rollover(cutoff_ts):
+    # one transaction: rows older than cutoff go to the archive, their per-chat day totals to
+    # daily_rollup, and they leave the live table. Returns (chat_ids that had rows, rows moved).
+    con = _db_connect()
+    _begin_immediate(con, "rollover")
+    try:
+        chat_ids = [r[0] for r in con.execute("SELECT DISTINCT chat_id FROM transactions WHERE ts < ?", (cutoff_ts,))]
+        moved = 0
+        if chat_ids:
+            con.execute(f"""INSERT INTO transactions_archive
+                            (id, chat_id, user, type, amount_inr, amount_usd, time_iso, ts,
+                             inr_minor, usd_minor, rate, fee, dedup_key, business_day)
+                            SELECT id, chat_id, user, type, amount_inr, amount_usd, time_iso, ts,
+                                   inr_minor, usd_minor, rate, fee, dedup_key, {_BUSINESS_DAY_SQL}
+                            FROM transactions WHERE ts < ?""", (cutoff_ts,))
+            con.execute(f"""INSERT INTO daily_rollup
+                            (business_day, chat_id, inc_count, inc_inr_minor, inc_usd_minor,
+                             pay_count, pay_inr_minor, pay_usd_minor)
+                            SELECT {_BUSINESS_DAY_SQL}, chat_id,
+                                   SUM(type='income'), TOTAL(CASE WHEN type='income' THEN inr_minor END),
+                                   TOTAL(CASE WHEN type='income' THEN usd_minor END),
+                                   SUM(type='payout'), TOTAL(CASE WHEN type='payout' THEN inr_minor END),
+                                   TOTAL(CASE WHEN type='payout' THEN usd_minor END)
+                            FROM transactions WHERE ts < ? GROUP BY 1, 2
+                            ON CONFLICT(business_day, chat_id) DO UPDATE SET
+                                inc_count = inc_count + excluded.inc_count,
+                                inc_inr_minor = inc_inr_minor + excluded.inc_inr_minor,
+                                inc_usd_minor = inc_usd_minor + excluded.inc_usd_minor,
+                                pay_count = pay_count + excluded.pay_count,
+                                pay_inr_minor = pay_inr_minor + excluded.pay_inr_minor,
+                                pay_usd_minor = pay_usd_minor + excluded.pay_usd_minor""",
+                        (cutoff_ts,))
+            moved = con.execute("DELETE FROM transactions WHERE ts < ?", (cutoff_ts,)).rowcount
+        con.commit()
+    except:
+        con.rollback()
+        raise
+    return chat_ids, moved
+
 def daily_reset(context: CallbackContext):
-    con = _db_connect(); cur = con.cursor()
-    cur.execute("SELECT DISTINCT chat_id FROM transactions")
-    chat_ids = {r[0] for r in cur.fetchall()}; con.close()
+    _tx_writer.flush()
+    from_dt, _ = _ist_bounds_for_today()
+    try:
+        chat_ids, moved = _rollover(_to_ts(from_dt))
+    except Exception as e:
+        logger.exception("Daily rollover failed: %s", e)
+        return
+    logger.info("Daily rollover archived %s rows from %s chats", moved, len(chat_ids))
     for chat_id in chat_ids:
+        _ledger_drop(chat_id)
+        _outbox.submit(SEND_BROADCAST, chat_id, context.bot.send_message, chat_id,
+                       "Good morning — begun new day. Please send today's UPI/IMPS amounts here.")
+
+# ====== maintenance ======
+# Rollovers and /clear leave free pages inside the DB file, and every commit goes through the
+# -wal file; left alone, both only grow. Once a day, off-peak, a pass on its own connection
+# hands free pages back to the OS (incremental_vacuum, MAINT_VACUUM_PAGES per step), refreshes
+# planner stats (a sampled ANALYZE, then PRAGMA optimize) and checkpoints the WAL, finishing
+# with TRUNCATE so the file drops back to zero. Each step waits at most MAINT_BUSY_MS for a
+# lock and is followed by MAINT_PAUSE, so the tx writer and readers get in between. Once
+# MAINT_BUDGET_SECS is used up no new step starts, and the rest waits for the next run.
+# A file from before auto_vacuum=INCREMENTAL (see _m7_auto_vacuum) is instead rebuilt by one
+# full VACUUM, the only step the budget cannot cut short; it happens once per file.
+_maint_last = {}  # the last run's stats, for /metrics
+
+def _db_sizes(con):
+    try:
+        wal = os.path.getsize(DB_PATH + "-wal")
+    except OSError:
+        wal = 0
+    return {"file_bytes": os.path.getsize(DB_PATH), "wal_bytes": wal,
+            "freelist_pages": con.execute("PRAGMA freelist_count").fetchone()[0]}
+
+@_db_timed
+def _maintain(budget=MAINT_BUDGET_SECS):
+    t0 = time.monotonic()
+    deadline = t0 + budget
+    con = _db_open()
+    con.isolation_level = None  # autocommit: every step is its own short transaction
+    con.execute(f"PRAGMA busy_timeout={int(MAINT_BUSY_MS)}")
+    st = {"before": _db_sizes(con), "vacuum_steps": 0, "rebuilt": False, "busy": 0, "analyzed": False,
+          "wal_truncated": False}
+
+    def step(fn):
+        # fn's result, or None when the DB was locked past MAINT_BUSY_MS
         try:
-            con2 = _db_connect(); cur2 = con2.cursor()
-            cur2.execute("DELETE FROM transactions WHERE chat_id=?", (chat_id,))
-            con2.commit(); con2.close()
-            try:
-                context.bot.send_message(chat_id, "Good morning — begun new day. Please send today's UPI/IMPS amounts here.")
-            except Exception as e:
-                logger.warning("Couldn't send reset message to %s: %s", chat_id, e)
-        except Exception as e:
-            logger.exception("Error clearing transactions for chat %s: %s", chat_id, e)
+            return fn()
+        except sqlite3.OperationalError as e:
+            if "locked" not in str(e):
+                raise
+            st["busy"] += 1
+            return None
+        finally:
+            time.sleep(MAINT_PAUSE)
+
+    try:
+        # copies what it can without waiting on anyone, so the TRUNCATE at the end has little left
+        con.execute("PRAGMA wal_checkpoint(PASSIVE)").fetchone()
+        free = st["before"]["freelist_pages"]
+        if con.execute("PRAGMA auto_vacuum").fetchone()[0] == 2:
+            while free and time.monotonic() < deadline:
+                # executescript: execute() would stop after the first page
+                if step(lambda: con.executescript(f"PRAGMA incremental_vacuum({int(MAINT_VACUUM_PAGES)});")) is None:
+                    continue
+                st["vacuum_steps"] += 1
+                (left, free) = (free, con.execute("PRAGMA freelist_count").fetchone()[0])
+                if free >= left:
+                    break
+        elif time.monotonic() < deadline:
+            t1 = time.monotonic()
+            st["rebuilt"] = step(lambda: con.executescript("PRAGMA auto_vacuum=INCREMENTAL; VACUUM;")) is not None
+            if st["rebuilt"]:
+                logger.info("DB rebuilt with auto_vacuum=INCREMENTAL in %.1fs", time.monotonic() - t1)
+        if time.monotonic() < deadline:
+            st["analyzed"] = step(lambda: con.executescript(
+                f"PRAGMA analysis_limit={int(MAINT_ANALYSIS_LIMIT)}; ANALYZE; PRAGMA optimize;")) is not None
+            # new stats may change the plans (a file the bot has not opened yet has no ts column)
+            if st["analyzed"] and con.execute("PRAGMA user_version").fetchone()[0] >= 1:
+                _check_query_plans(con)
+        while time.monotonic() < deadline:
+            r = step(lambda: con.execute("PRAGMA wal_checkpoint(TRUNCATE)").fetchone())
+            if r is not None and r[0] == 0:
+                st["wal_truncated"] = True
+                break
+            if r is not None:
+                st["busy"] += 1  # a reader was still on the old WAL
+        st["after"] = _db_sizes(con)
+    finally:
+        con.close()
+    st["seconds"] = time.monotonic() - t0
+    st["finished"] = time.time()
+    _maint_last.clear(); _maint_last.update(st)
+    return st
+
+def _maint_summary(st):
+    (b, a) = (st["before"], st["after"])
+    mib = lambda n: f"{n / 1048576:.1f}"
+    return (f"{st['seconds']:.1f}s: file {mib(b['file_bytes'])} -> {mib(a['file_bytes'])} MiB, "
+            f"free pages {b['freelist_pages']} -> {a['freelist_pages']}, WAL {mib(b['wal_bytes'])} -> {mib(a['wal_bytes'])} MiB, "
+            f"{st['vacuum_steps']} vacuum steps, {st['busy']} busy"
+            + (", rebuilt with auto_vacuum=INCREMENTAL" if st["rebuilt"] else "")
+            + ("" if st["analyzed"] else ", not analyzed") + ("" if st["wal_truncated"] else ", WAL not truncated"))
+
+def db_maintenance(context: CallbackContext):
+    try:
+        st = _maintain()
+    except Exception as e:
+        logger.exception("DB maintenance failed: %s", e)
+        return
+    logger.info("DB maintenance in %s", _maint_summary(st))
+
+def _collect_maintenance():
+    out = []
+    for (name, path) in (("bot_db_file_bytes", DB_PATH), ("bot_db_wal_bytes", DB_PATH + "-wal")):
+        try:
+            out.append((name, {}, os.path.getsize(path)))
+        except OSError:
+            pass
+    st = _maint_last
+    if st:
+        for when in ("before", "after"):
+            for (k, v) in st[when].items():
+                out.append((f"bot_maintenance_{k}", {"when": when}, v))
+        out.append(("bot_maintenance_seconds", {}, round(st["seconds"], 3)))
+        out.append(("bot_maintenance_busy", {}, st["busy"]))
+        out.append(("bot_maintenance_finished_timestamp", {}, int(st["finished"])))
+    return out
+
+for (_name, _type, _help) in (
+        ("bot_db_file_bytes", "gauge", "DB file size"),
+        ("bot_db_wal_bytes", "gauge", "WAL file size"),
+        ("bot_maintenance_file_bytes", "gauge", "DB file size before and after the last maintenance run"),
+        ("bot_maintenance_wal_bytes", "gauge", "WAL file size before and after the last maintenance run"),
+        ("bot_maintenance_freelist_pages", "gauge", "Free pages in the DB file before and after the last maintenance run"),
+        ("bot_maintenance_seconds", "gauge", "Length of the last maintenance run"),
+        ("bot_maintenance_busy", "gauge", "Steps of the last maintenance run that found the DB locked"),
+        ("bot_maintenance_finished_timestamp", "gauge", "Unix time the last maintenance run ended")):
+    _metrics.define(_name, _type, _help)
+_metrics.collectors.append(_collect_maintenance)
 
 # ====== text handler (with +0 special-case) ======
+# ====== entry classifier ======
+# One precompiled pattern sorts a message into income / negative income / payout; anything
+# else is not for the bot. A plain "+500" skips the arithmetic evaluator entirely, and
+# "+100*1.07" style expressions are evaluated once and then served from an LRU cache.
+ParsedEntry = collections.namedtuple("ParsedEntry", "kind type inr usd reply")
+# kind: "summary" (+0) | "tx" (type income/payout, inr, usd) | "error" (reply to send)
+
+_ENTRY_RE = re.compile(r"\+(?P<expr>.*)|(?P<neg>-\s*\d+(?:\.\d+)?)|T(?P<usd>-?\d+(?:\.\d+)?)[Uu]?", re.S)
+# only literals the evaluator reads the same way: ASCII digits, no leading zeros ("+007" is a
+# SyntaxError there); anything else takes the evaluator's path
+_LITERAL_RE = re.compile(r"\s*(?:(?:0|[1-9][0-9]*)(?:\.[0-9]*)?|\.[0-9]+)\s*")
+_SUMMARY_ENTRY = ParsedEntry("summary", None, None, None, None)
+_BAD_INCOME = ParsedEntry("error", None, None, None, "⚠️ Invalid income format. Use +100 or +100*1.07 etc.")
+_BAD_NEG_INCOME = ParsedEntry("error", None, None, None, "⚠️ Invalid negative income format.")
+
+@functools.lru_cache(maxsize=ARITH_CACHE_SIZE)
+def _eval_arith_cached(expr):
+    # None for anything safe_eval_arith rejects (bad syntax, division by zero)
+    try:
+        return safe_eval_arith(expr)
+    except Exception:
+        return None
+
+def _parse_amount(expr):
+    if _LITERAL_RE.fullmatch(expr):
+        v = float(expr)
+        if math.isfinite(v):  # an integer too big for a float is an OverflowError to the evaluator
+            return v
+    return _eval_arith_cached(expr.strip())
+
+def _parse_entry(text, rate):
+    # a ParsedEntry, or None for text that is not meant for the bot
+    # Special-case exact "+0": do NOT record, but reply summary+button
+    if text == "+0":
+        return _SUMMARY_ENTRY
+    m = _ENTRY_RE.fullmatch(text)
+    if m is None:
+        return None
+    expr, neg, usd = m.group("expr", "neg", "usd")
+    if expr is not None:  # income '+' with arithmetic
+        amount = _parse_amount(expr)
+        if amount is None:
+            return _BAD_INCOME
+        try:
+            return ParsedEntry("tx", "income", amount, amount / rate, None)
+        except ZeroDivisionError:  # after /setrate 0
+            return _BAD_INCOME
+    if neg is not None:  # negative income -number
+        inr = -float(neg[1:])
+        try:
+            return ParsedEntry("tx", "income", inr, inr / rate, None)
+        except ZeroDivisionError:
+            return _BAD_NEG_INCOME
+    usd_amt = float(usd)  # payout: T<number> (USD)
+    return ParsedEntry("tx", "payout", usd_amt * rate, usd_amt, None)
+
 def text_handler(update: Update, context: CallbackContext):
     chat_id = update.effective_chat.id
     user_id = update.effective_user.id
@@ -530,88 +2391,990 @@ def text_handler(update: Update, context: CallbackContext):
         return
 
     rate = get_exchange_rate(chat_id)
-
-    # Special-case exact "+0": do NOT record, but reply + summary+button
-    if text == "+0":
-        update.message.reply_text
-        send_summary_with_button(update, context, chat_id)
+    entry = _parse_entry(text, rate)
+    if entry is None:
         return
+    if entry.kind == "error":
+        return _reply(update, entry.reply)
+    if entry.kind == "tx":
+        add_tx_db(chat_id, user, entry.type, entry.inr, entry.usd, rate, get_fee_rate(chat_id), update.message.message_id)
+        return _summaries.schedule(context, chat_id, update.message.message_id)
+    send_summary_with_button(update, context, chat_id)
 
-    # Income '+' with arithmetic
-    if text.startswith("+"):
-        expr = text[1:].strip()
+# ====== asyncio runtime (BOT_ASYNC=1) ======
+# The dispatcher thread only hands each update to an event loop running on its own thread
+# and moves on. Updates of one chat run strictly one after another (a FIFO asyncio.Lock per
+# chat); different chats run concurrently. Blocking work is pushed to executors: DB calls to
+# a small bounded pool, Telegram API calls to a larger one.
+class _AsyncRuntime:
+    def __init__(self, db_workers, io_workers):
+        global asyncio
+        import asyncio  # only this mode needs it; keeps ~40ms off every start
+        self.loop = asyncio.new_event_loop()
+        self.db_pool = concurrent.futures.ThreadPoolExecutor(db_workers, thread_name_prefix="db")
+        self.io_pool = concurrent.futures.ThreadPoolExecutor(io_workers, thread_name_prefix="tg-io")
+        self.chats = {}  # chat_id -> [asyncio.Lock, updates queued or running]
+        self.thread = None
+
+    def start(self):
+        self.thread = threading.Thread(target=self.loop.run_forever, name="asyncio", daemon=True)
+        self.thread.start()
+
+    def stop(self, timeout=10):
+        if self.thread is None:
+            return
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join(timeout)
+        self.db_pool.shutdown(wait=True)
+        self.io_pool.shutdown(wait=True)
+
+    def db(self, fn, *args, **kwargs):
+        return self.loop.run_in_executor(self.db_pool, functools.partial(fn, *args, **kwargs))
+
+    def io(self, fn, *args, **kwargs):
+        return self.loop.run_in_executor(self.io_pool, functools.partial(fn, *args, **kwargs))
+
+    def dispatch(self, chat_id, handler, update, context):
+        # thread-safe; tasks are created in call order, so the per-chat lock sees them in order
+        return asyncio.run_coroutine_threadsafe(self._run(chat_id, handler, update, context), self.loop)
+
+    async def _run(self, chat_id, handler, update, context):
+        slot = self.chats.get(chat_id)
+        if slot is None:
+            slot = self.chats[chat_id] = [asyncio.Lock(), 0]
+        slot[1] += 1
+        t0 = time.perf_counter()
         try:
-            amount = safe_eval_arith(expr)
-            usd = amount / rate
-            add_tx_db(chat_id, user, "income", amount, usd)
-            send_summary_with_button(update, context, chat_id)
+            async with slot[0]:
+                _metrics.observe("bot_chat_wait_seconds", time.perf_counter() - t0)
+                await handler(update, context)
+        except Exception as e:
+            logger.exception("async handler %s failed in chat %s: %s", getattr(handler, "__name__", handler), chat_id, e)
+        finally:
+            slot[1] -= 1
+            if slot[1] == 0:
+                self.chats.pop(chat_id, None)
+
+_runtime = None
+
+async def _send_summary_async(update, context, chat_id):
+    text = await _runtime.db(build_compact_message, chat_id)
+    _summaries.cancel(chat_id)
+    msg = await asyncio.wrap_future(_reply(update, text, reply_markup=_summary_keyboard()))
+    _summaries.remember(chat_id, msg)
+
+async def text_handler_async(update: Update, context: CallbackContext):
+    chat_id = update.effective_chat.id
+    text = (update.message.text or "").strip()
+    user = update.effective_user.first_name or "user"
+
+    if not await _runtime.db(is_authorized, update.effective_user.id):
+        return
+
+    rate = await _runtime.db(get_exchange_rate, chat_id)
+    entry = _parse_entry(text, rate)
+    if entry is None:
+        return
+    if entry.kind == "error":
+        return await asyncio.wrap_future(_reply(update, entry.reply))
+    if entry.kind == "tx":
+        # the writer thread does the insert; awaiting its future ties up no executor thread
+        fee = await _runtime.db(get_fee_rate, chat_id)
+        await asyncio.wrap_future(add_tx_db_async(chat_id, user, entry.type, entry.inr, entry.usd, rate, fee,
+                                                  update.message.message_id))
+        if SUMMARY_DEBOUNCE_SECS > 0:
+            return _summaries.schedule(context, chat_id, update.message.message_id)
+        return await asyncio.wrap_future(await _runtime.db(_summaries.send, context.bot, chat_id, update.message.message_id))
+    await _send_summary_async(update, context, chat_id)
+
+async def summary_cmd_async(update: Update, context: CallbackContext):
+    if not await _runtime.db(is_authorized, update.effective_user.id):
+        return await asyncio.wrap_future(_reply(update, "❌ You are not authorized."))
+    await _send_summary_async(update, context, update.effective_chat.id)
+
+async def viewfull_callback_async(update: Update, context: CallbackContext):
+    query = update.callback_query
+    user = query.from_user
+    chat_id = query.message.chat.id
+
+    await _runtime.io(_answer_query, query)
+    if not await _runtime.db(is_authorized, user.id):
+        return _deny_report(query)
+
+    _queue_report(context.bot, chat_id, user.id)
+    _drop_button(query)
+
+_ASYNC_HANDLERS = {
+    text_handler: text_handler_async,
+    summary_cmd: summary_cmd_async,
+    viewfull_callback: viewfull_callback_async,
+}
+
+def _instrumented(fn):
+    # handler / job timing and error count, labelled with the function's name
+    name = fn.__name__
+    @functools.wraps(fn)
+    def run(*args):
+        with _metrics.timed("bot_handler_seconds", "bot_handler_errors_total", handler=name):
+            return fn(*args)
+    return run
+
+def _handler(fn):
+    # the callback actually registered with the dispatcher for `fn`
+    if not BOT_ASYNC:
+        return _instrumented(fn)
+    afn = _ASYNC_HANDLERS.get(fn)
+    if afn is None:
+        # commands without a native coroutine run whole on the Telegram I/O pool
+        async def afn(update, context):
+            await _runtime.io(fn, update, context)
+    name = fn.__name__
+    async def timed(update, context):
+        with _metrics.timed("bot_handler_seconds", "bot_handler_errors_total", handler=name):
+            await afn(update, context)
+    timed.__name__ = name
+    def dispatch(update, context):
+        chat = update.effective_chat
+        _runtime.dispatch(chat.id if chat else 0, timed, update, context)
+    return dispatch
+
+# ====== /metrics server ======
+def _collect_runtime():
+    st = _outbox.stats()
+    out = [("bot_outbox_depth", {"lane": lane}, n) for (lane, n) in st["depth"].items()]
+    out.append(("bot_outbox_in_flight", {}, st["in_flight"]))
+    out.append(("bot_tx_writer_queue", {}, _tx_writer.q.qsize()))
+    out.append(("bot_tx_writer_commits_total", {}, _tx_writer.commits))
+    out.append(("bot_tx_writer_rows_total", {}, _tx_writer.rows))
+    out.append(("bot_summary_pending", {}, len(_summaries.pending)))
+    out.append(("bot_ledgers_cached", {}, len(_ledgers)))
+    out.append(("bot_reports_cached", {}, len(_reports)))
+    if _runtime is not None:
+        out.append(("bot_async_chats_active", {}, len(_runtime.chats)))
+    return out
+
+for (_name, _type, _help) in (
+        ("bot_outbox_depth", "gauge", "Sends waiting in the outbox"),
+        ("bot_outbox_in_flight", "gauge", "Chats with a send in flight"),
+        ("bot_tx_writer_queue", "gauge", "Rows and flushes waiting for the writer"),
+        ("bot_tx_writer_commits_total", "counter", "Group commits made by the writer"),
+        ("bot_tx_writer_rows_total", "counter", "Rows committed by the writer"),
+        ("bot_summary_pending", "gauge", "Chats with a debounced summary pending"),
+        ("bot_ledgers_cached", "gauge", "Day ledgers in memory"),
+        ("bot_reports_cached", "gauge", "Rendered reports in memory"),
+        ("bot_async_chats_active", "gauge", "asyncio mode: chats with updates queued or running")):
+    _metrics.define(_name, _type, _help)
+_metrics.collectors.append(_collect_runtime)
+
+class _MetricsHandler(http.server.BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?", 1)[0] != "/metrics":
+            self.send_error(404)
             return
-        except Exception:
-            return update.message.reply_text("⚠️ Invalid income format. Use +100 or +100*1.07 etc.")
+        body = _metrics.render().encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, fmt, *args):
+        pass
 
-    # Negative income -number
-    if re.fullmatch(r'-\s*\d+(\.\d+)?', text):
-        num = re.sub(r'[^\d\.\-]', '', text)
+def _start_metrics_server(port, bind=METRICS_BIND):
+    srv = http.server.ThreadingHTTPServer((bind, port), _MetricsHandler)
+    srv.daemon_threads = True
+    threading.Thread(target=srv.serve_forever, name="metrics", daemon=True).start()
+    logger.info("metrics on http://%s:%s/metrics", bind, port)
+    return srv
+
+# ====== update queues ======
+# Updates are spread over `workers` queues by chat id, so one chat's updates are always handled
+# by one thread in arrival order while different chats run side by side. Used behind the webhook
+# server and inside each shard process.
+def _update_chat_id(data):
+    for key in ("message", "edited_message", "channel_post", "edited_channel_post"):
+        msg = data.get(key)
+        if msg:
+            return (msg.get("chat") or {}).get("id", 0)
+    query = data.get("callback_query")
+    if query:
+        return ((query.get("message") or {}).get("chat") or {}).get("id") or (query.get("from") or {}).get("id", 0)
+    return 0
+
+class _ChatQueues:
+    def __init__(self, process, workers=WEBHOOK_WORKERS, queue_size=WEBHOOK_QUEUE):
+        self.process = process  # called with the update's JSON dict on a worker thread
+        self.queues = [queue.Queue(max(1, queue_size // workers)) for _ in range(workers)]
+        self.threads = []
+
+    def start(self, name="updates"):
+        for (i, q) in enumerate(self.queues):
+            t = threading.Thread(target=self._work, args=(q,), name=f"{name}-{i}", daemon=True)
+            t.start(); self.threads.append(t)
+        _metrics.collectors.append(self._collect)
+
+    def put(self, data, block=True):
+        # False when the chat's queue is full and block is off
+        q = self.queues[hash(_update_chat_id(data)) % len(self.queues)]
         try:
-            amount = float(num)
-            inr = -abs(amount)
-            usd = inr / rate
-            add_tx_db(chat_id, user, "income", inr, usd)
-            send_summary_with_button(update, context, chat_id)
-            return
-        except:
-            return update.message.reply_text("⚠️ Invalid negative income format.")
+            q.put((data, time.monotonic()), block)
+        except queue.Full:
+            return False
+        return True
+
+    def _work(self, q):
+        while True:
+            item = q.get()
+            if item is None:
+                return
+            (data, queued) = item
+            _metrics.observe("bot_update_queue_seconds", time.monotonic() - queued)
+            try:
+                self.process(data)
+            except Exception as e:
+                logger.exception("update %s failed: %s", data.get("update_id"), e)
+
+    def _collect(self):
+        return [("bot_update_queue", {}, sum(q.qsize() for q in self.queues))]
+
+    def stop(self, timeout=10):
+        # the workers finish what is queued first
+        for q in self.queues:
+            q.put(None)
+        for t in self.threads:
+            t.join(timeout)
+        if self._collect in _metrics.collectors:
+            _metrics.collectors.remove(self._collect)
+
+# ====== webhook ingestion ======
+# Telegram POSTs each update to WEBHOOK_URL/<secret>. The HTTP thread only parses the JSON and
+# queues it, answering 200 at once; a full queue answers 503 so Telegram backs off and resends.
+def _webhook_path():
+    return "/" + (WEBHOOK_SECRET or hashlib.sha256((TOKEN or "").encode()).hexdigest()[:32])
+
+class _WebhookIngest:
+    def __init__(self, process, workers=WEBHOOK_WORKERS, queue_size=WEBHOOK_QUEUE, path=None):
+        self.path = path or _webhook_path()
+        self.updates = _ChatQueues(process, workers, queue_size)
+        self.server = None
+
+    def start(self, listen, port):
+        # port 0 picks a free one; -> the bound port
+        ingest = self
+
+        class Handler(http.server.BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"  # keep-alive: Telegram reuses its connections
+
+            def do_POST(self):
+                n = int(self.headers.get("Content-Length") or 0)
+                if n > WEBHOOK_MAX_BODY:
+                    self.close_connection = True
+                    return self._answer(413)
+                body = self.rfile.read(n)
+                if self.path != ingest.path:
+                    return self._answer(404)
+                code = ingest.offer(body)
+                self._answer(code, {"Retry-After": "1"} if code == 503 else None)
+
+            def _answer(self, code, headers=None):
+                self.send_response(code)
+                for (k, v) in (headers or {}).items():
+                    self.send_header(k, v)
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+
+            def log_message(self, fmt, *args):
+                pass
+
+        self.server = http.server.ThreadingHTTPServer((listen, port), Handler)
+        self.server.daemon_threads = True
+        self.updates.start("webhook")
+        threading.Thread(target=self.server.serve_forever, name="webhook-http", daemon=True).start()
+        return self.server.server_address[1]
+
+    def offer(self, body):
+        # -> HTTP status for Telegram
+        try:
+            data = json.loads(body)
+        except ValueError:
+            _metrics.inc("bot_webhook_updates_total", result="bad")
+            return 400
+        if not self.updates.put(data, block=False):
+            _metrics.inc("bot_webhook_updates_total", result="rejected")
+            return 503
+        _metrics.inc("bot_webhook_updates_total", result="accepted")
+        return 200
+
+    def stop(self, timeout=10):
+        # stop accepting, then let the workers finish what is queued
+        if self.server is not None:
+            self.server.shutdown(); self.server.server_close()
+        self.updates.stop(timeout)
+
+for (_name, _type, _help, _buckets) in (
+        ("bot_webhook_updates_total", "counter", "Webhook POSTs by outcome", None),
+        ("bot_update_queue", "gauge", "Updates waiting for a worker", None),
+        ("bot_update_queue_seconds", "histogram", "Time an update waited for a worker", _LATENCY_BUCKETS)):
+    _metrics.define(_name, _type, _help, _buckets)
+
+def _wait_for_signal():
+    # what updater.idle() does for polling
+    stop = threading.Event()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        signal.signal(sig, lambda signum, frame: stop.set())
+    while not stop.wait(1):
+        pass
 
-    # Payout: T<number> (USD)
-    m = re.fullmatch(r'T(-?\d+(\.\d+)?)([Uu])?', text)
-    if m:
-        num_str = m.group(1)
+# ====== sharding (SHARDS > 1) ======
+# The front process owns the Telegram connection (polling or webhook) and no DB. It sends each
+# update to shard `chat_id % SHARDS`, a separate process with its own DB file, dispatcher, job
+# queue and writer, so independent groups use separate cores and separate SQLite write locks.
+# A chat always maps to one shard, and each shard keeps per-chat order (_ChatQueues).
+# Every shard sends through its own outbox with SEND_GLOBAL_PER_SEC / SHARDS, so together they
+# stay within the bot's global limit (a busy shard cannot borrow an idle one's share). A shard
+# process that exits is logged and started again on the same queue; while it is down the front
+# never waits on it, and an update that finds its queue full is dropped and counted.
+# Admins are global: a shard that adds or removes one reports it to the front, which relays it
+# to every other shard; at start the front merges the admins tables of all shard DBs. A change
+# for a shard whose queue is full is parked and retried every second, in order, without holding
+# up the other shards.
+def _shard_of(chat_id):
+    return int(chat_id) % SHARDS
+
+def _shard_db_path(shard_id):
+    return SHARD_DB_PATTERN.format(shard_id)
+
+def _sync_shard_admins():
+    paths = [_shard_db_path(i) for i in range(SHARDS)]
+    admins = set(int(a) for a in ADMINS)
+    cons = [sqlite3.connect(p, timeout=30) for p in paths]
+    try:
+        for con in cons:
+            con.execute("CREATE TABLE IF NOT EXISTS admins (user_id INTEGER PRIMARY KEY)")
+            admins.update(r[0] for r in con.execute("SELECT user_id FROM admins"))
+        for con in cons:
+            with con:
+                con.executemany("INSERT OR IGNORE INTO admins (user_id) VALUES (?)", [(a,) for a in admins])
+    finally:
+        for con in cons:
+            con.close()
+    return admins
+
+class _ShardRouter:
+    def __init__(self, n):
+        import multiprocessing
+        self.mp = multiprocessing.get_context("spawn")  # shards start clean, not as forks of a threaded front
+        self.inboxes = [self.mp.Queue(SHARD_QUEUE) for _ in range(n)]
+        self.up = self.mp.Queue()
+        self.procs = [None] * n
+        self.started = [0.0] * n
+        self.down = set()     # shards whose process has exited and is not back yet
+        self.parked = [collections.deque() for _ in range(n)]  # admin changes waiting on a full queue
+        self.stopping = threading.Event()
+
+    def start(self):
+        if os.path.exists(DB_PATH) and not any(os.path.exists(_shard_db_path(i)) for i in range(SHARDS)):
+            logger.warning("%s exists but no shard DBs do; its chats start empty unless you run split-shards first", DB_PATH)
+        n = len(_sync_shard_admins())
+        logger.info("sharded mode: %s shards, %s admins", SHARDS, n)
+        for i in range(len(self.inboxes)):
+            self._spawn(i)
+        threading.Thread(target=self._relay, name="shard-relay", daemon=True).start()
+        threading.Thread(target=self._watch, name="shard-watch", daemon=True).start()
+        _metrics.collectors.append(self._collect)
+
+    def _spawn(self, i):
+        p = self.mp.Process(target=_shard_main, args=(i, self.inboxes[i], self.up), name=f"shard-{i}")
+        p.start()
+        self.procs[i] = p; self.started[i] = time.monotonic()
+
+    def _watch(self):
+        backoff = [0.0] * len(self.procs)
+        due = [0.0] * len(self.procs)
+        while not self.stopping.wait(1.0):
+            now = time.monotonic()
+            for (i, p) in enumerate(self.procs):
+                if p.is_alive():
+                    if now - self.started[i] > SHARD_RESTART_MAX:
+                        backoff[i] = 0.0  # up long enough: the next exit restarts quickly again
+                    continue
+                if i not in self.down:
+                    self.down.add(i)
+                    backoff[i] = min(max(backoff[i] * 2, 1.0), SHARD_RESTART_MAX)
+                    due[i] = now + backoff[i]
+                    logger.error("shard %s (pid %s) exited with code %s; restarting in %.0fs, %s updates queued for it",
+                                 i, p.pid, p.exitcode, backoff[i], self._depth(i))
+                elif now >= due[i]:
+                    self._spawn(i)
+                    self.down.discard(i)
+                    _metrics.inc("bot_shard_restarts_total", shard=i)
+                    logger.warning("shard %s restarted (pid %s)", i, self.procs[i].pid)
+
+    def _depth(self, i):
         try:
-            amt = float(num_str)
-            usd_amt = float(amt)
-            inr = usd_amt * rate
-            add_tx_db(chat_id, user, "payout", inr, usd_amt)
-            send_summary_with_button(update, context, chat_id)
-            return
-        except:
-            return update.message.reply_text("⚠️ Invalid payout format. Use T100")
+            return self.inboxes[i].qsize()
+        except NotImplementedError:  # macOS
+            return "?"
+
+    def route(self, data, block=True):
+        i = _shard_of(_update_chat_id(data))
+        while True:
+            try:
+                # a shard that is down is not waited on, or one dead shard would stall every chat;
+                # the timeout rechecks that while waiting on a full queue
+                self.inboxes[i].put(("update", data), block and i not in self.down, 1.0)
+                return True
+            except queue.Full:
+                if i in self.down:
+                    _metrics.inc("bot_shard_dropped_total", shard=i)
+                    logger.error("shard %s is down and its queue is full; update %s dropped", i, data.get("update_id"))
+                    return False
+                if not block:
+                    return False
+
+    def _collect(self):
+        return [("bot_shard_up", {"shard": i}, int(i not in self.down)) for i in range(len(self.procs))]
+
+    def _relay(self):
+        while True:
+            try:
+                msg = self.up.get(timeout=1.0) if any(self.parked) else self.up.get()
+            except queue.Empty:
+                msg = ()
+            if msg is None:
+                return
+            origin = None
+            if msg:
+                (kind, op_, user_id, origin) = msg
+                for i in range(len(self.inboxes)):
+                    if i != origin:
+                        self.parked[i].append((kind, op_, user_id))
+            for i in range(len(self.inboxes)):
+                if not self._unpark(i) and msg and i != origin:
+                    _metrics.inc("bot_shard_relay_parked_total", shard=i)
+                    logger.warning("shard %s queue is full; admin %s %s parked for it (%s waiting)",
+                                   i, op_, user_id, len(self.parked[i]))
+
+    def _unpark(self, i):
+        # True once nothing is left parked for shard i
+        parked = self.parked[i]
+        while parked:
+            try:
+                self.inboxes[i].put_nowait(parked[0])
+            except queue.Full:
+                return False
+            parked.popleft()
+        return True
+
+    def stop(self, timeout=30):
+        self.stopping.set()  # shards exiting now are not restarted
+        for inbox in self.inboxes:
+            inbox.put(None)
+        for p in self.procs:
+            p.join(timeout)
+        self.up.put(None)
+
+for (_name, _type, _help) in (
+        ("bot_shard_up", "gauge", "Sharded mode: 1 while the shard process runs"),
+        ("bot_shard_restarts_total", "counter", "Sharded mode: shard processes started again after exiting"),
+        ("bot_shard_dropped_total", "counter", "Sharded mode: updates dropped because their shard was down and its queue full"),
+        ("bot_shard_relay_parked_total", "counter", "Sharded mode: admin changes held back from a shard whose queue was full")):
+    _metrics.define(_name, _type, _help)
+
+def _con_pool_size():
+    # HTTP connections: one per thread that may call the API at once (handler threads or I/O
+    # workers, outbox senders) plus getUpdates and the job queue
+    return (IO_EXECUTOR_WORKERS if BOT_ASYNC else WEBHOOK_WORKERS) + SEND_WORKERS + 4
+
+def _shard_main(shard_id, inbox, up):
+    # entry point of a shard process
+    global DB_PATH, SHARD_ID, _shard_up, _runtime, _outbox, SEND_GLOBAL_PER_SEC
+    from telegram import Bot
+    from telegram.ext import Dispatcher, JobQueue
+    from telegram.utils.request import Request
+    SHARD_ID = shard_id; _shard_up = up
+    DB_PATH = _shard_db_path(shard_id)
+    SEND_GLOBAL_PER_SEC = SEND_GLOBAL_PER_SEC / SHARDS
+    _outbox = _Outbox()  # buckets are sized when the outbox is made
+    signal.signal(signal.SIGINT, signal.SIG_IGN)  # the front stops shards through their inbox
+    _boot()
+    if BOT_ASYNC:
+        _runtime = _AsyncRuntime(DB_EXECUTOR_WORKERS, IO_EXECUTOR_WORKERS)
+        _runtime.start()
+    bot = Bot(TOKEN, request=Request(con_pool_size=_con_pool_size()))
+    job_queue = JobQueue()
+    dp = Dispatcher(bot, queue.Queue(), workers=0, job_queue=job_queue)
+    job_queue.set_dispatcher(dp)
+    _register_handlers(dp)
+    _schedule_jobs(job_queue)
+    job_queue.start()
+    updates = _ChatQueues(lambda data: dp.process_update(Update.de_json(data, bot)))
+    updates.start(f"shard{shard_id}")
+    metrics_srv = _start_metrics_server(METRICS_PORT + 1 + shard_id) if METRICS_PORT else None
+    logger.info("shard %s up on %s", shard_id, DB_PATH)
+    while True:
+        msg = inbox.get()
+        if msg is None:
+            break
+        if msg[0] == "update":
+            updates.put(msg[1])
+        elif msg[0] == "admin":
+            _apply_admin(msg[1], msg[2])
+    updates.stop()
+    job_queue.stop()
+    if metrics_srv is not None:
+        metrics_srv.shutdown()
+    if _runtime is not None:
+        _runtime.stop()
+    _outbox.stop()
+    _tx_writer.stop()
+    _db_close_all()
+
+def _front_main():
+    _import_telegram()
+    from telegram.ext import TypeHandler
+    router = _ShardRouter(SHARDS)
+    router.start()
+    updater = Updater(TOKEN, use_context=True)
+    metrics_srv = _start_metrics_server(METRICS_PORT) if METRICS_PORT else None
+    if WEBHOOK_URL:
+        ingest = _WebhookIngest(router.route)
+        port = ingest.start(WEBHOOK_LISTEN, WEBHOOK_PORT)
+        if WEBHOOK_URL != "local":
+            updater.bot.set_webhook(url=WEBHOOK_URL.rstrip("/") + ingest.path, max_connections=WEBHOOK_MAX_CONNECTIONS,
+                                    allowed_updates=["message", "callback_query"])
+        logger.info("webhook mode: listening on %s:%s", WEBHOOK_LISTEN, port)
+        print(f"Bot started (webhook, {SHARDS} shards)...")
+        _wait_for_signal()
+        ingest.stop()
+    else:
+        # the dispatcher runs this for one update at a time, so routing keeps arrival order
+        updater.dispatcher.add_handler(TypeHandler(Update, lambda update, context: router.route(update.to_dict())))
+        print(f"Bot started ({SHARDS} shards)...")
+        updater.start_polling()
+        updater.idle()
+    router.stop()
+    if metrics_srv is not None:
+        metrics_srv.shutdown()
+
+# ====== start-up ======
+# Updates can be taken once the schema is in place and python-telegram-bot is imported, so
+# the two run side by side. The caches fill afterwards on a background thread: the settings
+# and admins snapshot, then the day ledgers of the chats most active today. A handler that
+# needs something before then loads just that (one chat's settings, one user, one ledger).
+# The settings snapshot is retried until it loads: before it, changes made by another process
+# are never picked up (see _SettingsCache._fresh).
+def _warm_up():
+    t0 = time.perf_counter()
+    delay = 1.0
+    while True:
+        try:
+            _settings.load()
+            break
+        except Exception as e:
+            logger.exception("settings load failed, retrying in %.0fs: %s", delay, e)
+            time.sleep(delay)
+            delay = min(delay * 2, WARM_RETRY_MAX)
+    try:
+        con = _db_connect()
+        _check_query_plans(con)
+        chats = [r[0] for r in con.execute("""SELECT chat_id FROM transactions WHERE ts >= ?
+                                              GROUP BY chat_id ORDER BY MAX(id) DESC LIMIT ?""",
+                                           (_day_window_now()[2], WARM_CHATS))]
+        for chat_id in chats:
+            _ledger_snapshot(chat_id)
+    except Exception as e:
+        logger.exception("warm-up failed, ledgers load on demand: %s", e)
+        return
+    logger.info("warm-up done in %.2fs (%s chat ledgers)", time.perf_counter() - t0, len(chats))
 
-    return
+def _boot():
+    db = concurrent.futures.Future()
+
+    def schema():
+        try:
+            init_db()
+            db.set_result(None)
+        except BaseException as e:
+            db.set_exception(e)
+    threading.Thread(target=schema, name="init-db", daemon=True).start()
+    _import_telegram()
+    db.result()
+    threading.Thread(target=_warm_up, name="warm-up", daemon=True).start()
 
 # ====== main ======
+def _register_handlers(dp):
+    dp.add_handler(CommandHandler("start", _handler(start)))
+    dp.add_handler(CommandHandler("summary", _handler(summary_cmd)))
+    dp.add_handler(CommandHandler("viewfull", _handler(viewfull_cmd)))
+    dp.add_handler(CallbackQueryHandler(_handler(viewfull_callback), pattern=r'^VIEWFULL$'))
+    dp.add_handler(CommandHandler("whoami", _handler(whoami_cmd)))
+    dp.add_handler(CommandHandler("clear", _handler(clear_cmd)))
+    dp.add_handler(CommandHandler("dbpeek", _handler(dbpeek_cmd)))
+
+    dp.add_handler(CommandHandler(["setrate", "rate"], _handler(setrate_cmd)))
+    dp.add_handler(CommandHandler("getrate", _handler(getrate_cmd)))
+    dp.add_handler(CommandHandler("setfee", _handler(setfee_cmd)))
+    dp.add_handler(CommandHandler("addadmin", _handler(addadmin_cmd)))
+    dp.add_handler(CommandHandler("deladmin", _handler(deladmin_cmd)))
+    dp.add_handler(CommandHandler("sendstats", _handler(sendstats_cmd)))
+    dp.add_handler(CommandHandler("stats", _handler(stats_cmd)))
+    dp.add_handler(CommandHandler("profile", _handler(profile_cmd)))
+
+    dp.add_handler(MessageHandler(Filters.text & ~Filters.command, _handler(text_handler)))
+
+def _schedule_jobs(job_queue):
+    # 08:45 IST as naive UTC: the v13 job queue reads naive times as UTC, and its APScheduler
+    # only takes pytz zones, not zoneinfo
+    reset_time = datetime.time(hour=3, minute=15)
+    job_queue.run_daily(_instrumented(daily_reset), time=reset_time)
+    job_queue.run_daily(_instrumented(db_maintenance), time=MAINT_TIME)
+    logger.info("Scheduled daily reset at 08:45 IST, DB maintenance at %s UTC", MAINT_TIME.strftime("%H:%M"))
+
 def main():
-    init_db()
+    global _runtime
     if not TOKEN:
         logger.error("No TOKEN found. Set TOKEN environment variable before running.")
         sys.exit(1)
-
-    updater = Updater(TOKEN, use_context=True)
+    if SHARDS > 1:
+        return _front_main()
+    _boot()
+
+    if BOT_ASYNC:
+        _runtime = _AsyncRuntime(DB_EXECUTOR_WORKERS, IO_EXECUTOR_WORKERS)
+        _runtime.start()
+        logger.info("asyncio mode: %s DB workers, %s I/O workers", DB_EXECUTOR_WORKERS, IO_EXECUTOR_WORKERS)
+    updater = Updater(TOKEN, use_context=True, request_kwargs={"con_pool_size": _con_pool_size()})
     dp = updater.dispatcher
-
-    dp.add_handler(CommandHandler("start", start))
-    dp.add_handler(CommandHandler("summary", summary_cmd))
-    dp.add_handler(CommandHandler("viewfull", viewfull_cmd))
-    dp.add_handler(CallbackQueryHandler(viewfull_callback, pattern=r'^VIEWFULL$'))
-    dp.add_handler(CommandHandler("whoami", whoami_cmd))
-    dp.add_handler(CommandHandler("clear", clear_cmd))
-    dp.add_handler(CommandHandler("dbpeek", dbpeek_cmd))
-
-    dp.add_handler(CommandHandler(["setrate", "rate"], setrate_cmd))
-    dp.add_handler(CommandHandler("getrate", getrate_cmd))
-    dp.add_handler(CommandHandler("setfee", setfee_cmd))
-    dp.add_handler(CommandHandler("addadmin", addadmin_cmd))
-    dp.add_handler(CommandHandler("deladmin", deladmin_cmd))
-
-    dp.add_handler(MessageHandler(Filters.text & ~Filters.command, text_handler))
-
-    job_queue = updater.job_queue
-    reset_time = datetime.time(hour=8, minute=45, tzinfo=IST)
-    job_queue.run_daily(daily_reset, time=reset_time)
-    logger.info("Scheduled daily reset at 08:45 IST")
-
-    print("Bot started...")
-    updater.start_polling()
-    updater.idle()
+    _register_handlers(dp)
+    _schedule_jobs(updater.job_queue)
+
+    metrics_srv = _start_metrics_server(METRICS_PORT) if METRICS_PORT else None
+
+    if WEBHOOK_URL:
+        bot = updater.bot
+        ingest = _WebhookIngest(lambda data: dp.process_update(Update.de_json(data, bot)))
+        port = ingest.start(WEBHOOK_LISTEN, WEBHOOK_PORT)
+        if WEBHOOK_URL != "local":  # "local": only take POSTs, e.g. recorded updates replayed with curl
+            bot.set_webhook(url=WEBHOOK_URL.rstrip("/") + ingest.path, max_connections=WEBHOOK_MAX_CONNECTIONS,
+                            allowed_updates=["message", "callback_query"])
+        updater.job_queue.start()
+        logger.info("webhook mode: listening on %s:%s, %s workers", WEBHOOK_LISTEN, port, WEBHOOK_WORKERS)
+        print("Bot started (webhook)...")
+        _wait_for_signal()
+        updater.job_queue.stop()
+        ingest.stop()
+    else:
+        print("Bot started...")
+        updater.start_polling()
+        updater.idle()
+    if metrics_srv is not None:
+        metrics_srv.shutdown()
+    if _runtime is not None:
+        _runtime.stop()
+    _outbox.stop()
+    _tx_writer.stop()
+    _db_close_all()
+
+# ====== offline tools ======
+def _bench_parse(n):
+    # parse cost per message; the expression cases run warm (cached) and cold (cache cleared each call)
+    import timeit
+    cases = [("literal", "+500", False), ("decimal", "+1234.56", False), ("negative", "-250", False),
+             ("payout", "T100", False), ("expr warm", "+100*1.07", False), ("expr cold", "+100*1.07", True),
+             ("other text", "hello there", False)]
+    for (name, text, cold) in cases:
+        if cold:
+            fn = lambda: (_eval_arith_cached.cache_clear(), _parse_entry(text, 88.0))
+        else:
+            fn = lambda: _parse_entry(text, 88.0)
+        k = n // 10 if cold else n
+        best = min(timeit.repeat(fn, number=k, repeat=3))
+        print(f"{name:12} {text!r:14} {best / k * 1e9:8.0f} ns/msg")
+
+# ====== bulk import ======
+# `python3 bot.py import FILE... [--chat ID] [--rate R] [--fee F] [--user NAME] [--tz ZONE]`
+# A file is CSV with a header row or JSONL (one object per line, like requests.jsonl), with
+#   chat_id   or --chat for the whole run
+#   text      "+500", "+100*1.07", "-250", "T100": read exactly like a chat message
+#   time      ISO 8601, naive times are in --tz (default IST) — or date, epoch seconds as in
+#             Telegram exports
+#   user, rate, fee, message_id, key   optional
+# A row's rate is its own, else --rate, else the chat's current setting; fee likewise. Every
+# row gets a dedup key: key, else chat_id:message_id, else a hash of chat, user, time and
+# text. Keys already in the DB (live or archived) or seen earlier in the run are skipped, so
+# an import can simply be run again. chat_id:message_id is also the key the bot stores for the
+# entries it records live, so an export overlapping them only adds the messages it missed. Rows are parsed and staged into a temp table in
+# IMPORT_BATCH executemany batches without holding the write lock, then sorted by time and
+# deduplicated within the run, still off the lock. The merge then goes in IMPORT_MERGE_BATCH
+# row transactions, each dropping keys already in the DB, inserting the rest and adding them
+# to user_rollup, so the bot's writer only ever waits for one batch; a run stopped halfway
+# leaves whole batches behind, and running it again skips them by their keys. Past
+# days go to the archive and daily_rollup at the bot's next daily rollover, as usual. Chats
+# that get rows for the current business day are stamped in tx_imports, which a running bot
+# watches (see _ImportWatch).
+_IMPORT_STAGE = """CREATE TEMP TABLE IF NOT EXISTS import_rows (
+    chat_id INTEGER, user TEXT, type TEXT, amount_inr REAL, amount_usd REAL, time_iso TEXT, ts INTEGER,
+    inr_minor INTEGER, usd_minor INTEGER, rate REAL, fee REAL, dedup_key TEXT
+)"""
+_IMPORT_COLS = "chat_id,user,type,amount_inr,amount_usd,time_iso,ts,inr_minor,usd_minor,rate,fee,dedup_key"
+
+def _import_records(path):
+    # (line number, dict) per record; JSONL if the first non-blank character is "{", else CSV
+    with open(path, newline="", encoding="utf-8-sig") as f:
+        head = f.read(4096).lstrip()
+        f.seek(0)
+        if head.startswith("{"):
+            for (n, line) in enumerate(f, 1):
+                if line.strip():
+                    yield n, json.loads(line)
+        else:
+            reader = csv.DictReader(f)
+            for rec in reader:
+                yield reader.line_num, rec
+
+def _import_when(rec, tz):
+    # naive UTC datetime of a record
+    t = rec.get("time")
+    if t not in (None, ""):
+        dt = datetime.datetime.fromisoformat(str(t).strip())
+        if dt.tzinfo is not None:
+            return dt.astimezone(datetime.timezone.utc).replace(tzinfo=None)
+        if tz is IST:
+            return dt - _IST_OFFSET
+        return dt.replace(tzinfo=tz).astimezone(datetime.timezone.utc).replace(tzinfo=None)
+    d = rec.get("date")
+    if d not in (None, ""):
+        return _EPOCH + datetime.timedelta(seconds=float(d))
+    raise ValueError("no time or date")
+
+class _Importer:
+    # one target DB: its settings, a staging table and the final merge
+    def __init__(self, path):
+        self.path = path
+        self.con = sqlite3.connect(path, timeout=60)
+        self.con.execute(f"PRAGMA synchronous={DB_SYNCHRONOUS}")
+        self.con.execute(f"PRAGMA cache_size=-{int(DB_CACHE_KB) * 4}")
+        _migrate(self.con)
+        self.rates = dict(self.con.execute("SELECT chat_id, exchange_rate FROM settings WHERE exchange_rate IS NOT NULL"))
+        self.fees = dict(self.con.execute("SELECT chat_id, fee_rate FROM settings WHERE fee_rate IS NOT NULL"))
+        self.con.execute(_IMPORT_STAGE)
+        with self.con:
+            self.con.execute("DELETE FROM temp.import_rows")
+        self.buf = []
+
+    def add(self, row):
+        self.buf.append(row)
+        if len(self.buf) >= IMPORT_BATCH:
+            self.stage()
+
+    def stage(self):
+        if self.buf:
+            with self.con:
+                self.con.executemany(f"INSERT INTO temp.import_rows ({_IMPORT_COLS}) VALUES (?,?,?,?,?,?,?,?,?,?,?,?)", self.buf)
+            self.buf = []
+
+    def merge(self, today_ts):
+        # -> (rows inserted, duplicates skipped, chats with rows in the current business day)
+        self.stage()
+        con = self.con
+        staged = con.execute("SELECT COUNT(*) FROM temp.import_rows").fetchone()[0]
+        with con:  # temp tables only: no lock on the DB yet
+            con.execute("DROP TABLE IF EXISTS temp.import_sorted")
+            # rowids follow time order, so batches are rowid ranges
+            con.execute(f"""CREATE TEMP TABLE import_sorted AS
+                            SELECT {_IMPORT_COLS} FROM temp.import_rows
+                            WHERE rowid IN (SELECT MIN(rowid) FROM temp.import_rows GROUP BY dedup_key)
+                            ORDER BY ts, rowid""")
+            con.execute("DELETE FROM temp.import_rows")
+        last = con.execute("SELECT MAX(rowid) FROM temp.import_sorted").fetchone()[0] or 0
+        inserted = 0
+        today = set()
+        for lo in range(1, last + 1, IMPORT_MERGE_BATCH):
+            batch = (lo, lo + IMPORT_MERGE_BATCH - 1)
+            _begin_immediate(con, "import")
+            try:
+                con.execute("""DELETE FROM temp.import_sorted WHERE rowid BETWEEN ? AND ?
+                                 AND (EXISTS (SELECT 1 FROM main.transactions t WHERE t.dedup_key = import_sorted.dedup_key)
+                                      OR EXISTS (SELECT 1 FROM main.transactions_archive a WHERE a.dedup_key = import_sorted.dedup_key))""",
+                            batch)
+                inserted += con.execute(f"""INSERT INTO main.transactions ({_IMPORT_COLS})
+                                            SELECT {_IMPORT_COLS} FROM temp.import_sorted WHERE rowid BETWEEN ? AND ?
+                                            ORDER BY rowid""", batch).rowcount
+                con.execute(f"""INSERT INTO main.user_rollup (chat_id, business_day, user, type, count, inr_minor, usd_minor)
+                                SELECT chat_id, {_BUSINESS_DAY_SQL}, user, type, COUNT(*), SUM(inr_minor), SUM(usd_minor)
+                                FROM temp.import_sorted WHERE rowid BETWEEN ? AND ? GROUP BY 1, 2, 3, 4
+                                ON CONFLICT(chat_id, business_day, user, type) DO UPDATE SET
+                                    count = count + excluded.count, inr_minor = inr_minor + excluded.inr_minor,
+                                    usd_minor = usd_minor + excluded.usd_minor""", batch)
+                con.executemany(_CHAT_VERSION_BUMP, _chat_version_rows(
+                    r[0] for r in con.execute("SELECT DISTINCT chat_id FROM temp.import_sorted WHERE rowid BETWEEN ? AND ?", batch)))
+                chats = [r[0] for r in con.execute("""SELECT DISTINCT chat_id FROM temp.import_sorted
+                                                      WHERE rowid BETWEEN ? AND ? AND ts >= ?""", batch + (today_ts,))]
+                if chats:
+                    _stamp_imports(con, chats)
+                    today.update(chats)
+                con.commit()
+            except:
+                con.rollback()
+                raise
+            time.sleep(IMPORT_MERGE_PAUSE)
+        with con:
+            con.execute("DROP TABLE temp.import_sorted")
+        return inserted, staged - inserted, sorted(today)
+
+    def close(self):
+        self.con.close()
+
+def _stamp_imports(con, chat_ids):
+    # tells running bots (see _ImportWatch) to reload these chats; inside the inserting transaction
+    seq = con.execute("SELECT COALESCE(MAX(seq), 0) + 1 FROM main.tx_imports").fetchone()[0]
+    con.executemany("""INSERT INTO main.tx_imports (chat_id, seq) VALUES (?, ?)
+                       ON CONFLICT(chat_id) DO UPDATE SET seq = excluded.seq""", [(c, seq) for c in chat_ids])
+
+def _import(files, chat=None, rate=None, fee=None, user="import", tz=IST):
+    if SHARDS > 1:
+        missing = [p for p in (_shard_db_path(i) for i in range(SHARDS)) if not os.path.exists(p)]
+        if missing:
+            sys.exit(f"shard DBs missing: {', '.join(missing)} (run split-shards first)")
+    elif not os.path.exists(DB_PATH):
+        init_db(); _ts_ready.wait()  # a fresh DB gets the full schema first
+    targets = {}
+
+    def target(chat_id):
+        path = _shard_db_path(_shard_of(chat_id)) if SHARDS > 1 else DB_PATH
+        imp = targets.get(path)
+        if imp is None:
+            imp = targets[path] = _Importer(path)
+        return imp
+
+    t0 = time.perf_counter()
+    read = staged = ignored = 0
+    errors = []
+    for path in files:
+        last_report = time.perf_counter()
+        for (where, rec) in _import_records(path):
+            read += 1
+            try:
+                chat_id = rec.get("chat_id") or chat
+                if chat_id in (None, ""):
+                    raise ValueError("no chat_id (use --chat)")
+                chat_id = int(chat_id)
+                imp = target(chat_id)
+                r = rec.get("rate")
+                r = float(r) if r not in (None, "") else (rate if rate is not None else imp.rates.get(chat_id, 106.0))
+                text = str(rec.get("text") or "").strip()
+                entry = _parse_entry(text, r)
+                if entry is None or entry.kind == "summary":
+                    ignored += 1  # not an entry in chat either
+                    continue
+                if entry.kind == "error":
+                    raise ValueError(f"bad entry {text!r}")
+                f_ = rec.get("fee")
+                f_ = float(f_) if f_ not in (None, "") else (fee if fee is not None else imp.fees.get(chat_id, 0.0))
+                who = str(rec.get("user") or user)
+                when = _import_when(rec, tz)
+                key = rec.get("key")
+                if key not in (None, ""):
+                    key = f"k:{key}"
+                elif rec.get("message_id") not in (None, ""):
+                    key = _message_key(chat_id, rec["message_id"])
+                else:
+                    key = "h:" + hashlib.blake2b(f"{chat_id}\x1f{who}\x1f{_to_ts(when)}\x1f{text}".encode(), digest_size=12).hexdigest()
+                imp.add(_tx_row(chat_id, who, entry.type, entry.inr, entry.usd, when, r, f_, key))
+                staged += 1
+            except Exception as e:
+                if len(errors) < 20:
+                    errors.append(f"{path}:{where}: {e}")
+            if not read % 10000 and time.perf_counter() - last_report >= IMPORT_PROGRESS_SECS:
+                last_report = time.perf_counter()
+                dt = last_report - t0
+                print(f"{path}: {read} read, {staged} staged, {read / dt:.0f} rows/s", file=sys.stderr, flush=True)
+    errored = read - staged - ignored
+    for line in errors:
+        print(f"skipped {line}", file=sys.stderr)
+    if errored > len(errors):
+        print(f"... and {errored - len(errors)} more bad rows", file=sys.stderr)
+    inserted = dupes = 0
+    today = []
+    today_ts = _day_window_now()[2]
+    for imp in targets.values():
+        t_merge = time.perf_counter()
+        (n, d, chats) = imp.merge(today_ts)
+        imp.close()
+        inserted += n; dupes += d; today += chats
+        print(f"{imp.path}: {n} rows inserted, {d} duplicates skipped ({time.perf_counter() - t_merge:.1f}s merge)",
+              file=sys.stderr)
+    dt = time.perf_counter() - t0
+    print(f"{read} rows read, {inserted} inserted, {dupes} duplicates, {ignored} not entries, {errored} bad; "
+          f"{dt:.1f}s, {read / dt * 60 if dt else 0:.0f} rows/min", file=sys.stderr)
+    if today:
+        print(f"rows for today landed in {len(today)} chat(s); a running bot shows them within "
+              f"{IMPORT_CHECK_SECS:g}s", file=sys.stderr)
+    return inserted
+
+# chat_version last: the deletes before it bump it through its triggers
+_CHAT_TABLES = ("transactions", "transactions_archive", "settings", "daily_rollup", "user_rollup", "chat_version")
+
+def _split_shards():
+    # one copy of DB_PATH per shard, keeping only that shard's chats; admins go to every shard
+    if SHARDS < 2:
+        sys.exit("set SHARDS=N (N > 1) first")
+    paths = [_shard_db_path(i) for i in range(SHARDS)]
+    existing = [p for p in paths if os.path.exists(p)]
+    if existing:
+        sys.exit(f"shard DBs already exist: {', '.join(existing)}")
+    init_db(); _ts_ready.wait(); _tx_writer.flush()
+    src = _db_connect()
+    src.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+    for (i, path) in enumerate(paths):
+        src.execute("VACUUM INTO ?", (path,))
+        con = sqlite3.connect(path)
+        with con:
+            for table in _CHAT_TABLES:
+                # SQLite's % truncates toward zero; this matches Python's chat_id % SHARDS for negative ids
+                con.execute(f"DELETE FROM {table} WHERE ((chat_id % ?) + ?) % ? != ?", (SHARDS, SHARDS, SHARDS, i))
+        con.execute("VACUUM")
+        n = con.execute("SELECT COUNT(*) FROM transactions").fetchone()[0]
+        con.close()
+        logger.info("shard %s: %s live rows -> %s", i, n, path)
+
+def _cli(argv):
+    # `python3 bot.py` runs the bot; `python3 bot.py rebuild-rollups` recomputes user_rollup;
+    # `python3 bot.py bench-parse [N]` times the entry classifier;
+    # `SHARDS=N python3 bot.py split-shards` copies DB_PATH into N shard DBs;
+    # `python3 bot.py import FILE...` bulk-loads entries (see "bulk import");
+    # `python3 bot.py maintain [SECONDS]` runs the DB maintenance pass now (every shard DB with SHARDS=N)
+    if argv[:1] == ["rebuild-rollups"]:
+        init_db(); _ts_ready.wait()
+        rebuild_rollups()
+        return
+    if argv[:1] == ["split-shards"]:
+        return _split_shards()
+    if argv[:1] == ["bench-parse"]:
+        return _bench_parse(int(argv[1]) if len(argv) > 1 else 200000)
+    if argv[:1] == ["import"]:
+        import argparse
+        ap = argparse.ArgumentParser(prog="bot.py import")
+        ap.add_argument("files", nargs="+")
+        ap.add_argument("--chat", type=int, help="chat_id for rows without one")
+        ap.add_argument("--rate", type=float, help="rate for rows without one (default: the chat's setting)")
+        ap.add_argument("--fee", type=float, help="fee for rows without one (default: the chat's setting)")
+        ap.add_argument("--user", default="import", help="user for rows without one")
+        ap.add_argument("--tz", default="Asia/Kolkata", help="zone of times without an offset")
+        a = ap.parse_args(argv[1:])
+        tz = IST if a.tz == "Asia/Kolkata" else zoneinfo.ZoneInfo(a.tz)
+        _import(a.files, a.chat, a.rate, a.fee, a.user, tz)
+        return
+    if argv[:1] == ["maintain"]:
+        global DB_PATH
+        budget = float(argv[1]) if len(argv) > 1 else MAINT_BUDGET_SECS
+        for path in ([_shard_db_path(i) for i in range(SHARDS)] if SHARDS > 1 else [DB_PATH]):
+            DB_PATH = path
+            print(f"{path}: {_maint_summary(_maintain(budget))}")
+        return
+    main()
 
 if __name__ == "__main__":
-    main()
+    _cli(sys.argv[1:])
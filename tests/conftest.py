@@ -0,0 +1,38 @@
+# bot.py.py and web.py.txt are not importable names: both are loaded from their files against a
+# temp tx.db, the bot through the bench's stand-ins (python-telegram-bot is optional here)
+import os, sys, importlib.util, importlib.machinery
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from bench.stand_in import load_bot, setup_bot, teardown_bot
+
+@pytest.fixture
+def db_path(tmp_path):
+    return str(tmp_path / "tx.db")
+
+@pytest.fixture
+def bot_module(db_path):
+    # the module only: no migration, no writer thread
+    bot = load_bot(db_path)
+    yield bot
+    bot._db_close_all()
+
+@pytest.fixture
+def bot(db_path):
+    # booted like main() does: migrated DB, writer and outbox running
+    bot = setup_bot(db_path)
+    yield bot
+    teardown_bot(bot)
+
+def load_web(db_path):
+    os.environ["DB_PATH"] = db_path
+    try:
+        loader = importlib.machinery.SourceFileLoader("web", os.path.join(ROOT, "web.py.txt"))
+        spec = importlib.util.spec_from_loader("web", loader)
+        web = importlib.util.module_from_spec(spec)
+        loader.exec_module(web)
+    finally:
+        del os.environ["DB_PATH"]
+    return web
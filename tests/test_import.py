@@ -0,0 +1,58 @@
+# Entries recorded live and rows imported from the chat's export share the chat_id:message_id
+# dedup key, so whichever comes first, a message is counted once.
+import datetime, json
+
+import pytest
+
+from bench.stand_in import FakeBot, make_update, make_context
+
+CHAT = -1003
+ADMIN = 6603524612
+
+@pytest.fixture
+def chat(bot):
+    fb = FakeBot()
+
+    def say(message_id, text):
+        upd = make_update(fb, CHAT, ADMIN, text)
+        upd.message.message_id = message_id
+        bot.text_handler(upd, make_context(fb))
+        bot._tx_writer.flush()
+    return say
+
+def _export(tmp_path, messages):
+    # a chat export as JSONL: one record per message, times in UTC
+    now = datetime.datetime.now(datetime.timezone.utc)
+    path = tmp_path / "export.jsonl"
+    path.write_text("".join(json.dumps({"chat_id": CHAT, "message_id": mid, "text": text, "user": "op",
+                                        "time": (now - datetime.timedelta(seconds=60 - i)).isoformat()}) + "\n"
+                            for (i, (mid, text)) in enumerate(messages)), encoding="utf-8")
+    return str(path)
+
+def _rows(bot):
+    return bot._db_connect().execute("SELECT dedup_key, inr_minor FROM transactions WHERE chat_id=? ORDER BY dedup_key",
+                                     (CHAT,)).fetchall()
+
+def test_live_entries_store_their_message_key(bot, chat):
+    chat(11, "+100")
+    chat(12, "T5")
+    chat(13, "+0")  # summary only, no row
+    assert [k for (k, _) in _rows(bot)] == [f"m:{CHAT}:11", f"m:{CHAT}:12"]
+
+def test_export_overlapping_live_entries_adds_only_the_rest(bot, chat, tmp_path):
+    chat(21, "+100")
+    chat(22, "+200")
+    path = _export(tmp_path, [(20, "+50"), (21, "+100"), (22, "+200"), (23, "+300")])
+    assert bot._import([path]) == 2
+    assert _rows(bot) == [(f"m:{CHAT}:20", 5000), (f"m:{CHAT}:21", 10000), (f"m:{CHAT}:22", 20000), (f"m:{CHAT}:23", 30000)]
+    assert bot._import([path]) == 0
+    (count, inr) = bot._db_connect().execute("SELECT SUM(count), SUM(inr_minor) FROM user_rollup WHERE chat_id=?", (CHAT,)).fetchone()
+    assert (count, inr) == (4, 65000)
+
+def test_live_entry_after_import_or_redelivery_is_not_added(bot, chat, tmp_path):
+    assert bot._import([_export(tmp_path, [(31, "+100")])]) == 1
+    chat(31, "+100")   # the bot sees the message the export already brought in
+    chat(32, "+200")
+    chat(32, "+200")   # the same update delivered twice
+    assert _rows(bot) == [(f"m:{CHAT}:31", 10000), (f"m:{CHAT}:32", 20000)]
+    assert "Today's Income (2)" in bot.build_compact_message(CHAT)
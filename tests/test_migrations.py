@@ -0,0 +1,107 @@
+# The repo's tx.db is a pre-migration file (user_version 0, REAL amounts, no ts). Booting on a
+# copy must run every step, keep every row, and leave the schema the current code reads.
+import collections, datetime, os, shutil, sqlite3
+
+import pytest
+
+from conftest import ROOT, setup_bot, teardown_bot
+
+# baseline-style rows whose amounts round differently in binary and in decimal
+EXTRA = [
+    (-1002, "op1", "income", 1.005, 0.00948, "2025-09-12T02:59:59.999999"),  # business day 2025-09-11
+    (-1002, "op1", "income", 0.005, 0.005, "2025-09-12T03:00:00"),           # business day 2025-09-12
+    (-1002, "op1", "payout", 283.55, 2.675, "2025-09-12T04:00:00.5"),
+    (-1002, "op2", "income", 0.81 / 2, 0.0038207547169811325, "2025-09-12T05:00:00"),
+    (-1002, "op2", "income", 99999999999.995, 943396226.4150943, "2025-09-12T06:00:00"),
+]
+BASE_COLS = "id, chat_id, user, type, amount_inr, amount_usd, time_iso"
+
+@pytest.fixture
+def baseline(db_path):
+    shutil.copy(os.path.join(ROOT, "tx.db"), db_path)
+    con = sqlite3.connect(db_path)
+    assert con.execute("PRAGMA user_version").fetchone()[0] == 0
+    with con:
+        con.executemany("INSERT INTO transactions (chat_id,user,type,amount_inr,amount_usd,time_iso) VALUES (?,?,?,?,?,?)", EXTRA)
+    rows = con.execute(f"SELECT {BASE_COLS} FROM transactions ORDER BY id").fetchall()
+    con.close()
+    return rows
+
+@pytest.fixture
+def migrated(baseline, db_path):
+    bot = setup_bot(db_path)
+    yield bot, bot._db_connect()
+    teardown_bot(bot)
+
+def test_final_version_and_schema(migrated):
+    bot, con = migrated
+    versions = [v for (v, _) in bot._MIGRATIONS]
+    assert versions == list(range(1, len(versions) + 1))
+    assert con.execute("PRAGMA user_version").fetchone()[0] == versions[-1]
+    objects = {(t, n) for (t, n) in con.execute("SELECT type, name FROM sqlite_master WHERE name NOT LIKE 'sqlite_%'")}
+    for name in ("transactions", "transactions_archive", "daily_rollup", "user_rollup", "settings", "admins",
+                 "settings_version", "tx_imports", "chat_version"):
+        assert ("table", name) in objects, name
+    for name in ("idx_tx_chat_ts", "idx_tx_dedup", "idx_archive_chat_ts", "idx_archive_day_chat", "idx_archive_dedup"):
+        assert ("index", name) in objects, name
+    for name in ("settings_insert_version", "admins_delete_version", "transactions_update_chat_version",
+                 "transactions_delete_chat_version", "transactions_archive_delete_chat_version"):
+        assert ("trigger", name) in objects, name
+    live = {r[1] for r in con.execute("PRAGMA table_info(transactions)")}
+    archive = {r[1] for r in con.execute("PRAGMA table_info(transactions_archive)")}
+    new = {"ts", "inr_minor", "usd_minor", "rate", "fee", "dedup_key"}
+    assert new <= live and new | {"business_day"} <= archive
+    assert {r[1] for r in con.execute("PRAGMA table_info(user_rollup)")} == \
+        {"chat_id", "business_day", "user", "type", "count", "inr_minor", "usd_minor"}
+
+def test_rows_backfilled(migrated, baseline):
+    bot, con = migrated
+    rows = con.execute(f"SELECT {BASE_COLS}, ts, inr_minor, usd_minor, rate, fee FROM transactions ORDER BY id").fetchall()
+    assert [r[:7] for r in rows] == baseline
+    for (rid, chat_id, user, type_, inr, usd, time_iso, ts, inr_minor, usd_minor, rate, fee) in rows:
+        assert ts == bot._to_ts(datetime.datetime.fromisoformat(time_iso))
+        assert (inr_minor, usd_minor) == (bot._to_minor(inr), bot._to_minor(usd))
+        assert rate == (round(inr / usd, 6) if usd else None) and fee is None
+    by_time = {r[6]: r[8:10] for r in rows}
+    assert by_time["2025-09-12T02:59:59.999999"] == (101, 1)
+    assert by_time["2025-09-12T03:00:00"] == (1, 1)
+    assert by_time["2025-09-12T04:00:00.5"] == (28355, 268)
+    assert by_time["2025-09-12T05:00:00"] == (41, 0)
+    assert by_time["2025-09-12T06:00:00"] == (10_000_000_000_000, 94_339_622_642)
+
+def test_rollups_match_raw_rows(migrated):
+    bot, con = migrated
+    want = collections.Counter(); counts = collections.Counter()
+    for (chat_id, user, type_, inr, usd, ts) in con.execute("SELECT chat_id, user, type, amount_inr, amount_usd, ts FROM transactions"):
+        key = (chat_id, bot._business_day(ts).isoformat(), user, type_)
+        counts[key] += 1
+        want[key + ("inr",)] += bot._to_minor(inr); want[key + ("usd",)] += bot._to_minor(usd)
+    got = con.execute("SELECT chat_id, business_day, user, type, count, inr_minor, usd_minor FROM user_rollup").fetchall()
+    assert {r[:4]: r[4] for r in got} == dict(counts)
+    for r in got:
+        assert (r[5], r[6]) == (want[r[:4] + ("inr",)], want[r[:4] + ("usd",)]), r[:4]
+    assert {r[:4][1] for r in got} >= {"2025-09-11", "2025-09-12"}
+    # the writer keeps them current the same way /clear and rebuild-rollups recompute them
+    bot._rollup_rebuild(con); con.commit()
+    assert sorted(con.execute("SELECT * FROM user_rollup").fetchall()) == sorted(got)
+
+def test_second_boot_changes_nothing(baseline, db_path):
+    bot = setup_bot(db_path)
+    con = bot._db_connect()
+    dump = lambda: (con.execute("PRAGMA user_version").fetchone(), con.execute("SELECT * FROM transactions ORDER BY id").fetchall(),
+                    sorted(con.execute("SELECT * FROM user_rollup").fetchall()))
+    first = dump()
+    teardown_bot(bot)
+    bot = setup_bot(db_path)
+    con = bot._db_connect()
+    assert dump() == first
+    teardown_bot(bot)
+
+def test_startup_leaves_the_rebuild_to_maintenance(migrated, baseline, db_path):
+    bot, con = migrated
+    # the baseline file predates auto_vacuum=INCREMENTAL; booting must not VACUUM it
+    mode = lambda: sqlite3.connect(db_path).execute("PRAGMA auto_vacuum").fetchone()[0]
+    assert mode() == 0
+    assert bot._maintain(60)["rebuilt"] and mode() == 2
+    assert con.execute(f"SELECT {BASE_COLS} FROM transactions ORDER BY id").fetchall() == baseline
+    assert not bot._maintain(60)["rebuilt"]
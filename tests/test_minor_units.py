@@ -0,0 +1,44 @@
+# Money is stored as integer paisa / cents, rounded by _to_minor: by the writer for new rows and by
+# _m4_minor_units for rows from before it (see test_migrations.py).
+import datetime
+
+import pytest
+
+@pytest.mark.parametrize("amount, minor", [
+    (0, 0),
+    (-0.0, 0),
+    (0.005, 1),
+    (0.00499, 0),
+    (-0.005, -1),
+    (1.005, 101),            # 1.005 * 100 is 100.4999... in binary
+    (-1.005, -101),
+    (2.675, 268),
+    (0.1 + 0.2, 30),
+    (107.00000000000001, 10700),
+    (0.40499999999999997, 41),  # 0.81 / 2
+    (123.456, 12346),
+    (-123.454, -12345),
+    (99_999_999_999.99, 9_999_999_999_999),
+    (-99_999_999_999.995, -10_000_000_000_000),
+    ("12.345", 1235),
+])
+def test_to_minor(bot_module, amount, minor):
+    assert bot_module._to_minor(amount) == minor
+
+def test_tx_row_mirrors_minor_units(bot_module):
+    now = datetime.datetime(2026, 1, 2, 3, 4, 5)
+    row = bot_module._tx_row(7, "op", "income", 1.005, -0.015, now, 106.0, 0.5)
+    (chat_id, user, type_, inr, usd, time_iso, ts, inr_minor, usd_minor, rate, fee) = row[:11]
+    assert (inr_minor, usd_minor) == (101, -2)
+    assert (inr, usd) == (1.01, -0.02)
+    assert time_iso == now.isoformat() and ts == bot_module._to_ts(now)
+    assert (rate, fee) == (106.0, 0.5)
+
+def test_writer_stores_minor_units_and_rollups(bot):
+    for (inr, usd) in ((1.005, 0.01), (2.675, 0.03), (0.005, 0.0), (-3.335, -0.035)):
+        bot.add_tx_db(5, "op", "income", inr, usd, 100.0, 0.0)
+    con = bot._db_connect()
+    assert con.execute("SELECT inr_minor, usd_minor FROM transactions ORDER BY id").fetchall() == \
+        [(101, 1), (268, 3), (1, 0), (-334, -4)]
+    assert con.execute("SELECT SUM(count), SUM(inr_minor), SUM(usd_minor) FROM user_rollup WHERE chat_id=5").fetchone() == \
+        (4, 36, 0)
@@ -0,0 +1,101 @@
+# _parse_entry replaced the if-chain text_handler had before it, and must classify every message
+# the way that chain did. _old_entry is that chain (and its evaluator) as it stood, with the
+# database writes and replies turned into return values.
+import ast, math, operator as op, re
+
+import pytest
+
+from conftest import load_bot
+
+@pytest.fixture(scope="module")
+def bot_module(tmp_path_factory):
+    # the parser needs no DB; one load serves every case
+    bot = load_bot(str(tmp_path_factory.mktemp("parse") / "tx.db"))
+    yield bot
+    bot._db_close_all()
+
+_OPS = {ast.Add: op.add, ast.Sub: op.sub, ast.Mult: op.mul, ast.Div: op.truediv, ast.USub: op.neg, ast.UAdd: op.pos}
+
+def _old_eval(expr):
+    if not re.match(r'^[0-9\.\+\-\*/\(\) \t]+$', expr):
+        raise ValueError("Invalid characters in expression")
+    def _eval(node):
+        if isinstance(node, ast.Constant):
+            if isinstance(node.value, (int, float)):
+                return node.value
+            raise ValueError("Invalid constant")
+        if isinstance(node, ast.BinOp):
+            left = _eval(node.left)
+            right = _eval(node.right)
+            opfunc = _OPS.get(type(node.op))
+            if opfunc is None:
+                raise ValueError("Operator not allowed")
+            return opfunc(left, right)
+        if isinstance(node, ast.UnaryOp):
+            operand = _eval(node.operand)
+            opfunc = _OPS.get(type(node.op))
+            if opfunc is None:
+                raise ValueError("Unary operator not allowed")
+            return opfunc(operand)
+        raise ValueError("Expression not allowed")
+    return float(_eval(ast.parse(expr, mode='eval').body))
+
+def _old_entry(text, rate):
+    if text == "+0":
+        return ("summary",)
+    if text.startswith("+"):
+        try:
+            amount = _old_eval(text[1:].strip())
+            return ("tx", "income", amount, amount / rate)
+        except Exception:
+            return ("error", "⚠️ Invalid income format. Use +100 or +100*1.07 etc.")
+    if re.fullmatch(r'-\s*\d+(\.\d+)?', text):
+        try:
+            inr = -abs(float(re.sub(r'[^\d\.\-]', '', text)))
+            return ("tx", "income", inr, inr / rate)
+        except:
+            return ("error", "⚠️ Invalid negative income format.")
+    m = re.fullmatch(r'T(-?\d+(\.\d+)?)([Uu])?', text)
+    if m:
+        amt = float(m.group(1))
+        return ("tx", "payout", amt * rate, amt)
+    return None
+
+def _new_entry(bot, text, rate):
+    e = bot._parse_entry(text, rate)
+    if e is None or e.kind == "summary":
+        return e and ("summary",)
+    if e.kind == "error":
+        return ("error", e.reply)
+    return ("tx", e.type, e.inr, e.usd)
+
+def _same(a, b):
+    if a is None or b is None:
+        return a is b
+    return len(a) == len(b) and all(x == y or (isinstance(x, float) and math.isnan(x) and math.isnan(y))
+                                    for (x, y) in zip(a, b))
+
+INPUTS = [
+    # summary and plain income
+    "+0", "+00", "+0.0", "+ 0", "+100", "+ 100 ", "+100.", "+.5", "+0.5", "+100.25", "+1_000",
+    # leading zeros and non-ASCII digits (the literal fast path must not accept what the evaluator rejects)
+    "+007", "+0123", "+00.5", "+١٢٣", "+１２", "+" + "9" * 400, "+" + "9" * 400 + ".5",
+    # signs
+    "+-5", "+--5", "++5", "+-0", "+(-5)", "-5", "- 5", "-\t5", "-5.5", "-0", "--5", "-+5", "-١٢", "-5.",
+    "-.5", "-5-", "T5", "T-5", "T+5", "T-0", "T--5", "t5",
+    # arithmetic and multiple numbers
+    "+100*1.07", "+100 * 1.07", "+1/3", "+1/0", "+0/0", "+(2+3)*4", "+2**3", "+2^3", "+5 5", "+5+", "+1e3",
+    "+100 200", "-5 5", "T5 5", "T5.5.5", "+1..5",
+    # commas
+    "+1,000", "+1,000.50", "-1,000", "T1,000", "+1,5",
+    # u / usd suffixes
+    "T5u", "T5U", "T5.5u", "T-5u", "T5usd", "T5 u", "T5uu", "+5u", "-5u", "T5USD",
+    # leading and trailing text
+    "x+5", "+5x", "+5 x", " +5", "+5\n", "+\n5", "T5 ok", "ok T5", "pay T5", "-5 rs", "Rs -5", "+",
+    "-", "T", "", "hello", "+()",
+]
+
+@pytest.mark.parametrize("rate", [88.0, 106.5, 0.0])
+@pytest.mark.parametrize("text", INPUTS)
+def test_parse_entry_matches_old_handler(bot_module, text, rate):
+    assert _same(_new_entry(bot_module, text, rate), _old_entry(text, rate))
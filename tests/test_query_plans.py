@@ -0,0 +1,81 @@
+# Per-chat reads must be served by (chat_id, ts) indexes: idx_tx_chat_ts on the live table,
+# idx_archive_chat_ts on the archive. The statements checked are the ones the code actually runs,
+# caught with the connection's trace callback, so a query edited later is checked as it is.
+import datetime, io, queue, re, sqlite3
+
+from conftest import load_web
+
+CHAT = -1001
+INDEX = {"transactions": "idx_tx_chat_ts", "transactions_archive": "idx_archive_chat_ts"}
+_TABLE_STEP = re.compile(r"^(?:SCAN|SEARCH) (transactions_archive|transactions)\b(.*)")
+
+def _traced(con):
+    seen = []
+    con.set_trace_callback(seen.append)
+    return seen
+
+def _plan_steps(con, sql):
+    # (table, detail) for each step of the plan that reads the live or archive table
+    steps = []
+    for row in con.execute("EXPLAIN QUERY PLAN " + sql):
+        m = _TABLE_STEP.match(row[-1])
+        if m:
+            steps.append((m.group(1), m.group(2)))
+    return steps
+
+def _check(con, statements):
+    # every statement filtered on chat_id that reads a ledger table; returns the tables seen
+    tables = set()
+    for sql in statements:
+        if "chat_id" not in sql or sql.lstrip().upper().startswith(("INSERT", "UPDATE", "DELETE")):
+            continue
+        for (table, detail) in _plan_steps(con, sql):
+            assert f"INDEX {INDEX[table]} " in detail + " ", f"{table} read without {INDEX[table]}:\n{sql}\n{detail}"
+            tables.add(table)
+    return tables
+
+def _seed(bot, n=20):
+    for i in range(n):
+        bot.add_tx_db(CHAT, "op", "income" if i % 3 else "payout", 100.0 + i, 1.0 + i / 100, 100.0, 0.0)
+
+def test_startup_list_uses_chat_ts_index(bot):
+    con = bot._db_connect()
+    for (name, sql, args) in bot._INDEXED_QUERIES:
+        plan = " ".join(r[-1] for r in con.execute("EXPLAIN QUERY PLAN " + sql, args))
+        assert "idx_tx_chat_ts" in plan, (name, plan)
+
+def test_summary_queries_use_chat_ts_index(bot):
+    _seed(bot)
+    con = bot._db_connect()
+    bot._ledger_drop(CHAT)
+    seen = _traced(con)
+    assert "Income" in bot.build_compact_message(CHAT)
+    con.set_trace_callback(None)
+    assert _check(con, seen) == {"transactions"}
+
+def test_range_queries_use_chat_ts_index(bot):
+    _seed(bot)
+    con = bot._db_connect()
+    seen = _traced(con)
+    from_dt, to_dt = bot._ist_bounds_for_today()
+    assert len(bot.get_transactions_between(CHAT, from_dt, to_dt)) == 20
+    bot._render_report(CHAT, "csv", False, io.BytesIO())
+    con.set_trace_callback(None)
+    assert _check(con, seen) == {"transactions"}
+
+def test_web_queries_use_chat_ts_indexes(bot, db_path):
+    _seed(bot)
+    web = load_web(db_path)
+    con = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True, check_same_thread=False)
+    seen = _traced(con)
+    web._ro_pools[db_path] = pool = queue.LifoQueue()
+    pool.put(con)
+    client = web.app.test_client()
+    today = datetime.datetime.utcnow().date()
+    for day in (today - datetime.timedelta(days=1), today):
+        assert client.get(f"/report?chat_id={CHAT}&date={day}").status_code == 200
+    r = client.get(f"/api/report?chat_id={CHAT}&from={today - datetime.timedelta(days=1)}&to={today}")
+    assert r.status_code == 200 and r.json["rows"]
+    con.set_trace_callback(None)
+    assert _check(con, seen) == {"transactions", "transactions_archive"}
+    con.close()
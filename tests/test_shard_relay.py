@@ -0,0 +1,22 @@
+# Admin changes are relayed to every other shard without blocking: a shard whose queue is full
+# gets them later, in order, and the others get them at once.
+import queue, threading, time
+
+def test_full_shard_parks_admin_changes_for_itself_only(bot_module):
+    router = bot_module._ShardRouter(3)
+    router.inboxes = [queue.Queue(), queue.Queue(1), queue.Queue()]
+    router.up = queue.Queue()
+    router.inboxes[1].put("busy")
+    relay = threading.Thread(target=router._relay, daemon=True)
+    relay.start()
+    router.up.put(("admin", "add", 7, 0))
+    router.up.put(("admin", "remove", 8, 0))
+    assert router.inboxes[2].get(timeout=1) == ("admin", "add", 7)
+    assert router.inboxes[2].get(timeout=1) == ("admin", "remove", 8)
+    assert router.inboxes[0].empty() and list(router.parked[1]) == [("admin", "add", 7), ("admin", "remove", 8)]
+    assert router.inboxes[1].get() == "busy"  # the shard catches up; the parked changes follow
+    assert router.inboxes[1].get(timeout=3) == ("admin", "add", 7)
+    assert router.inboxes[1].get(timeout=3) == ("admin", "remove", 8)
+    router.up.put(None)
+    relay.join(3)
+    assert not relay.is_alive()
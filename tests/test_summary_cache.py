@@ -0,0 +1,39 @@
+# The summary LRU bounds every per-chat structure behind it: a chat it evicts loses its ledger,
+# ledger lock and version entry, and comes back at a version no older than the one it had.
+import threading
+
+def test_evicted_chats_leave_nothing_behind(bot):
+    bot.SUMMARY_CACHE_SIZE = 3
+    for chat_id in range(1, 11):
+        bot.add_tx_db(chat_id, "op", "income", 100.0, 1.0, 100.0, 0.0)
+        bot.build_compact_message(chat_id)
+    assert list(bot._summary_cache) == [8, 9, 10]
+    assert set(bot._ledgers) == set(bot._ledger_locks) == set(bot._ledger_versions) == {8, 9, 10}
+
+def test_evicted_chat_never_reads_an_older_version(bot):
+    bot.SUMMARY_CACHE_SIZE = 1
+    bot.add_tx_db(1, "op", "income", 100.0, 1.0, 100.0, 0.0)
+    before = bot._summary_version(1)
+    assert "Income (1)" in bot.build_compact_message(1)
+    bot.build_compact_message(2)  # evicts chat 1
+    assert 1 not in bot._ledger_versions
+    assert bot._summary_version(1) >= before
+    bot.add_tx_db(1, "op", "income", 50.0, 0.5, 100.0, 0.0)
+    assert bot._summary_version(1) > before
+    assert "Income (2)" in bot.build_compact_message(1)
+
+def test_waiter_on_a_forgotten_lock_takes_the_new_one(bot):
+    order = []
+    def waiter():
+        with bot._ledger_lock(1):
+            order.append(("waiter", bot._ledger_locks[1]))
+    with bot._ledger_lock(1):
+        old = bot._ledger_locks[1]
+        threads = [threading.Thread(target=bot._ledger_forget, args=(1,)), threading.Thread(target=waiter)]
+        for t in threads:
+            t.start()
+    for t in threads:
+        t.join()
+    # whichever got the old lock first, the waiter held the chat's current lock, never a removed one
+    ((_, held),) = order
+    assert (held is not old) if 1 in bot._ledger_locks else (held is old)
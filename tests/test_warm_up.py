@@ -0,0 +1,15 @@
+# A settings load that fails at start-up is retried: until the snapshot is in, nothing polls for
+# settings changed by another process.
+def test_failed_settings_load_is_retried(bot, monkeypatch):
+    bot._settings.loaded = False
+    real = bot._settings.load
+    calls = []
+    def flaky():
+        calls.append(1)
+        if len(calls) < 3:
+            raise bot.sqlite3.OperationalError("database is locked")
+        real()
+    monkeypatch.setattr(bot._settings, "load", flaky)
+    monkeypatch.setattr(bot.time, "sleep", lambda s: None)
+    bot._warm_up()
+    assert len(calls) == 3 and bot._settings.loaded
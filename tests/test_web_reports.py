@@ -0,0 +1,42 @@
+# web.py serves files the bot has not migrated yet (the repo's tx.db: no ts, REAL amounts only)
+# from time_iso and the REAL columns, and migrated ones from ts and the exact minor units.
+import os, shutil
+
+import pytest
+
+from conftest import ROOT, load_web, setup_bot, teardown_bot
+
+CHAT = -1002758671424
+DAY = "2025-09-09"   # its 12 rows: 64200 INR, 605.66 USD (605.64 summed in whole cents)
+
+@pytest.fixture
+def baseline(db_path):
+    shutil.copy(os.path.join(ROOT, "tx.db"), db_path)
+    return db_path
+
+def _reports(web):
+    client = web.app.test_client()
+    page = client.get(f"/report?chat_id={CHAT}&date={DAY}")
+    api = client.get(f"/api/report?chat_id={CHAT}&from={DAY}")
+    assert page.status_code == 200 and api.status_code == 200
+    return page.get_data(as_text=True), api.json
+
+def _check(page, api, usd_total):
+    assert "Transactions (12)" in page
+    (inr, usd) = page.split("Total INR: ")[1].split("</p>")[0].split(" | Total USD: ")
+    assert float(inr) == 64200 and round(float(usd), 2) == usd_total
+    assert len(api["rows"]) == 12 and api["next_cursor"] is None
+    assert sum(t["count"] for t in api["totals"].values()) == 12
+    assert sum(t["inr"] for t in api["totals"].values()) == 64200
+    assert round(sum(t["usd"] for t in api["totals"].values()), 2) == usd_total
+
+def test_unmigrated_file_reports_from_real_columns(baseline):
+    _check(*_reports(load_web(baseline)), 605.66)
+
+def test_migrated_file_reports_the_same(baseline):
+    bot = setup_bot(baseline)
+    bot._ts_ready.wait(10)
+    try:
+        _check(*_reports(load_web(baseline)), 605.64)
+    finally:
+        teardown_bot(bot)